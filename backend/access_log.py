@@ -0,0 +1,354 @@
+"""
+Log de eventos de acceso (`eventos_acceso`, particionada por mes) y sus
+rollups para analítica.
+
+Cada lote de eventos se inserta y agrega a `accesos_por_hora`,
+`denegaciones_por_dia` y `accesos_por_matricula_dia` en una sola sentencia
+(CTEs que modifican datos), así los rollups nunca quedan desfasados de los
+eventos. Las consultas de analítica leen solo los rollups.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Set
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+from db import get_connection, pooled_connection, table_name
+from plates import normalize_plate
+
+# Motivo agrupado para denegaciones sin motivo informado
+SIN_MOTIVO = "Sin motivo"
+
+EVENTO_COLUMNAS = (
+    "ts", "matricula", "matricula_norm", "acceso_concedido", "motivo",
+    "confianza", "camara", "origen", "evidencia_id",
+)
+
+_INSERT_EVENTOS = f"""
+WITH nuevos AS (
+    INSERT INTO {table_name('eventos_acceso')} ({', '.join(EVENTO_COLUMNAS)})
+    VALUES %s
+    RETURNING ts, matricula_norm, acceso_concedido, motivo
+), por_hora AS (
+    INSERT INTO {table_name('accesos_por_hora')} AS r (hora, total, permitidos, denegados)
+    SELECT date_trunc('hour', ts), count(*),
+           count(*) FILTER (WHERE acceso_concedido), count(*) FILTER (WHERE NOT acceso_concedido)
+    FROM nuevos GROUP BY 1
+    ON CONFLICT (hora) DO UPDATE SET
+        total = r.total + EXCLUDED.total,
+        permitidos = r.permitidos + EXCLUDED.permitidos,
+        denegados = r.denegados + EXCLUDED.denegados
+), por_motivo AS (
+    INSERT INTO {table_name('denegaciones_por_dia')} AS r (dia, motivo, total)
+    SELECT ts::date, COALESCE(motivo, '{SIN_MOTIVO}'), count(*)
+    FROM nuevos WHERE NOT acceso_concedido GROUP BY 1, 2
+    ON CONFLICT (dia, motivo) DO UPDATE SET total = r.total + EXCLUDED.total
+), por_matricula AS (
+    INSERT INTO {table_name('accesos_por_matricula_dia')} AS r (dia, matricula_norm, total, denegados, ultimo_acceso)
+    SELECT ts::date, matricula_norm, count(*), count(*) FILTER (WHERE NOT acceso_concedido), max(ts)
+    FROM nuevos GROUP BY 1, 2
+    ON CONFLICT (dia, matricula_norm) DO UPDATE SET
+        total = r.total + EXCLUDED.total,
+        denegados = r.denegados + EXCLUDED.denegados,
+        ultimo_acceso = GREATEST(r.ultimo_acceso, EXCLUDED.ultimo_acceso)
+)
+SELECT count(*) FROM nuevos
+"""
+
+# Meses (primer día) cuya partición ya existe en este proceso
+_particiones: Set[date] = set()
+_particiones_lock = threading.Lock()
+
+
+def _mes(ts: datetime) -> date:
+    return date(ts.year, ts.month, 1)
+
+
+def ensure_partition(cursor, meses: Iterable[date]):
+    """Crea las particiones mensuales que falten (una vez por mes y proceso)."""
+    faltan = [m for m in set(meses) if m not in _particiones]
+    for mes in faltan:
+        cursor.execute("SELECT smartgate_particion_eventos(%s)", (mes,))
+    if faltan:
+        with _particiones_lock:
+            _particiones.update(faltan)
+
+
+def _fila_evento(evento: dict) -> tuple:
+    matricula = evento["matricula"]
+    return (
+        evento.get("ts") or datetime.now(),
+        matricula,
+        normalize_plate(matricula),
+        bool(evento["acceso"]),
+        evento.get("motivo"),
+        evento.get("confianza"),
+        evento.get("camara"),
+        evento.get("origen"),
+        evento.get("evidencia_id"),
+    )
+
+
+def registrar_eventos(eventos: List[dict]) -> int:
+    """
+    Inserta un lote de eventos y actualiza los rollups en la misma
+    transacción. Cada evento es un dict con `matricula`, `acceso` y
+    opcionalmente `ts`, `motivo`, `confianza`, `camara`, `origen`,
+    `evidencia_id`.
+    """
+    if not eventos:
+        return 0
+    filas = [_fila_evento(e) for e in eventos]
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        ensure_partition(cursor, (_mes(f[0]) for f in filas))
+        # page_size = lote completo: una sola sentencia y un solo round-trip
+        execute_values(cursor, _INSERT_EVENTOS, filas, page_size=len(filas))
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        # La partición pudo haberse borrado/renombrado: revalidar la próxima vez
+        with _particiones_lock:
+            _particiones.clear()
+        raise
+    finally:
+        conn.close()
+    return len(filas)
+
+
+_EVENTOS = table_name('eventos_acceso')
+_POR_HORA = table_name('accesos_por_hora')
+_POR_MOTIVO = table_name('denegaciones_por_dia')
+_POR_MATRICULA = table_name('accesos_por_matricula_dia')
+
+# Sentencias de `recalcular_rollups`, en orden (parámetros por nombre)
+_SQL_RECALCULAR = (
+    f"DELETE FROM {_POR_HORA} WHERE hora >= %(inicio)s AND hora < %(fin)s",
+    f"DELETE FROM {_POR_MOTIVO} WHERE dia BETWEEN %(desde)s AND %(hasta)s",
+    f"DELETE FROM {_POR_MATRICULA} WHERE dia BETWEEN %(desde)s AND %(hasta)s",
+    f"""
+    INSERT INTO {_POR_HORA} (hora, total, permitidos, denegados)
+    SELECT date_trunc('hour', ts), count(*),
+           count(*) FILTER (WHERE acceso_concedido), count(*) FILTER (WHERE NOT acceso_concedido)
+    FROM {_EVENTOS} WHERE ts >= %(inicio)s AND ts < %(fin)s GROUP BY 1
+    """,
+    f"""
+    INSERT INTO {_POR_MOTIVO} (dia, motivo, total)
+    SELECT ts::date, COALESCE(motivo, '{SIN_MOTIVO}'), count(*)
+    FROM {_EVENTOS}
+    WHERE ts >= %(inicio)s AND ts < %(fin)s AND NOT acceso_concedido GROUP BY 1, 2
+    """,
+    f"""
+    INSERT INTO {_POR_MATRICULA} (dia, matricula_norm, total, denegados, ultimo_acceso)
+    SELECT ts::date, matricula_norm, count(*), count(*) FILTER (WHERE NOT acceso_concedido), max(ts)
+    FROM {_EVENTOS} WHERE ts >= %(inicio)s AND ts < %(fin)s GROUP BY 1, 2
+    """,
+)
+_SQL_TOTAL_RANGO = f"SELECT COALESCE(sum(total), 0) FROM {_POR_HORA} WHERE hora >= %(inicio)s AND hora < %(fin)s"
+
+
+def recalcular_rollups(desde: date, hasta: date) -> int:
+    """
+    Reconstruye los rollups de los días [desde, hasta] a partir de los
+    eventos (reparación o backfill). Retorna los eventos considerados.
+    """
+    params = {
+        "inicio": datetime.combine(desde, datetime.min.time()),
+        "fin": datetime.combine(hasta + timedelta(days=1), datetime.min.time()),
+        "desde": desde,
+        "hasta": hasta,
+    }
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for sql in _SQL_RECALCULAR:
+            cursor.execute(sql, params)
+        cursor.execute(_SQL_TOTAL_RANGO, params)
+        total = cursor.fetchone()[0]
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return int(total)
+
+
+# --- Consultas de analítica (solo rollups) ----------------------------------
+
+def _consultar(query: str, params: tuple) -> list:
+    with pooled_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+_SQL_ACCESOS_POR_HORA = (
+    f"SELECT hora, total, permitidos, denegados FROM {_POR_HORA} "
+    "WHERE hora >= %s AND hora < %s ORDER BY hora"
+)
+_SQL_DENEGACIONES = (
+    f"SELECT motivo, sum(total)::int AS total FROM {_POR_MOTIVO} "
+    "WHERE dia BETWEEN %s AND %s GROUP BY motivo ORDER BY total DESC"
+)
+_SQL_TOP_MATRICULAS = (
+    f"SELECT matricula_norm AS matricula, sum(total)::int AS total, sum(denegados)::int AS denegados, "
+    f"max(ultimo_acceso) AS ultimo_acceso FROM {_POR_MATRICULA} "
+    "WHERE dia BETWEEN %s AND %s GROUP BY matricula_norm ORDER BY total DESC LIMIT %s"
+)
+_SQL_RESUMEN = (
+    f"SELECT COALESCE(sum(total), 0)::int AS total, COALESCE(sum(permitidos), 0)::int AS permitidos, "
+    f"COALESCE(sum(denegados), 0)::int AS denegados FROM {_POR_HORA} "
+    "WHERE hora >= %s AND hora < %s"
+)
+
+
+def accesos_por_hora(desde: datetime, hasta: datetime) -> list:
+    return _consultar(_SQL_ACCESOS_POR_HORA, (desde, hasta))
+
+
+def denegaciones_por_motivo(desde: date, hasta: date) -> list:
+    return _consultar(_SQL_DENEGACIONES, (desde, hasta))
+
+
+def top_matriculas(desde: date, hasta: date, limit: int = 10) -> list:
+    return _consultar(_SQL_TOP_MATRICULAS, (desde, hasta, limit))
+
+
+def resumen_dia(dia: date) -> dict:
+    """Totales de un día: a lo sumo 24 filas de `accesos_por_hora`."""
+    inicio = datetime.combine(dia, datetime.min.time())
+    filas = _consultar(_SQL_RESUMEN, (inicio, inicio + timedelta(days=1)))
+    return {"dia": dia, **filas[0]}
+
+
+# --- Writer en segundo plano --------------------------------------------------
+
+class AccessLogWriter:
+    """
+    Cola de eventos de acceso que se escriben por lotes en un hilo aparte,
+    así la captura nunca espera a la base. Con la cola llena se descartan
+    eventos.
+
+    Si la base no responde el lote se reintenta en la siguiente vuelta. Si
+    falla por los datos (restricción, valor inválido) o supera
+    `MAX_RETRIES`, se escribe evento por evento y los que fallan solos van
+    a `rechazados` (los últimos quedan en `dead_letter`), así una fila
+    inválida no frena a las que vienen detrás.
+    """
+
+    BATCH = 200
+    MAX_RETRIES = 5
+
+    def __init__(self, interval: float = 1.0, max_pending: int = 10000, writer=registrar_eventos):
+        self.interval = interval
+        self._writer = writer
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._retry: List[dict] = []
+        self._attempts = 0
+        self._running = False
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.dead_letter = deque(maxlen=100)
+        self.last_error: Optional[str] = None
+
+    def log(self, evento: dict) -> bool:
+        try:
+            self._queue.put_nowait(evento)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._loop, name="access-log-writer", daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def flush(self) -> int:
+        lote = self._retry
+        while len(lote) < self.BATCH:
+            try:
+                lote.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not lote:
+            return 0
+        try:
+            n = self._writer(lote)
+        except Exception as e:
+            if self.last_error != str(e):
+                print(f"⚠️ No se pudieron registrar {len(lote)} eventos de acceso: {e}")
+            self.last_error = str(e)
+            self._attempts += 1
+            if _sin_conexion(e) and self._attempts < self.MAX_RETRIES:
+                self._retry = lote
+                return 0
+            return self._write_one_by_one(lote)
+        self._retry = []
+        self._attempts = 0
+        self.written += n
+        self.last_error = None
+        return n
+
+    def _write_one_by_one(self, lote: List[dict]) -> int:
+        """Aísla los eventos que fallan solos; si se corta la conexión, el resto se reintenta."""
+        escritos = 0
+        for i, evento in enumerate(lote):
+            try:
+                escritos += self._writer([evento])
+            except Exception as e:
+                if _sin_conexion(e):
+                    self._retry = lote[i:]
+                    self._attempts = 0
+                    self.written += escritos
+                    return escritos
+                self.rejected += 1
+                self.dead_letter.append({"evento": evento, "error": str(e)})
+                print(f"❌ Evento de acceso rechazado ({evento.get('matricula')}): {e}")
+        self._retry = []
+        self._attempts = 0
+        self.written += escritos
+        return escritos
+
+    def _loop(self):
+        while self._running:
+            if self.flush() < self.BATCH:
+                time.sleep(self.interval)
+
+    def status(self) -> dict:
+        return {
+            "pendientes": self._queue.qsize() + len(self._retry),
+            "escritos": self.written,
+            "descartados": self.dropped,
+            "rechazados": self.rejected,
+            "error": self.last_error,
+        }
+
+
+def _sin_conexion(e: Exception) -> bool:
+    """Errores en los que conviene reintentar el lote tal cual (base caída)."""
+    return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+# Instancia global del writer (la crea quien registra eventos)
+access_log_writer: Optional[AccessLogWriter] = None
+
+
+def get_access_log_writer() -> AccessLogWriter:
+    global access_log_writer
+    if access_log_writer is None:
+        access_log_writer = AccessLogWriter()
+        access_log_writer.start()
+    return access_log_writer
@@ -0,0 +1,241 @@
+"""
+Estado del proceso según su rol (SMARTGATE_ROLE):
+
+- `all` (por defecto): cámara (si ENABLE_CAMERA=1) y API en el mismo proceso.
+- `camera`: solo captura + inferencia (`python camera_main.py`). Publica
+  las detecciones y su estado por pub/sub y comparte los frames por
+  memoria compartida (FRAME_BUFFER_SHM).
+- `api`: workers sin estado (`uvicorn main:app --workers N`). Nunca abren
+  la cámara: reciben detecciones por pub/sub y leen los frames del
+  segmento compartido. Tras una importación masiva avisan por pub/sub
+  (`CANAL_INVALIDAR`) para que la cámara descarte sus cachés.
+
+El estado se crea y arranca en el startup de la app (no al importar).
+"""
+import itertools
+import os
+import threading
+import time
+from typing import Optional
+
+from camera.frame_buffer import FrameRingBuffer
+from event_bus import EventBus
+from event_feed import event_feed
+from fastjson import dumps_str, loads
+from plate_index import invalidate_plate_index
+from pubsub import (CANAL_DETECCIONES, CANAL_ESTADO, CANAL_INVALIDAR, PubSub, create_pubsub, decode_message,
+                    encode_message)
+
+ROLES = ("all", "camera", "api")
+ROLE = os.getenv("SMARTGATE_ROLE", "all").lower()
+
+# Segmento de memoria compartida por defecto entre cámara y API
+DEFAULT_FRAME_SHM = "smartgate_frames"
+# Cada cuántos segundos el proceso de cámara publica su estado
+STATUS_INTERVAL = 5.0
+# Tablas cuyos cambios vuelven obsoletas las decisiones cacheadas de la
+# cámara: llevan el estado del vehículo, el pago y el contacto del propietario
+TABLAS_DECISION = ("vehiculos", "propietarios", "pagos")
+
+
+def _enabled(var: str, default: str = "0") -> bool:
+    return os.getenv(var, default).lower() in ("1", "true", "yes", "on")
+
+
+class SharedFrameReader:
+    """
+    Lee los frames que publica el proceso de cámara en memoria compartida.
+    Misma interfaz que usa la API de `CameraService` (`frame_buffer`,
+    `read_frame`, `get_last_plate_for_overlay`). Si la cámara recrea el
+    segmento (cambio de resolución o reinicio) se vuelve a conectar.
+    """
+
+    REATTACH_AFTER = 2.0  # segundos sin frames nuevos antes de reconectar
+
+    def __init__(self, shm_name: str):
+        self.shm_name = shm_name
+        self._buffer: Optional[FrameRingBuffer] = None
+        self._last_seq = 0
+        self._last_change = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def frame_buffer(self) -> Optional[FrameRingBuffer]:
+        with self._lock:
+            now = time.monotonic()
+            if self._buffer is not None:
+                seq = self._buffer.latest_seq
+                if seq != self._last_seq:
+                    self._last_seq, self._last_change = seq, now
+                elif now - self._last_change > self.REATTACH_AFTER:
+                    self._buffer.close()
+                    self._buffer = None
+            if self._buffer is None:
+                try:
+                    self._buffer = FrameRingBuffer.attach(self.shm_name, track=False)
+                except (FileNotFoundError, ValueError):
+                    return None
+                self._last_seq, self._last_change = self._buffer.latest_seq, now
+            return self._buffer
+
+    def read_frame(self, dst=None, after_seq: int = 0):
+        fb = self.frame_buffer
+        if fb is None or fb.latest_seq <= after_seq:
+            return after_seq, None
+        if dst is not None and dst.shape != fb.shape:
+            dst = None
+        return fb.read(dst)
+
+    def get_last_plate_for_overlay(self, max_age_seconds=3):
+        return None  # el overlay vive en el proceso de cámara
+
+
+class AppState:
+    def __init__(self, role: str = ROLE):
+        if role not in ROLES:
+            raise ValueError(f"SMARTGATE_ROLE inválido: {role} (opciones: {', '.join(ROLES)})")
+        self.role = role
+        self.pubsub: Optional[PubSub] = None
+        self.camera_service = None
+        self.frames = None  # CameraService o SharedFrameReader
+        self.remote_status: Optional[dict] = None
+        self.remote_status_ts: Optional[float] = None
+        # Cámara -> pub/sub sin bloquear la decisión de la barrera
+        self.bus: Optional[EventBus] = None
+        # IDs de eventos asignados por el proceso que tiene la cámara
+        self._event_ids = itertools.count(int(time.time() * 1000))
+        self._running = False
+
+    @property
+    def owns_camera(self) -> bool:
+        return self.role in ("all", "camera")
+
+    # --- Ciclo de vida -----------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.pubsub = create_pubsub()
+        print(f"🧩 Rol del proceso: {self.role} · pub/sub: {self.pubsub.name}")
+
+        if self.owns_camera:
+            self.bus = EventBus()
+            self.bus.subscribe(
+                "pubsub", self._publish_detection,
+                maxsize=int(os.getenv("EVENT_BUS_SIZE", "256")),
+                policy=os.getenv("EVENT_BUS_POLICY", "drop_oldest"),
+                key=lambda data: data.get("matricula"),
+            )
+            self.pubsub.subscribe(CANAL_INVALIDAR, self._on_invalidate_message)
+
+        if self.role != "camera":
+            self.pubsub.subscribe(CANAL_DETECCIONES, self._on_detection_message)
+            self.pubsub.subscribe(CANAL_ESTADO, self._on_status_message)
+
+        if self.role == "api":
+            self.frames = SharedFrameReader(os.getenv("FRAME_BUFFER_SHM") or DEFAULT_FRAME_SHM)
+        elif self.role == "camera":
+            # La API de otros procesos lee los frames de este segmento
+            os.environ.setdefault("FRAME_BUFFER_SHM", DEFAULT_FRAME_SHM)
+            self.start_camera()
+            threading.Thread(target=self._status_loop, name="camera-status", daemon=True).start()
+        elif _enabled("ENABLE_CAMERA"):
+            print("🎥 ENABLE_CAMERA=1 → Inicializando cámara...")
+            self.start_camera()
+        else:
+            print("🔌 ENABLE_CAMERA=0 → Cámara deshabilitada en este entorno.")
+
+    def stop(self):
+        self._running = False
+        if self.camera_service is not None and self.camera_service.is_running:
+            self.camera_service.stop_capture()
+        if self.bus is not None:
+            self.bus.close()
+        if self.pubsub is not None:
+            self.pubsub.close()
+
+    # --- Cámara ---------------------------------------------------------------
+    def start_camera(self):
+        """Inicializa (si hace falta) y arranca la cámara en este proceso."""
+        if not self.owns_camera:
+            raise RuntimeError("La cámara corre en el proceso con SMARTGATE_ROLE=camera")
+        if self.camera_service is None:
+            from camera.camera_service import init_camera_service
+            from db import db_config
+            self.camera_service = init_camera_service(db_config)
+            self.camera_service.set_detection_callback(self._on_detection)
+        self.camera_service.start_background_capture()
+        self.frames = self.camera_service
+        return self.camera_service
+
+    def _on_detection(self, vehicle_data: dict):
+        """
+        Callback de la cámara: deja la detección en el bus y vuelve enseguida.
+        La publicación (red o base, según el pub/sub) corre en el hilo del bus.
+        """
+        if _enabled("DETECTIONS_LOG", ""):
+            print(f"🚗 DETECCIÓN: {vehicle_data['matricula']} - {'PERMITIDO' if vehicle_data['acceso'] else 'DENEGADO'}")
+        vehicle_data['ts_camara'] = time.time()
+        self.bus.publish(vehicle_data)
+
+    def _publish_detection(self, vehicle_data: dict):
+        self.pubsub.publish(CANAL_DETECCIONES, encode_message(next(self._event_ids), vehicle_data))
+
+    def _status_loop(self):
+        while self._running:
+            try:
+                status = {**self.camera_status(), "bus": self.bus.status()}
+                self.pubsub.publish(CANAL_ESTADO, dumps_str(status))
+            except Exception as e:
+                print(f"⚠️ No se pudo publicar el estado de la cámara: {e}")
+            time.sleep(STATUS_INTERVAL)
+
+    # --- Suscripciones (workers de la API) -----------------------------------
+    def _on_detection_message(self, message: str):
+        event_id, data = decode_message(message)
+        event_feed.publish(data, event_id=event_id)
+
+    def _on_status_message(self, message: str):
+        self.remote_status = loads(message)
+        self.remote_status_ts = time.time()
+
+    def _on_invalidate_message(self, message: str):
+        self._invalidate_local(loads(message)["tabla"])
+
+    # --- Cachés ---------------------------------------------------------------
+    def invalidate_caches(self, tabla: str):
+        """
+        Descarta lo cacheado de `tabla` después de modificarla por fuera de
+        la cámara: en este proceso y, por pub/sub, en el de la cámara (con
+        SMARTGATE_ROLE=api la cámara corre aparte y no vería el cambio).
+        """
+        self._invalidate_local(tabla)
+        if self.pubsub is not None and not self.owns_camera:
+            try:
+                self.pubsub.publish(CANAL_INVALIDAR, dumps_str({"tabla": tabla}))
+            except Exception as e:
+                print(f"⚠️ No se pudo avisar la invalidación de {tabla} a la cámara: {e}")
+
+    def _invalidate_local(self, tabla: str):
+        if tabla == "vehiculos":
+            invalidate_plate_index()
+        if tabla in TABLAS_DECISION and self.camera_service is not None:
+            self.camera_service.decisions.clear()
+
+    def camera_status(self) -> dict:
+        if self.camera_service is not None:
+            return self.camera_service.status()
+        if self.remote_status is not None:
+            return {**self.remote_status, "proceso": "camera",
+                    "antiguedad_s": round(time.time() - self.remote_status_ts, 1)}
+        return {"status": "not_initialized"}
+
+    def bus_status(self) -> Optional[dict]:
+        """Métricas del bus de la cámara (local o las que publica su proceso)."""
+        if self.bus is not None:
+            return self.bus.status()
+        return (self.remote_status or {}).get("bus")
+
+
+# Estado de este proceso (main.py lo arranca en el startup)
+state = AppState()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark del detector ANPR: fps y precisión de lectura por resolución.
+
+Uso:
+    python benchmark_anpr.py --images ruta/a/imagenes
+    python benchmark_anpr.py --images ruta --roi 0.2,0.4,0.8,1.0 --resolutions 720p,1080p,4k
+    python benchmark_anpr.py --images ruta --ocr easyocr,plate_ctc
+    python benchmark_anpr.py --images ruta --imgsz-low 320
+
+Cada imagen debe llamarse como la patente que contiene (AB123CD.jpg,
+'AB 123 CD.png'...) o listarse en un CSV `archivo,patente` con --labels.
+Las imágenes se reescalan a cada resolución para simular la cámara.
+Con varios motores de OCR (--ocr) cada uno corre en un proceso aparte para
+que la memoria residual (RSS) de uno no se sume a la del otro.
+"""
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import statistics
+import time
+
+import cv2
+from dotenv import load_dotenv
+
+from camera.detector import ANPRDetector, parse_roi
+from plates import normalize_plate
+
+load_dotenv()
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_samples(images_dir: str, labels_csv: str = None):
+    labels = {}
+    if labels_csv:
+        with open(labels_csv, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) >= 2:
+                    labels[row[0]] = normalize_plate(row[1])
+    samples = []
+    for name in sorted(os.listdir(images_dir)):
+        if not name.lower().endswith(IMAGE_EXTS):
+            continue
+        label = labels.get(name) or normalize_plate(os.path.splitext(name)[0])
+        img = cv2.imread(os.path.join(images_dir, name))
+        if img is not None:
+            samples.append((name, label, img))
+    return samples
+
+
+def rss_mb():
+    """Memoria residente del proceso en MB (None si no se puede leer)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def run(detector: ANPRDetector, samples, size, repeats: int):
+    frames = [(label, cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)) for _, label, img in samples]
+    # Warmup fuera de la medición
+    detector.detect_plate_from_frame(frames[0][1])
+
+    latencies, stages, hits = [], {}, 0
+    for _ in range(repeats):
+        for label, frame in frames:
+            t0 = time.perf_counter()
+            result = detector.detect_plate_from_frame(frame)
+            latencies.append(time.perf_counter() - t0)
+            for k, v in detector.last_timings.items():
+                if k.endswith("_ms"):
+                    stages.setdefault(k, []).append(v)
+            if result and normalize_plate(result["text"]) == label:
+                hits += 1
+    total = len(frames) * repeats
+    return {
+        "fps": total / sum(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "accuracy": hits / total,
+        "stages": {k: statistics.mean(v) for k, v in stages.items()},
+    }
+
+
+def bench_engine(args, ocr: str):
+    """Carga el detector con el motor `ocr` y mide todas las resoluciones."""
+    samples = load_samples(args.images, args.labels)
+    detector = ANPRDetector(
+        models_dir=args.models, roi=parse_roi(args.roi),
+        imgsz_low=args.imgsz_low, imgsz_high=args.imgsz_high, ocr_engine=ocr,
+    )
+    if args.preproc:
+        detector.preprocessor.mode = args.preproc
+    motores = "+".join(e.name for e in detector.ocr_engines)
+    rss_carga = rss_mb()
+    filas = []
+    for name in args.resolutions.split(","):
+        size = RESOLUTIONS[name.strip().lower()]
+        filas.append((name, run(detector, samples, size, args.repeats)))
+    return motores, rss_carga, rss_mb(), filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del detector ANPR")
+    parser.add_argument("--images", required=True, help="Carpeta con imágenes de patentes")
+    parser.add_argument("--labels", help="CSV archivo,patente (opcional)")
+    parser.add_argument("--models", default=os.getenv("MODELS_DIR", "models"))
+    parser.add_argument("--resolutions", default="720p,1080p,4k")
+    parser.add_argument("--roi", default="", help="x1,y1,x2,y2 en fracciones del frame")
+    parser.add_argument("--imgsz-low", type=int, default=int(os.getenv("INFER_IMGSZ_LOW", "640")),
+                        help="Tamaño con el carril vacío (probar 320 contra el valor por defecto)")
+    parser.add_argument("--imgsz-high", type=int, default=int(os.getenv("INFER_IMGSZ_HIGH", "640")))
+    parser.add_argument("--preproc", choices=("fast", "quality"), default=None,
+                        help="Preprocesamiento de recortes (por defecto PLATE_PREPROC)")
+    parser.add_argument("--ocr", default=os.getenv("OCR_ENGINE", "easyocr"),
+                        help="Motores de OCR a comparar, separados por coma (easyocr,plate_ctc)")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    samples = load_samples(args.images, args.labels)
+    if not samples:
+        print("❌ No se encontraron imágenes")
+        return
+
+    print(f"📋 {len(samples)} imágenes · ROI: {args.roi or 'frame completo'} · "
+          f"imgsz {args.imgsz_low}/{args.imgsz_high} · preproc {args.preproc or os.getenv('PLATE_PREPROC', 'quality')}")
+    print(f"{'ocr':<18} {'resolución':<10} {'fps':>7} {'p50 ms':>8} {'precisión':>10} {'RSS MB':>8}  etapas (ms)")
+    ctx = mp.get_context("spawn")
+    for ocr in args.ocr.split(","):
+        with ctx.Pool(1) as pool:
+            motores, rss_carga, rss_final, filas = pool.apply(bench_engine, (args, ocr.strip()))
+        rss = f"{rss_final:.0f}" if rss_final is not None else "-"
+        for name, r in filas:
+            etapas = " ".join(f"{k[:-3]}={v:.1f}" for k, v in r["stages"].items())
+            print(f"{motores:<18} {name:<10} {r['fps']:>7.2f} {r['p50_ms']:>8.1f} {r['accuracy']:>9.1%} {rss:>8}  {etapas}")
+        if rss_carga is not None:
+            print(f"   {motores}: {rss_carga:.0f} MB con los modelos cargados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialización JSON: camino anterior (pydantic + json) contra
+fastjson (orjson si está instalado).
+
+Uso:
+    python benchmark_json.py
+    python benchmark_json.py --iterations 2000 --rows 200 --subscribers 50
+
+Casos:
+- detección: `json.dumps` por suscriptor contra un `FeedEvent` codificado
+  una sola vez y reenviado a todos.
+- usuarios: página de `/users` (filas `Usuario`) con `UsersResponse` +
+  `jsonable_encoder` + `json.dumps` contra `fastjson.dumps` de las filas.
+- login: modelo `Token` de pydantic contra el dict que arma `/login`.
+"""
+import argparse
+import json
+import statistics
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+import fastjson
+from event_feed import FeedEvent
+from routers.auth import Token, UserInfo, UsersResponse, _user_info
+from rows import Usuario
+
+
+def sample_detection() -> dict:
+    return {
+        "matricula": "AB123CD",
+        "acceso": True,
+        "motivo": "Cochera al día",
+        "confianza": 0.93127,
+        "departamento": 12,
+        "propietario": "Juan Pérez",
+        "dias_restantes": 17,
+        "evidencia_id": "20240501-101512-AB123CD",
+        "timestamp": datetime.now(),
+    }
+
+
+def sample_users(n: int):
+    base = datetime(2024, 1, 1, 8, 30)
+    return [
+        Usuario(i, f"usuario{i}", f"Usuario {i}", "guardia" if i % 3 else "admin",
+                True, i % 5 == 0, base + timedelta(days=i), base + timedelta(days=i, hours=3))
+        for i in range(1, n + 1)
+    ]
+
+
+def measure(fn, iterations: int):
+    fn()  # warmup fuera de la medición
+    tiempos = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización JSON")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=100, help="Filas por página de /users")
+    parser.add_argument("--subscribers", type=int, default=20, help="Clientes WebSocket/SSE conectados")
+    args = parser.parse_args()
+
+    detection = sample_detection()
+    users = sample_users(args.rows)
+    user = users[0]
+
+    def deteccion_antes():
+        for _ in range(args.subscribers):
+            json.dumps({"type": "detection", "data": detection}, default=str)
+
+    def deteccion_ahora():
+        event = FeedEvent(1, time.time(), detection)
+        for _ in range(args.subscribers):
+            event.full_json  # el mismo texto para todos los suscriptores
+
+    def usuarios_antes():
+        body = UsersResponse(users=[asdict(u) for u in users], next_cursor=None)
+        json.dumps(jsonable_encoder(body))
+
+    def usuarios_ahora():
+        fastjson.dumps({"users": users, "next_cursor": None})
+
+    def login_antes():
+        info = UserInfo(id=user.id_usuario, username=user.username, nombre=user.nombre,
+                        rol=user.rol, primer_login=user.primer_login, activo=user.activo)
+        json.dumps(jsonable_encoder(Token(access_token="x" * 160, user_info=info)))
+
+    def login_ahora():
+        fastjson.dumps({"access_token": "x" * 160, "token_type": "bearer", "user_info": _user_info(user)})
+
+    casos = [
+        (f"detección x{args.subscribers}", deteccion_antes, deteccion_ahora),
+        (f"usuarios ({args.rows} filas)", usuarios_antes, usuarios_ahora),
+        ("login", login_antes, login_ahora),
+    ]
+    print(f"📋 Backend JSON: {'orjson' if fastjson.orjson is not None else 'json (sin orjson)'} · "
+          f"{args.iterations} iteraciones")
+    print(f"{'caso':<24} {'antes µs':>10} {'ahora µs':>10} {'mejora':>8}")
+    for nombre, antes, ahora in casos:
+        p50_antes = measure(antes, args.iterations)
+        p50_ahora = measure(ahora, args.iterations)
+        print(f"{nombre:<24} {p50_antes:>10.1f} {p50_ahora:>10.1f} {p50_antes / p50_ahora:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,634 @@
+"""
+Importación y exportación masiva de propietarios, vehículos, pagos y
+usuarios (alta de un edificio completo de una vez).
+
+Importación:
+1. El archivo (CSV o Parquet) se lee por partes y cada fila se valida y
+   normaliza en Python; los errores se juntan con su número de fila.
+2. Las filas válidas se copian con `COPY ... FROM STDIN` a una tabla
+   temporal de staging (`ON COMMIT DROP`), sin armar el archivo entero en
+   memoria. Si una clave se repite en el archivo, gana la última fila.
+3. Un upsert de conjunto pasa el staging a la tabla real en la misma
+   transacción: actualiza las filas existentes e inserta el resto. Con
+   errores no se escribe nada, salvo que se pida una importación parcial.
+
+Claves de cada tabla:
+- propietarios: email (sin distinguir mayúsculas); sin email, nombre +
+  departamento.
+- vehiculos: matrícula normalizada (`matricula_norm`). El propietario se
+  indica con `id_propietario` o `propietario_email`.
+- pagos: departamento + fecha de pago.
+- usuarios: username. Las contraseñas se hashean en paralelo
+  (BULK_HASH_WORKERS procesos) y nunca se exportan.
+
+La exportación usa `COPY (SELECT ...) TO STDOUT` con las mismas columnas
+que acepta la importación, así un export se puede volver a importar.
+Parquet requiere el paquete opcional `pyarrow`.
+"""
+import csv
+import io
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from db import get_connection, get_password_hash, table_name
+from plates import PLATE_NORM_COLUMN, normalize_plate
+
+FORMATOS = ("csv", "parquet")
+# Errores de validación que se devuelven (el total se informa aparte)
+MAX_ERRORES = int(os.getenv("BULK_MAX_ERRORS", "100"))
+# Con menos contraseñas no conviene levantar procesos para hashear
+MIN_HASH_PARALELO = 8
+# Filas por lote al leer Parquet
+PARQUET_BATCH = 10_000
+# Bytes que se le entregan a COPY por lectura
+_COPY_CHUNK = 1 << 16
+# Hasta este tamaño la exportación queda en memoria; después va a disco
+_SPOOL_BYTES = 8 << 20
+
+_VERDADERO = {"1", "true", "t", "si", "sí", "s", "yes", "y", "x"}
+_FALSO = {"0", "false", "f", "no", "n"}
+
+
+class ErrorDeFila(ValueError):
+    pass
+
+
+# ==========================================
+# Conversores de campos
+# ==========================================
+
+def _vacio(valor) -> bool:
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+
+def _texto(max_len: int) -> Callable:
+    def conv(valor):
+        texto = str(valor).strip()
+        if len(texto) > max_len:
+            raise ErrorDeFila(f"supera {max_len} caracteres")
+        return texto
+    return conv
+
+
+def _entero(valor):
+    if isinstance(valor, bool):
+        raise ErrorDeFila("no es un entero")
+    if isinstance(valor, int):
+        return valor
+    try:
+        return int(str(valor).strip())
+    except ValueError:
+        raise ErrorDeFila(f"'{valor}' no es un entero")
+
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in _VERDADERO:
+        return True
+    if texto in _FALSO:
+        return False
+    raise ErrorDeFila(f"'{valor}' no es sí/no")
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ErrorDeFila(f"'{valor}' no es una fecha (AAAA-MM-DD o DD/MM/AAAA)")
+
+
+def _monto(valor):
+    try:
+        monto = Decimal(str(valor).strip().replace(",", "."))
+    except InvalidOperation:
+        raise ErrorDeFila(f"'{valor}' no es un monto")
+    if not monto.is_finite() or monto < 0:
+        raise ErrorDeFila(f"monto inválido: {valor}")
+    return monto
+
+
+def _estado(valor):
+    if isinstance(valor, str) and valor.strip().lower() in ("permitido", "denegado"):
+        return 1 if valor.strip().lower() == "permitido" else 0
+    estado = _entero(valor)
+    if estado not in (0, 1):
+        raise ErrorDeFila("debe ser 1 (permitido) o 0 (denegado)")
+    return estado
+
+
+def _rol(valor):
+    rol = str(valor).strip().lower()
+    if rol not in ("admin", "ope"):
+        raise ErrorDeFila("debe ser 'admin' u 'ope'")
+    return rol
+
+
+def _email(valor):
+    email = _texto(100)(valor).lower()
+    if "@" not in email:
+        raise ErrorDeFila(f"'{valor}' no es un email")
+    return email
+
+
+# ==========================================
+# Especificación de cada tabla
+# ==========================================
+
+class Campo(NamedTuple):
+    nombre: str
+    tipo: str          # tipo SQL de la columna de staging
+    conv: Callable
+    requerido: bool = False
+
+
+class Tabla(NamedTuple):
+    nombre: str
+    campos: tuple
+    # Clave de deduplicación dentro del archivo (fila ya convertida)
+    clave: Callable[[dict], str]
+    # Sentencias sobre el staging `s`: (fila, mensaje) de las filas que no se
+    # pueden aplicar; y el upsert, que retorna (actualizadas, insertadas)
+    verificar: Optional[str]
+    upsert: str
+    exportar: str
+
+
+def _staging(nombre: str) -> str:
+    return f"importacion_{nombre}"
+
+
+def _upsert(destino: str, actualizar: str, donde: str, columnas: str, valores: str,
+            origen: Optional[str] = None) -> str:
+    """
+    UPDATE de las filas que ya existen + INSERT del resto en una sola
+    sentencia; `origen` es el staging (o una CTE sobre él) con alias `s`.
+    """
+    origen = origen or f"{_staging(destino)} s"
+    return f"""
+        WITH act AS (
+            UPDATE {table_name(destino)} t SET {actualizar}
+            FROM {origen} WHERE {donde}
+            RETURNING s.fila
+        ), ins AS (
+            INSERT INTO {table_name(destino)} ({columnas})
+            SELECT {valores} FROM {origen}
+            WHERE s.fila NOT IN (SELECT fila FROM act)
+            RETURNING 1
+        )
+        SELECT (SELECT count(DISTINCT fila) FROM act), (SELECT count(*) FROM ins)
+    """
+
+
+PROPIETARIOS = Tabla(
+    nombre="propietarios",
+    campos=(
+        Campo("nombre", "VARCHAR(100)", _texto(100), requerido=True),
+        Campo("telefono", "VARCHAR(20)", _texto(20)),
+        Campo("email", "VARCHAR(100)", _email),
+        Campo("id_departamento", "INTEGER", _entero),
+        Campo("activo", "BOOLEAN", _booleano),
+    ),
+    clave=lambda f: f["email"] or f"{f['nombre'].lower()}|{f['id_departamento'] or ''}",
+    verificar=f"""
+        SELECT s.fila, 'departamento ' || s.id_departamento || ' inexistente'
+        FROM {_staging('propietarios')} s
+        WHERE s.id_departamento IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM {table_name('departamentos')} d WHERE d.id_departamento = s.id_departamento)
+    """,
+    upsert=_upsert(
+        "propietarios",
+        actualizar="""nombre = s.nombre, telefono = COALESCE(s.telefono, t.telefono),
+            id_departamento = COALESCE(s.id_departamento, t.id_departamento),
+            activo = COALESCE(s.activo, t.activo)""",
+        # Misma clave que `clave`, para que el cruce sea un hash join
+        donde="""s.clave = COALESCE(lower(t.email),
+                                lower(t.nombre) || '|' || COALESCE(t.id_departamento::text, ''))""",
+        columnas="nombre, telefono, email, id_departamento, activo",
+        valores="s.nombre, s.telefono, s.email, s.id_departamento, COALESCE(s.activo, TRUE)",
+    ),
+    exportar=f"""
+        SELECT nombre, telefono, email, id_departamento, activo
+        FROM {table_name('propietarios')} ORDER BY id_propietario
+    """,
+)
+
+# Propietario de cada fila de vehículos: el id explícito o el del email
+_VEHICULOS_ORIGEN = f"""(
+    SELECT v.*, COALESCE(v.id_propietario, p.id_propietario) AS propietario
+    FROM {_staging('vehiculos')} v
+    LEFT JOIN (
+        SELECT DISTINCT ON (lower(email)) lower(email) AS email, id_propietario
+        FROM {table_name('propietarios')} WHERE email IS NOT NULL
+        ORDER BY lower(email), id_propietario
+    ) p ON p.email = v.propietario_email
+) s"""
+
+VEHICULOS = Tabla(
+    nombre="vehiculos",
+    campos=(
+        Campo("matricula", "VARCHAR(20)", _texto(20), requerido=True),
+        Campo("marca", "VARCHAR(50)", _texto(50)),
+        Campo("modelo", "VARCHAR(50)", _texto(50)),
+        Campo("color", "VARCHAR(30)", _texto(30)),
+        Campo("estado", "INTEGER", _estado),
+        Campo("activo", "BOOLEAN", _booleano),
+        Campo("id_propietario", "INTEGER", _entero),
+        Campo("propietario_email", "VARCHAR(100)", _email),
+    ),
+    clave=lambda f: normalize_plate(f["matricula"]),
+    verificar=f"""
+        SELECT s.fila, CASE WHEN s.propietario_email IS NOT NULL
+                            THEN 'no hay propietario con email ' || s.propietario_email
+                            ELSE 'propietario ' || s.id_propietario || ' inexistente' END
+        FROM {_staging('vehiculos')} s
+        WHERE (s.id_propietario IS NOT NULL AND NOT EXISTS (
+                   SELECT 1 FROM {table_name('propietarios')} p WHERE p.id_propietario = s.id_propietario))
+           OR (s.id_propietario IS NULL AND s.propietario_email IS NOT NULL AND NOT EXISTS (
+                   SELECT 1 FROM {table_name('propietarios')} p WHERE lower(p.email) = s.propietario_email))
+    """,
+    upsert=_upsert(
+        "vehiculos",
+        actualizar="""marca = COALESCE(s.marca, t.marca), modelo = COALESCE(s.modelo, t.modelo),
+            color = COALESCE(s.color, t.color), estado = COALESCE(s.estado, t.estado),
+            activo = COALESCE(s.activo, t.activo),
+            id_propietario = COALESCE(s.propietario, t.id_propietario)""",
+        donde=f"t.{PLATE_NORM_COLUMN} = s.clave",
+        columnas="matricula, marca, modelo, color, estado, activo, id_propietario",
+        valores="""s.matricula, s.marca, s.modelo, s.color, COALESCE(s.estado, 1),
+            COALESCE(s.activo, TRUE), s.propietario""",
+        origen=_VEHICULOS_ORIGEN,
+    ),
+    exportar=f"""
+        SELECT v.matricula, v.marca, v.modelo, v.color, v.estado, v.activo,
+               v.id_propietario, p.email AS propietario_email
+        FROM {table_name('vehiculos')} v
+        LEFT JOIN {table_name('propietarios')} p ON p.id_propietario = v.id_propietario
+        ORDER BY v.id_vehiculo
+    """,
+)
+
+PAGOS = Tabla(
+    nombre="pagos",
+    campos=(
+        Campo("id_departamento", "INTEGER", _entero, requerido=True),
+        Campo("fecha_pago", "DATE", _fecha, requerido=True),
+        Campo("monto", "NUMERIC", _monto),
+    ),
+    clave=lambda f: f"{f['id_departamento']}|{f['fecha_pago']}",
+    verificar=f"""
+        SELECT s.fila, 'departamento ' || s.id_departamento || ' inexistente'
+        FROM {_staging('pagos')} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table_name('departamentos')} d WHERE d.id_departamento = s.id_departamento)
+    """,
+    upsert=_upsert(
+        "pagos",
+        actualizar="monto = COALESCE(s.monto, t.monto)",
+        donde="t.id_departamento = s.id_departamento AND t.fecha_pago = s.fecha_pago",
+        columnas="id_departamento, fecha_pago, monto",
+        valores="s.id_departamento, s.fecha_pago, s.monto",
+    ),
+    exportar=f"""
+        SELECT id_departamento, fecha_pago, monto
+        FROM {table_name('pagos')} ORDER BY id_departamento, fecha_pago
+    """,
+)
+
+USUARIOS = Tabla(
+    nombre="usuarios",
+    campos=(
+        Campo("username", "VARCHAR(50)", _texto(50), requerido=True),
+        Campo("nombre", "VARCHAR(100)", _texto(100), requerido=True),
+        Campo("rol", "VARCHAR(10)", _rol),
+        Campo("activo", "BOOLEAN", _booleano),
+        # Se reemplaza por el hash antes del COPY
+        Campo("password", "VARCHAR(255)", str),
+    ),
+    clave=lambda f: f["username"],
+    verificar=f"""
+        SELECT s.fila, 'usuario nuevo sin contraseña'
+        FROM {_staging('usuarios')} s
+        WHERE s.password IS NULL AND NOT EXISTS (
+            SELECT 1 FROM {table_name('usuarios')} u WHERE u.username = s.username)
+    """,
+    upsert=_upsert(
+        "usuarios",
+        actualizar="""nombre = s.nombre, rol = COALESCE(s.rol, t.rol),
+            activo = COALESCE(s.activo, t.activo),
+            password_hash = COALESCE(s.password, t.password_hash),
+            primer_login = CASE WHEN s.password IS NULL THEN t.primer_login ELSE TRUE END""",
+        donde="t.username = s.username",
+        columnas="username, password_hash, nombre, rol, activo, primer_login",
+        valores="s.username, s.password, s.nombre, COALESCE(s.rol, 'ope'), COALESCE(s.activo, TRUE), TRUE",
+    ),
+    exportar=f"""
+        SELECT username, nombre, rol, activo
+        FROM {table_name('usuarios')} ORDER BY id_usuario
+    """,
+)
+
+TABLAS: Dict[str, Tabla] = {t.nombre: t for t in (PROPIETARIOS, VEHICULOS, PAGOS, USUARIOS)}
+
+
+def _crear_staging(tabla: Tabla) -> str:
+    columnas = ", ".join(f"{c.nombre} {c.tipo}" for c in tabla.campos)
+    return (f"CREATE TEMP TABLE {_staging(tabla.nombre)} "
+            f"(fila INTEGER, clave TEXT, {columnas}) ON COMMIT DROP")
+
+
+def _copy_staging(tabla: Tabla) -> str:
+    columnas = ", ".join(c.nombre for c in tabla.campos)
+    return f"COPY {_staging(tabla.nombre)} (fila, clave, {columnas}) FROM STDIN WITH (FORMAT csv)"
+
+
+# Si una clave se repite en el archivo queda la última fila
+def _dedup_staging(tabla: Tabla) -> str:
+    stg = _staging(tabla.nombre)
+    return f"DELETE FROM {stg} a USING {stg} b WHERE a.clave = b.clave AND a.fila < b.fila"
+
+
+# ==========================================
+# Lectura y validación
+# ==========================================
+
+def _delimitador(primera_linea: str) -> str:
+    """Excel en español guarda el CSV con `;`."""
+    return ";" if primera_linea.count(";") > primera_linea.count(",") else ","
+
+
+def leer_csv(archivo) -> Iterator[dict]:
+    """Filas de un CSV (binario, UTF-8 con o sin BOM) como dicts."""
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    primera = texto.readline()
+    if not primera:
+        return
+    lector = csv.DictReader(
+        _encadenar(primera, texto),
+        delimiter=_delimitador(primera),
+    )
+    yield from lector
+
+
+def _encadenar(primera: str, resto) -> Iterator[str]:
+    yield primera
+    yield from resto
+
+
+def leer_parquet(archivo) -> Iterator[dict]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Importar Parquet requiere `pip install pyarrow`")
+    for lote in pq.ParquetFile(archivo).iter_batches(batch_size=PARQUET_BATCH):
+        yield from lote.to_pylist()
+
+
+def leer(archivo, formato: str) -> Iterator[dict]:
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (opciones: {', '.join(FORMATOS)})")
+    return leer_parquet(archivo) if formato == "parquet" else leer_csv(archivo)
+
+
+class Resultado:
+    def __init__(self, tabla: str):
+        self.tabla = tabla
+        self.filas = 0
+        self.validas = 0
+        self.insertadas = 0
+        self.actualizadas = 0
+        self.total_errores = 0
+        self.errores: List[dict] = []
+        self.aplicado = False
+
+    def error(self, fila: int, mensaje: str):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"fila": fila, "error": mensaje})
+
+    def to_dict(self) -> dict:
+        return {
+            "tabla": self.tabla,
+            "filas": self.filas,
+            "validas": self.validas,
+            "insertadas": self.insertadas,
+            "actualizadas": self.actualizadas,
+            "aplicado": self.aplicado,
+            "total_errores": self.total_errores,
+            "errores": self.errores,
+        }
+
+
+def verificar_columnas(tabla: Tabla, registro: dict):
+    columnas = {str(k).strip().lower() for k in registro if k is not None}
+    faltan = [c.nombre for c in tabla.campos if c.requerido and c.nombre not in columnas]
+    if faltan:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltan)}")
+
+
+def validar(tabla: Tabla, registros: Iterable[dict], resultado: Resultado) -> Iterator[tuple]:
+    """
+    Convierte cada registro a la tupla del staging (fila, clave, campos...).
+    Las filas inválidas se anotan en `resultado` y se saltean. La fila 1 es
+    la primera de datos (en CSV, la línea 2).
+    """
+    nombres = [c.nombre for c in tabla.campos]
+    for n, registro in enumerate(registros, start=1):
+        resultado.filas = n
+        registro = {str(k).strip().lower(): v for k, v in registro.items() if k is not None}
+        fila, problemas = {}, []
+        for campo in tabla.campos:
+            valor = registro.get(campo.nombre)
+            if _vacio(valor):
+                if campo.requerido:
+                    problemas.append(f"{campo.nombre}: obligatorio")
+                fila[campo.nombre] = None
+                continue
+            try:
+                fila[campo.nombre] = campo.conv(valor)
+            except ErrorDeFila as e:
+                problemas.append(f"{campo.nombre}: {e}")
+        if not problemas and tabla is VEHICULOS and not normalize_plate(fila["matricula"]):
+            problemas.append("matricula: sin letras ni números")
+        if problemas:
+            resultado.error(n, "; ".join(problemas))
+            continue
+        resultado.validas += 1
+        yield (n, tabla.clave(fila), *(fila[c] for c in nombres))
+
+
+def hashear_contrasenas(filas: List[tuple], posicion: int, workers: Optional[int] = None) -> List[tuple]:
+    """
+    Reemplaza la contraseña en `posicion` de cada fila por su hash bcrypt.
+    bcrypt es CPU puro y deliberadamente lento: el trabajo se reparte en
+    procesos (BULK_HASH_WORKERS, por defecto uno por núcleo).
+    """
+    workers = workers or int(os.getenv("BULK_HASH_WORKERS", "0")) or os.cpu_count() or 1
+    pendientes = [i for i, fila in enumerate(filas) if fila[posicion] is not None]
+    claves = [filas[i][posicion] for i in pendientes]
+    if workers <= 1 or len(claves) < MIN_HASH_PARALELO:
+        hashes = map(get_password_hash, claves)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(claves)),
+                                 mp_context=mp.get_context("spawn")) as pool:
+            hashes = list(pool.map(get_password_hash, claves, chunksize=4))
+    for i, hashed in zip(pendientes, hashes):
+        fila = filas[i]
+        filas[i] = (*fila[:posicion], hashed, *fila[posicion + 1:])
+    return filas
+
+
+class CopySource(io.RawIOBase):
+    """
+    Archivo de solo lectura que serializa tuplas a CSV a medida que COPY lo
+    lee: el volumen importado no se arma entero en memoria.
+    """
+
+    def __init__(self, filas: Iterable[tuple]):
+        self._filas = iter(filas)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pendiente = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        size = _COPY_CHUNK if size is None or size < 0 else size
+        while len(self._pendiente) < size:
+            fila = next(self._filas, None)
+            if fila is None:
+                break
+            self._writer.writerow(fila)
+            if self._buffer.tell() >= _COPY_CHUNK:
+                self._vaciar()
+        if len(self._pendiente) < size:
+            self._vaciar()
+        datos, self._pendiente = self._pendiente[:size], self._pendiente[size:]
+        return datos
+
+    def _vaciar(self):
+        self._pendiente += self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+
+# ==========================================
+# Importación
+# ==========================================
+
+def importar(nombre: str, archivo, formato: str = "csv", simular: bool = False,
+             parcial: bool = False) -> dict:
+    """
+    Importa `archivo` (binario) en la tabla `nombre`. `simular` valida y
+    calcula lo que cambiaría sin confirmar; `parcial` aplica las filas
+    válidas aunque otras tengan errores.
+    """
+    tabla = TABLAS.get(nombre)
+    if tabla is None:
+        raise ValueError(f"Tabla inválida: {nombre} (opciones: {', '.join(TABLAS)})")
+    resultado = Resultado(nombre)
+    inicio = time.perf_counter()
+    registros = leer(archivo, formato)
+    primero = next(registros, None)
+    if primero is not None:
+        verificar_columnas(tabla, primero)
+        registros = _encadenar(primero, registros)
+    filas = validar(tabla, registros, resultado)
+    if tabla is USUARIOS:
+        # El hash es lo caro: se juntan las filas para repartirlo en procesos
+        posicion = 2 + [c.nombre for c in tabla.campos].index("password")
+        filas = hashear_contrasenas(list(filas), posicion)
+
+    # Conexión propia (no del pool): la carga puede llevar varios segundos
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(_crear_staging(tabla))
+            cur.copy_expert(_copy_staging(tabla), CopySource(filas), size=_COPY_CHUNK)
+            cur.execute(_dedup_staging(tabla))
+            if tabla.verificar:
+                cur.execute(tabla.verificar)
+                rechazadas = set()
+                for fila, mensaje in cur.fetchall():
+                    resultado.error(fila, mensaje)
+                    rechazadas.add(fila)
+                resultado.validas -= len(rechazadas)
+                if rechazadas and parcial:
+                    cur.execute(f"DELETE FROM {_staging(nombre)} WHERE fila = ANY(%s)", (list(rechazadas),))
+            aplicar = parcial or not resultado.total_errores
+            if aplicar:
+                # Una importación por tabla a la vez: el upsert decide qué filas
+                # existen y dos cargas simultáneas duplicarían las nuevas
+                cur.execute(f"LOCK TABLE {table_name(nombre)} IN SHARE ROW EXCLUSIVE MODE")
+                cur.execute(tabla.upsert)
+                resultado.actualizadas, resultado.insertadas = cur.fetchone()
+        if simular or not aplicar:
+            conn.rollback()
+        else:
+            conn.commit()
+            resultado.aplicado = True
+    finally:
+        conn.close()
+
+    datos = resultado.to_dict()
+    datos["simulado"] = simular
+    datos["ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+    return datos
+
+
+# ==========================================
+# Exportación
+# ==========================================
+
+def exportar(nombre: str, formato: str = "csv"):
+    """
+    Vuelca la tabla con `COPY ... TO STDOUT` a un archivo temporal (en
+    memoria hasta `_SPOOL_BYTES`) y lo retorna posicionado al inicio.
+    """
+    tabla = TABLAS.get(nombre)
+    if tabla is None:
+        raise ValueError(f"Tabla inválida: {nombre} (opciones: {', '.join(TABLAS)})")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (opciones: {', '.join(FORMATOS)})")
+    salida = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES, mode="w+b")
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY ({tabla.exportar}) TO STDOUT WITH (FORMAT csv, HEADER)", salida)
+    finally:
+        conn.close()
+    salida.seek(0)
+    if formato == "parquet":
+        salida = _csv_a_parquet(salida)
+    return salida
+
+
+def _csv_a_parquet(origen):
+    try:
+        import pyarrow.csv as pacsv
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exportar Parquet requiere `pip install pyarrow`")
+    # COPY escribe los booleanos como t/f y los NULL como campo vacío
+    opciones = pacsv.ConvertOptions(true_values=["t"], false_values=["f"], strings_can_be_null=True)
+    with origen:
+        tabla = pacsv.read_csv(origen, convert_options=opciones)
+    salida = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES, mode="w+b")
+    pq.write_table(tabla, salida)
+    salida.seek(0)
+    return salida
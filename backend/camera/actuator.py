@@ -0,0 +1,218 @@
+"""
+Salida a la barrera: convierte una decisión de acceso en un comando al
+relé que la abre.
+
+Drivers (ACTUATOR):
+- `off` (por defecto): sin salida ni plazo; la decisión espera a la base.
+- `http`: relé por HTTP (Shelly, ESP8266, módulos Ethernet...). La URL
+  admite `{lane}` y `{pulse_s}`.
+- `gpio`: pin de una Raspberry Pi con el paquete opcional `gpiozero`.
+- `simulated`: no toca hardware; registra los comandos (pruebas). Aplica
+  el plazo como un driver real.
+
+Plazo de punta a punta (ACTUATION_DEADLINE_MS): desde que se captura el
+frame hasta que sale el comando. La consulta de la decisión se corta al
+vencer el plazo (ver `CameraService._decide`); sin decisión se aplica la
+política de falla (ACTUATOR_FAIL_MODE):
+
+- `closed` (por defecto): la barrera no se abre; el guardia decide desde
+  la UI. Seguro ante caídas de la base, a costa de demorar residentes.
+- `open`: la barrera se abre; prioriza no bloquear la entrada (p.ej.
+  salidas o emergencias) a costa de dejar pasar sin verificar.
+
+Si el driver falla (relé inalcanzable) la barrera queda como esté: el
+comando no se reintenta fuera de plazo.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+import urllib.request
+from collections import deque
+from typing import Optional
+
+from event_bus import LatencyStats
+
+FAIL_MODES = ("closed", "open")
+# Tiempo mínimo que se le da al driver aunque el plazo ya esté por vencer
+MIN_ACTUATION_S = 0.2
+
+
+class ActuatorDriver(ABC):
+    name = "base"
+
+    @abstractmethod
+    def open(self, lane, timeout: float):
+        """Envía el pulso de apertura. Lanza una excepción si falla."""
+
+    def close(self):
+        pass
+
+
+class SimulatedDriver(ActuatorDriver):
+    """Registra los comandos en memoria (últimos `history`)."""
+
+    name = "simulated"
+
+    def __init__(self, latency_ms: float = 0.0, history: int = 100):
+        self.latency = latency_ms / 1000.0
+        self.commands = deque(maxlen=history)
+
+    def open(self, lane, timeout: float):
+        if self.latency:
+            time.sleep(min(self.latency, timeout))
+        self.commands.append((time.time(), lane))
+
+
+class HTTPRelayDriver(ActuatorDriver):
+    name = "http"
+
+    def __init__(self, url: str, method: str = "GET", pulse_ms: int = 1000):
+        self.url = url
+        self.method = method.upper()
+        self.pulse_s = pulse_ms / 1000.0
+
+    def open(self, lane, timeout: float):
+        url = self.url.format(lane=lane, pulse_s=self.pulse_s)
+        req = urllib.request.Request(url, method=self.method, data=b"" if self.method == "POST" else None)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            if resp.status >= 300:
+                raise RuntimeError(f"Relé HTTP respondió {resp.status}")
+
+
+class GPIODriver(ActuatorDriver):
+    """Pulso de `pulse_ms` en un pin; el apagado corre en un timer."""
+
+    name = "gpio"
+
+    def __init__(self, pin: int, pulse_ms: int = 1000, active_high: bool = True):
+        try:
+            from gpiozero import OutputDevice
+        except ImportError:
+            raise RuntimeError("ACTUATOR=gpio requiere `pip install gpiozero`")
+        self.device = OutputDevice(pin, active_high=active_high, initial_value=False)
+        self.pulse_s = pulse_ms / 1000.0
+        self._timer: Optional[threading.Timer] = None
+
+    def open(self, lane, timeout: float):
+        self.device.on()
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.pulse_s, self.device.off)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self.device.off()
+        self.device.close()
+
+
+class Actuator:
+    """
+    Aplica la decisión al driver dentro del plazo y registra los tiempos de
+    cada evento (captura → decisión → comando).
+    """
+
+    def __init__(self, driver: ActuatorDriver, deadline_ms: float = 1500, fail_mode: str = "closed"):
+        if fail_mode not in FAIL_MODES:
+            raise ValueError(f"ACTUATOR_FAIL_MODE inválido: {fail_mode} (opciones: {', '.join(FAIL_MODES)})")
+        self.driver = driver
+        self.deadline = deadline_ms / 1000.0
+        self.fail_mode = fail_mode
+        self._lock = threading.Lock()
+        self.counters = {"abiertas": 0, "denegadas": 0, "sin_decision": 0,
+                         "fuera_de_plazo": 0, "errores_driver": 0}
+        self.total_latency = LatencyStats()
+        self.recent = deque(maxlen=50)
+
+    def remaining(self, captured: float) -> float:
+        """Segundos que quedan del plazo para un frame capturado en `captured`."""
+        return self.deadline - (time.time() - captured)
+
+    def actuate(self, lane, acceso: Optional[bool], captured: float, decided: float, fuente: str) -> dict:
+        """
+        `acceso` None = no hubo decisión a tiempo (se aplica `fail_mode`).
+        Retorna el registro de tiempos, que viaja con el evento.
+        """
+        abrir = acceso if acceso is not None else self.fail_mode == "open"
+        registro = {
+            "fuente": fuente,
+            "decision_ms": round((decided - captured) * 1000, 1),
+            "plazo_ms": round(self.deadline * 1000),
+            "comando": "abrir" if abrir else None,
+            "resultado": "cerrada",
+        }
+        error = None
+        if abrir:
+            t0 = time.time()
+            try:
+                self.driver.open(lane, timeout=max(self.remaining(captured), MIN_ACTUATION_S))
+                registro["resultado"] = "abierta"
+            except Exception as e:
+                error = str(e)
+                registro["resultado"] = "error"
+                print(f"❌ No se pudo abrir la barrera ({self.driver.name}): {e}")
+            registro["actuacion_ms"] = round((time.time() - t0) * 1000, 1)
+        total = time.time() - captured
+        registro["total_ms"] = round(total * 1000, 1)
+        registro["en_plazo"] = total <= self.deadline
+        if acceso is None:
+            registro["politica"] = f"fail-{self.fail_mode}"
+
+        with self._lock:
+            if error:
+                self.counters["errores_driver"] += 1
+            elif abrir:
+                self.counters["abiertas"] += 1
+            else:
+                self.counters["denegadas"] += 1
+            if acceso is None:
+                self.counters["sin_decision"] += 1
+            if not registro["en_plazo"]:
+                self.counters["fuera_de_plazo"] += 1
+            self.total_latency.add(total * 1000)
+            self.recent.append({"ts": time.time(), "lane": lane, **registro})
+        return registro
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "driver": self.driver.name,
+                "plazo_ms": round(self.deadline * 1000),
+                "politica_falla": self.fail_mode,
+                **self.counters,
+                "latencia_total": self.total_latency.summary(),
+                "ultimo": self.recent[-1] if self.recent else None,
+            }
+
+    def close(self):
+        self.driver.close()
+
+
+def create_actuator() -> Optional[Actuator]:
+    """Actuador según ACTUATOR (off, http, gpio, simulated); None sin barrera."""
+    kind = os.getenv("ACTUATOR", "off").strip().lower()
+    pulse_ms = int(os.getenv("ACTUATOR_PULSE_MS", "1000"))
+    if kind in ("", "off", "0", "none"):
+        return None
+    if kind == "simulated":
+        driver = SimulatedDriver(latency_ms=float(os.getenv("ACTUATOR_SIM_LATENCY_MS", "0")))
+    elif kind == "http":
+        url = os.getenv("ACTUATOR_HTTP_URL")
+        if not url:
+            raise RuntimeError("ACTUATOR=http requiere ACTUATOR_HTTP_URL")
+        driver = HTTPRelayDriver(url, method=os.getenv("ACTUATOR_HTTP_METHOD", "GET"), pulse_ms=pulse_ms)
+    elif kind == "gpio":
+        driver = GPIODriver(
+            int(os.getenv("ACTUATOR_GPIO_PIN", "17")), pulse_ms=pulse_ms,
+            active_high=os.getenv("ACTUATOR_GPIO_ACTIVE_HIGH", "1").lower() in ("1", "true", "yes", "on"),
+        )
+    else:
+        raise ValueError(f"ACTUATOR inválido: {kind} (opciones: off, http, gpio, simulated)")
+    return Actuator(
+        driver,
+        deadline_ms=float(os.getenv("ACTUATION_DEADLINE_MS", "1500")),
+        fail_mode=os.getenv("ACTUATOR_FAIL_MODE", "closed").strip().lower(),
+    )
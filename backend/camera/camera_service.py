@@ -3,16 +3,30 @@ import numpy as np
 import threading
 import time
 import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import Optional, Callable
+from typing import Optional, Callable, Tuple
 import json
 import os
-from .detector import ANPRDetector
+from psycopg2.extras import RealDictCursor
+import queries
+from access_log import get_access_log_writer
+from db import decision_acceso, pooled_connection
+from plate_index import get_plate_index, PLATE_FUZZY_MIN_SCORE
+from plates import normalize_plate
+import rows
+from .actuator import Actuator, create_actuator
+from .capture import ExponentialBackoff, VideoSource, open_source
+from .dedup import DecisionCache, PlateDedup
+from .detector import ANPRDetector, parse_roi
+from .edge_replica import EdgeReplica
+from .evidence_store import EvidenceStore, get_evidence_store
+from .frame_buffer import FrameRingBuffer
+from .inference_pool import InferencePool
 
-# Schema de la base de datos (public es el default en PostgreSQL)
-DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
+# Tiempo mínimo de consulta de la decisión aunque el plazo esté por vencer:
+# una consulta a la base por red con el pool ocupado tarda cientos de ms
+MIN_LOOKUP_S = float(os.getenv('ACTUATION_MIN_LOOKUP_MS', '300')) / 1000.0
 
 # Silenciar logs verbosos de OpenCV
 try:
@@ -22,68 +36,208 @@ except Exception:
 	pass
 
 class CameraService:
-    def __init__(self, camera_id=0, db_config=None, models_dir=None):
+    def __init__(self, camera_id=0, db_config=None, models_dir=None, edge_replica: Optional[EdgeReplica] = None,
+                 inference_workers: int = 0, evidence_store: Optional[EvidenceStore] = None,
+                 access_log=None, actuator: Optional[Actuator] = None):
         self.camera_id = camera_id
         self.db_config = db_config
+        self.edge_replica = edge_replica  # Modo borde: decisiones con la réplica local
+        self.evidence_store = evidence_store  # Imágenes de cada detección confirmada
+        self.access_log = access_log  # AccessLogWriter: eventos a `eventos_acceso` (sin modo borde)
+        self.actuator = actuator  # Salida a la barrera (relé), con plazo desde la captura
         self.is_running = False
-        self.current_frame = None
+        # Frames en un buffer circular preasignado (se crea con el primer frame)
+        self.frame_buffer: Optional[FrameRingBuffer] = None
+        self.frame_slots = int(os.getenv('FRAME_BUFFER_SLOTS', '4'))
+        self.frame_shm_name = os.getenv('FRAME_BUFFER_SHM') or None  # memoria compartida entre procesos
         self.detection_callback = None
         self.last_detection_time = None
-        self.detection_cooldown = 3  # Segundos entre detecciones de la misma patente
-        self.detector = ANPRDetector(models_dir=models_dir) if models_dir else None
+        # Repeticiones de la misma patente en este carril: sin consulta ni aviso
+        self.dedup = PlateDedup(
+            window=float(os.getenv('DEDUP_WINDOW', '5')),
+            max_hold=float(os.getenv('DEDUP_MAX_HOLD', '60')),
+            max_entries=int(os.getenv('DEDUP_MAX_ENTRIES', '1024')),
+            retry=float(os.getenv('DEDUP_RETRY', '0.5')),
+        )
+        # Decisiones recientes: la fuente más rápida antes que réplica/base
+        self.decisions = DecisionCache(ttl=float(os.getenv('DECISION_CACHE_TTL', '30')))
+        # Consultas de decisión con tiempo límite (la que vence sigue y llena la caché)
+        self._lookup = ThreadPoolExecutor(max_workers=2, thread_name_prefix="decision")
+        # Una sola consulta en curso por patente: los reintentos esperan la misma
+        self._inflight: dict = {}
+        self._inflight_lock = threading.Lock()
+        # Con inference_workers > 0 los modelos se cargan en procesos aparte
+        # y los frames se comparten por memoria compartida
+        self.inference_pool: Optional[InferencePool] = None
+        self.detector = None
+        # ROI del carril para esta cámara (CAMERA_ROI_<id> o CAMERA_ROI)
+        self.roi = parse_roi(os.getenv(f'CAMERA_ROI_{camera_id}') or os.getenv('CAMERA_ROI', ''))
+        if models_dir and inference_workers > 0:
+            self.frame_shm_name = self.frame_shm_name or f"smartgate_frames_{os.getpid()}"
+            self.inference_pool = InferencePool(
+                models_dir, self.frame_shm_name, workers=inference_workers,
+                torch_threads=int(os.getenv('INFERENCE_TORCH_THREADS', '0')) or None,
+                cv2_threads=int(os.getenv('INFERENCE_CV2_THREADS', '1')),
+                on_result=self._on_inference_result,
+                detector_kwargs={'roi': self.roi},
+            )
+        elif models_dir:
+            self.detector = ANPRDetector(models_dir=models_dir, roi=self.roi)
         self.last_plate_overlay = None  # {'text':str, 'bbox':[x1,y1,x2,y2], 'ts':float}
-        
+        # Reconexión: lecturas fallidas seguidas antes de reabrir la fuente
+        self.max_read_failures = int(os.getenv('CAPTURE_MAX_FAILURES', '5'))
+        self.reconnect_backoff = ExponentialBackoff(
+            base=float(os.getenv('CAPTURE_RETRY_MIN', '0.5')),
+            maximum=float(os.getenv('CAPTURE_RETRY_MAX', '30')),
+        )
+        # Sin actividad durante este tiempo la fuente pasa a reposo (0 = nunca)
+        self.idle_after = float(os.getenv('CAPTURE_IDLE_AFTER', '0'))
+        self.last_activity = time.time()
+        self._stop_event = threading.Event()
+        self.source: Optional[VideoSource] = None
+
     def set_detection_callback(self, callback: Callable):
         """Establece el callback para cuando se detecte una patente"""
         self.detection_callback = callback
     
     def start_background_capture(self):
         """Inicia la captura en segundo plano"""
+        if self.is_running:
+            return
+        if self.inference_pool is not None and not self.inference_pool.running:
+            self.inference_pool.start()
+        if self.detector is not None and self.detector.warm_state == "cold" and \
+                os.getenv('MODEL_WARMUP', '1').lower() in ('1', 'true', 'yes', 'on'):
+            # Warmup en paralelo con la apertura de la cámara; mientras dura
+            # los frames se muestran pero no se infieren
+            self.detector.warm_state = "warming"
+            threading.Thread(target=self._warmup_detector, name="anpr-warmup", daemon=True).start()
+        if self.evidence_store is not None:
+            self.evidence_store.start()
         self.is_running = True
+        self._stop_event.clear()
         self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
         self.capture_thread.start()
         print("🎥 Cámara iniciada en segundo plano")
     
+    def _warmup_detector(self):
+        ms = self.detector.warmup()
+        if ms is not None:
+            print(f"🔥 Detector en caliente ({ms:.0f} ms de warmup)")
+
     def stop_capture(self):
         """Detiene la captura"""
         self.is_running = False
+        self._stop_event.set()
         if hasattr(self, 'capture_thread'):
             self.capture_thread.join()
+        if self.inference_pool is not None and self.inference_pool.running:
+            self.inference_pool.stop()
+        fb = self.frame_buffer
+        if fb is not None and fb.name is not None:
+            # Borrar el segmento de /dev/shm; el mapeo se libera cuando los
+            # lectores de este proceso sueltan el buffer. Al volver a arrancar
+            # se crea uno nuevo con el primer frame
+            self.frame_buffer = None
+            fb.unlink()
         print("🎥 Cámara detenida")
     
     def _capture_loop(self):
-        """Loop principal de captura"""
-        cap = self._open_capture()
-        
-        if cap is None or not cap.isOpened():
-            print(f"❌ Error: No se pudo abrir la cámara {self.camera_id}")
-            return
-        
-        print(f"✅ Cámara conectada exitosamente")
-        
+        """Loop principal de captura, con reconexión y espera exponencial"""
+        cap = None
+        failures = 0
         while self.is_running:
-            ret, frame = cap.read()
-            if ret:
-                self.current_frame = frame
-                # Aquí se procesará con YOLO
+            if cap is None or not cap.isOpened():
+                if cap is not None:
+                    cap.release()
+                cap = self._open_capture()
+                if cap is None:
+                    delay = self.reconnect_backoff.next()
+                    print(f"❌ No se pudo abrir la cámara {self.camera_id}, reintento en {delay:.1f}s")
+                    self._stop_event.wait(delay)
+                    continue
+                self.source = cap
+                failures = 0
+                self.last_activity = time.time()
+                print(f"✅ Cámara conectada exitosamente")
+
+            frame = self._read_into_buffer(cap)
+            if frame is not None:
+                failures = 0
+                self.reconnect_backoff.reset()
                 self._process_frame(frame)
+                self._update_idle(cap)
+                continue
+
+            failures += 1
+            if failures >= self.max_read_failures or not cap.isOpened():
+                print(f"⚠️ Cámara sin frames ({failures} lecturas fallidas), reconectando")
+                cap.release()
+                cap = None
+                self.source = None
+                self._stop_event.wait(self.reconnect_backoff.next())
             else:
-                print("⚠️ Error leyendo frame de la cámara")
-                time.sleep(1)
-        
-        cap.release()
+                self._stop_event.wait(0.05)
+
+        if cap is not None:
+            cap.release()
+        self.source = None
+
+    def _update_idle(self, cap):
+        """Pasa la fuente a reposo (p.ej. solo keyframes) si el carril está quieto"""
+        if not self.idle_after:
+            return
+        if self.detector is not None and not self.detector.policy.idle:
+            self.last_activity = time.time()
+        idle = (time.time() - self.last_activity) > self.idle_after
+        if idle != cap.idle:
+            print("💤 Captura en reposo" if idle else "🚗 Actividad en el carril, captura completa")
+            cap.set_idle(idle)
+
+    def _read_into_buffer(self, cap):
+        """Decodifica el próximo frame directo en un slot del buffer circular.
+        Retorna una vista de solo lectura del frame o None si falló la lectura."""
+        fb = self.frame_buffer
+        if fb is None:
+            ret, frame = cap.read()
+            if not ret:
+                return None
+            self._create_frame_buffer(frame.shape)
+            self.frame_buffer.write(frame)
+            return self.frame_buffer.view()[1]
+
+        slot = fb.begin_write()
+        ret, out = cap.read(image=slot)
+        if not ret or out is None:
+            fb.abort()
+            return None
+        if out is not slot:
+            # OpenCV asignó un array nuevo (cambió la resolución o el tipo)
+            if out.shape != slot.shape:
+                fb.abort()
+                self._create_frame_buffer(out.shape)
+                self.frame_buffer.write(out)
+                return self.frame_buffer.view()[1]
+            np.copyto(slot, out)
+        seq = fb.commit()
+        return fb.view(seq)[1]
+
+    def _create_frame_buffer(self, shape):
+        old = self.frame_buffer
+        self.frame_buffer = FrameRingBuffer(shape, slots=self.frame_slots, shm_name=self.frame_shm_name,
+                                            start_seq=old.latest_seq if old is not None else 0)
+        if old is not None and old.name is None:
+            old.close()
     
     def _open_capture(self):
         """Intenta abrir la cámara usando URL o varios backends/índices en Windows"""
         try:
             camera_url = os.getenv('CAMERA_URL')
             if camera_url:
-                cap = cv2.VideoCapture(camera_url)
-                if cap.isOpened():
-                    print(f"🔗 Cámara abierta por URL: {camera_url}")
+                cap = open_source(camera_url)
+                if cap is not None:
+                    print(f"🔗 Cámara abierta por URL: {cap.describe()}")
                     return cap
-                else:
-                    cap.release()
         except Exception as e:
             print(f"⚠️ No se pudo abrir URL de cámara: {e}")
         
@@ -111,40 +265,108 @@ class CameraService:
         for idx in try_indices:
             for backend in backends:
                 try:
-                    cap = cv2.VideoCapture(idx) if backend is None else cv2.VideoCapture(idx, backend)
-                    if cap.isOpened():
+                    cap = open_source(idx, api=backend)
+                    if cap is not None:
                         be_name = 'default' if backend is None else ('CAP_DSHOW' if backend == getattr(cv2, 'CAP_DSHOW', -1) else ('CAP_MSMF' if backend == getattr(cv2, 'CAP_MSMF', -1) else str(backend)))
                         print(f"📷 Cámara abierta en índice {idx} con backend {be_name}")
                         return cap
-                    else:
-                        cap.release()
                 except Exception:
                     continue
         return None
     
     def _process_frame(self, frame):
         """Procesa el frame con YOLO y OCR"""
-        if not self.detector:
+        if not self.detector and not self.inference_pool:
+            return
+        if self.detector is not None and self.detector.warm_state == "warming":
             return
-        # respetar cooldown
-        if (time.time() - (self.last_detection_time or 0)) < self.detection_cooldown:
+        captured = time.time()
+        if self.inference_pool is not None:
+            # La inferencia corre en otro proceso; el resultado llega a _on_inference_result
+            seq = self.frame_buffer.latest_seq
+            # El instante de captura viaja con el trabajo y vuelve en el resultado
+            self.inference_pool.submit(seq, self.frame_buffer.shape, captured)
             return
         try:
             result = self.detector.detect_plate_from_frame(frame)
-            if result and result.get('text'):
-                plate = result['text']
-                # Guardar info para overlay visual por unos segundos
-                self.last_plate_overlay = {
-                    'text': plate,
-                    'bbox': result.get('bbox'),
-                    'ts': time.time()
-                }
-                vehicle_data = self._get_vehicle_data(plate)
-                if vehicle_data and self.detection_callback:
-                    self.last_detection_time = time.time()
-                    self.detection_callback(vehicle_data)
+            self._handle_plate_result(result, frame, captured)
         except Exception as e:
             print(f"❌ Error en procesamiento de frame: {e}")
+
+    def _on_inference_result(self, payload: dict):
+        """Resultado de un worker del pool de inferencia"""
+        result = payload.get('result')
+        captured = payload.get('captured')
+        frame = None
+        if result and self.evidence_store is not None and self.frame_buffer is not None:
+            # Copia validada (seqlock); si el frame inferido ya se pisó, el más reciente
+            _, frame = self.frame_buffer.read(seq=payload.get('seq'))
+            if frame is None:
+                _, frame = self.frame_buffer.read()
+        self._handle_plate_result(result, frame, captured)
+
+    def _handle_plate_result(self, result: Optional[dict], frame=None, captured: Optional[float] = None):
+        """Decide, acciona la barrera, guarda la evidencia y notifica la decisión"""
+        if result and result.get('text'):
+            plate = result['text']
+            self.last_activity = time.time()
+            # Guardar info para overlay visual por unos segundos
+            self.last_plate_overlay = {
+                'text': plate,
+                'bbox': result.get('bbox'),
+                'ts': time.time()
+            }
+            # El auto sigue frente a la cámara: ya se decidió
+            plate_norm = normalize_plate(plate)
+            if not self.dedup.admit(self.camera_id, plate_norm):
+                return
+            captured = captured or time.time()
+            vehicle_data, fuente, decidido = self._decide(plate, captured)
+            decided = time.time()
+            if vehicle_data:
+                matched = normalize_plate(vehicle_data['matricula'])
+                if matched != plate_norm and not self.dedup.admit(self.camera_id, matched):
+                    return  # otra lectura (con error de OCR) del mismo vehículo
+            if not decidido and not self.dedup.defer(self.camera_id, plate_norm):
+                # Sin decisión otra vez: ya se avisó y se aplicó la política de
+                # falla; se reintenta más tarde sin otro evento ni comando
+                return
+            tiempos = None
+            if self.actuator is not None:
+                acceso = vehicle_data['acceso'] if vehicle_data else (False if decidido else None)
+                tiempos = self.actuator.actuate(self.camera_id, acceso, captured, decided, fuente)
+            if not decidido:
+                vehicle_data = self._undecided_data(plate, fuente, bool(tiempos and tiempos['comando']))
+            if vehicle_data and tiempos:
+                vehicle_data['actuacion'] = tiempos
+            if vehicle_data and self.evidence_store is not None:
+                # Solo copia y encola: el encode y la escritura van en otro hilo
+                vehicle_data['evidencia_id'] = self.evidence_store.submit(frame, result.get('bbox'), {
+                    'matricula': vehicle_data['matricula'],
+                    'matricula_leida': plate,
+                    'acceso': vehicle_data['acceso'],
+                    'motivo': vehicle_data.get('motivo'),
+                    'camara': self.camera_id,
+                })
+            if vehicle_data and self.detection_callback:
+                self.last_detection_time = time.time()
+                self.detection_callback(vehicle_data)
+            if vehicle_data and self.edge_replica is not None:
+                self.edge_replica.enqueue_event(
+                    vehicle_data['matricula'], vehicle_data['acceso'],
+                    vehicle_data['confianza'], vehicle_data['timestamp'], vehicle_data['motivo'],
+                )
+            elif vehicle_data and self.access_log is not None:
+                self.access_log.log({
+                    'matricula': vehicle_data['matricula'],
+                    'acceso': vehicle_data['acceso'],
+                    'motivo': vehicle_data.get('motivo'),
+                    'confianza': vehicle_data.get('confianza'),
+                    'ts': vehicle_data['timestamp'],
+                    'camara': str(self.camera_id),
+                    'origen': 'camara',
+                    'evidencia_id': vehicle_data.get('evidencia_id'),
+                })
     
     def _simulate_detection(self):
         """Simula una detección para pruebas"""
@@ -158,58 +380,221 @@ class CameraService:
             self.last_detection_time = time.time()
             self.detection_callback(vehicle_data)
     
-    def _get_vehicle_data(self, plate: str) -> Optional[dict]:
-        """Busca datos mínimos del vehículo por matrícula en `vehiculos`.
-        Acceso basado en `vehiculos.estado` (0 permitido, 1 denegado)."""
+    def _decide(self, plate: str, captured: float) -> Tuple[Optional[dict], str, bool]:
+        """
+        Decisión desde la fuente más rápida: caché de decisiones, después
+        réplica de borde o base. Con actuador, la consulta se corta al
+        vencer el plazo (ACTUATION_DEADLINE_MS); su resultado igual se
+        guarda en la caché para la próxima lectura. Una lectura que llega
+        con la consulta de su patente todavía en curso espera esa misma.
+        Retorna (datos del vehículo o None, fuente, hubo_decisión).
+        """
+        key = normalize_plate(plate)
+        cached = self.decisions.get(key)
+        if cached is not DecisionCache.MISSING:
+            return ({**cached, 'timestamp': datetime.now()} if cached else None), 'cache', True
+        fuente = 'borde' if self.edge_replica is not None and self.edge_replica.ready else 'db'
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            nueva = future is None
+            if nueva:
+                future = self._lookup.submit(self._query_vehicle_data, plate)
+                self._inflight[key] = future
+        if nueva:
+            # Fuera del lock: si ya terminó, el callback corre en este hilo
+            future.add_done_callback(lambda f: self._lookup_done(key, f))
+        timeout = max(self.actuator.remaining(captured), MIN_LOOKUP_S) if self.actuator else None
         try:
-            # Usar la función de conexión de db.py
-            from db import get_connection
-            conn = get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-            from db import table_name
-            cursor.execute(f"""
-                SELECT *
-                FROM {table_name('vehiculos')}
-                WHERE matricula = %s
-                LIMIT 1
-            """, (plate,))
-
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            
-            if result:
-                result = dict(result)
-
-            if not result:
-                return None
+            vehicle_data = future.result(timeout=timeout)
+        except FutureTimeout:
+            print(f"⚠️ Decisión de {plate} fuera de plazo ({fuente})")
+            return None, 'timeout', False
+        except Exception as e:
+            print(f"❌ Error consultando base de datos: {e}")
+            return None, 'error', False
+        self.decisions.put(key, vehicle_data)
+        return ({**vehicle_data} if vehicle_data else None), fuente, True
 
-            estado = result.get('estado', 0)
-            acceso = (estado == 1)
-
-            return {
-                'matricula': plate,
-                'timestamp': datetime.now(),
-                'confianza': 0.95,
-                'propietario': result.get('propietario') or result.get('nombre') or None,
-                'telefono': result.get('telefono'),
-                'email': result.get('email'),
-                'departamento': result.get('id_departamento'),
-                'dias_restantes': None,
-                'fecha_vencimiento': None,
-                'estado_cuota': estado,
-                'acceso': acceso,
-                'motivo': None if acceso else 'Estado del vehículo denegado'
-            }
+    def _lookup_done(self, key: str, future):
+        """Libera la patente para otra consulta; un resultado que llega fuera
+        de plazo igual queda en la caché para la próxima lectura."""
+        with self._inflight_lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.decisions.put(key, future.result())
+
+    def _undecided_data(self, plate: str, fuente: str, abierta: bool) -> dict:
+        """Evento para la UI cuando no hubo decisión a tiempo (política de falla)"""
+        politica = self.actuator.fail_mode if self.actuator else 'closed'
+        return {
+            'matricula': plate,
+            'matricula_leida': plate,
+            'coincidencia': None,
+            'timestamp': datetime.now(),
+            'confianza': 0.95,
+            'propietario': None,
+            'telefono': None,
+            'email': None,
+            'departamento': None,
+            'dias_restantes': None,
+            'fecha_vencimiento': None,
+            'estado_cuota': None,
+            'acceso': abierta,
+            'motivo': f'Sin decisión ({fuente}): política fail-{politica}',
+        }
+
+    @staticmethod
+    def _fuzzy_lookup(index, plate: str):
+        """(coincidencia aceptada, None) si la lectura difiere de una patente
+        solo en confusiones de OCR; si no, (None, candidatos a confirmar)."""
+        coincidencia = index.best_match(plate, PLATE_FUZZY_MIN_SCORE)
+        if coincidencia:
+            return coincidencia, None
+        return None, index.candidates(plate, limit=3)
 
+    def _confirmation_data(self, plate: str, candidatos) -> dict:
+        """Evento para la UI: la lectura se parece a patentes registradas pero
+        no lo suficiente para decidir sola; el guardia confirma o no."""
+        return {
+            'matricula': plate,
+            'matricula_leida': plate,
+            'coincidencia': None,
+            'candidatos': [{'matricula': m, 'puntaje': p} for m, p in candidatos],
+            'timestamp': datetime.now(),
+            'confianza': 0.95,
+            'propietario': None,
+            'telefono': None,
+            'email': None,
+            'departamento': None,
+            'dias_restantes': None,
+            'fecha_vencimiento': None,
+            'estado_cuota': None,
+            'acceso': False,
+            'motivo': 'Lectura dudosa: confirmar con los candidatos',
+        }
+
+    def _get_vehicle_data(self, plate: str) -> Optional[dict]:
+        """Como `_query_vehicle_data`, pero un error de la base se informa y retorna None."""
+        try:
+            return self._query_vehicle_data(plate)
         except Exception as e:
             print(f"❌ Error consultando base de datos: {e}")
             return None
+
+    def _query_vehicle_data(self, plate: str) -> Optional[dict]:
+        """Busca datos mínimos del vehículo por matrícula en `vehiculos`.
+        Acceso según `db.decision_acceso` (la misma regla que la API).
+        Si la lectura exacta no existe, intenta con el índice aproximado: solo
+        acepta una patente que difiere en confusiones de OCR; con otras
+        diferencias devuelve los candidatos para que confirme el guardia.
+        En modo borde decide con la réplica local, sin ir a la base central.
+        None si la patente no está registrada; lanza si la base falla."""
+        if self.edge_replica is not None and self.edge_replica.ready:
+            return self._get_vehicle_data_local(plate)
+        # Conexión del pool y sentencias preparadas (ver queries.py)
+        with pooled_connection() as conn, conn.cursor() as cursor:
+            vehiculo = rows.fila(rows.Vehiculo, queries.fetchone(cursor, "vehiculo_por_matricula", (normalize_plate(plate),)))
+
+            coincidencia = candidatos = None
+            if vehiculo is None:
+                coincidencia, candidatos = self._fuzzy_lookup(get_plate_index(), plate)
+                if coincidencia:
+                    vehiculo = rows.fila(rows.Vehiculo, queries.fetchone(cursor, "vehiculo_por_matricula", (coincidencia[0],)))
+
+            if vehiculo is None:
+                return self._confirmation_data(plate, candidatos) if candidatos else None
+            with conn.cursor(cursor_factory=RealDictCursor) as dict_cursor:
+                fila = queries.fetchone(dict_cursor, "vehiculos_decision_lote", ([vehiculo.matricula_norm],))
+
+        decision = decision_acceso(vehiculo.matricula, fila)
+        return {
+            'matricula': vehiculo.matricula if coincidencia else plate,
+            'matricula_leida': plate,
+            'coincidencia': coincidencia[1] if coincidencia else 1.0,
+            'timestamp': datetime.now(),
+            'confianza': 0.95,
+            'propietario': vehiculo.propietario,
+            'telefono': vehiculo.telefono,
+            'email': vehiculo.email,
+            'departamento': vehiculo.id_departamento,
+            'dias_restantes': decision['dias_restantes'],
+            'fecha_vencimiento': decision['vencimiento'],
+            'estado_cuota': vehiculo.estado,
+            'acceso': decision['acceso'],
+            'motivo': decision['motivo']
+        }
     
+    def _get_vehicle_data_local(self, plate: str) -> Optional[dict]:
+        """Decisión con la réplica de borde: mismas reglas que `db.decision_acceso`."""
+        fila = self.edge_replica.lookup(normalize_plate(plate))
+        coincidencia = candidatos = None
+        if fila is None:
+            coincidencia, candidatos = self._fuzzy_lookup(get_plate_index(self.edge_replica.plates), plate)
+            if coincidencia:
+                fila = self.edge_replica.lookup(coincidencia[0])
+        if fila is None:
+            return self._confirmation_data(plate, candidatos) if candidatos else None
+
+        decision = decision_acceso(fila['matricula'], fila)
+        return {
+            'matricula': fila['matricula'] if coincidencia else plate,
+            'matricula_leida': plate,
+            'coincidencia': coincidencia[1] if coincidencia else 1.0,
+            'timestamp': datetime.now(),
+            'confianza': 0.95,
+            'propietario': None,
+            'telefono': None,
+            'email': None,
+            'departamento': fila['id_departamento'],
+            'dias_restantes': decision['dias_restantes'],
+            'fecha_vencimiento': decision['vencimiento'],
+            'estado_cuota': fila['estado'],
+            'acceso': decision['acceso'],
+            'motivo': decision['motivo'],
+            'origen': 'borde',
+        }
+
     def get_current_frame(self):
-        """Retorna el frame actual para streaming"""
-        return self.current_frame
+        """Retorna una copia del último frame (o None si todavía no hay)"""
+        if self.frame_buffer is None:
+            return None
+        return self.frame_buffer.read()[1]
+
+    def read_frame(self, dst=None, after_seq: int = 0):
+        """Copia el último frame a `dst` si es más nuevo que `after_seq`.
+        Retorna (seq, frame) o (after_seq, None) si no hay uno nuevo."""
+        fb = self.frame_buffer
+        if fb is None or fb.latest_seq <= after_seq:
+            return after_seq, None
+        if dst is not None and dst.shape != fb.shape:
+            dst = None
+        return fb.read(dst)
+
+    def status(self) -> dict:
+        """Estado de la cámara y sus componentes (para /auto-access/status)"""
+        return {
+            "status": "running" if self.is_running else "stopped",
+            "camera_id": self.camera_id,
+            "last_detection": self.last_detection_time,
+            "dedup": self.dedup.status(),
+            "decisions": self.decisions.status(),
+            "actuator": self.actuator.status() if self.actuator else None,
+            "capture": self.source.describe() if self.source is not None else None,
+            "edge": self.edge_replica.status() if self.edge_replica else None,
+            "inference": self.inference_pool.status() if self.inference_pool else None,
+            "model": self._model_status(),
+            "evidence": self.evidence_store.status() if self.evidence_store else None,
+            "access_log": self.access_log.status() if self.access_log else None,
+        }
+
+    def _model_status(self) -> Optional[dict]:
+        """Warm/cold del detector (o del pool) y aciertos de la caché de modelos"""
+        if self.inference_pool is not None:
+            return self.inference_pool.warm_status()
+        if self.detector is not None:
+            return self.detector.warm_status()
+        return None
 
     def get_last_plate_for_overlay(self, max_age_seconds=3):
         """Devuelve la última detección para overlay si no es muy antigua"""
@@ -239,7 +624,23 @@ def init_camera_service(db_config):
         else:
             print("⚠️ Pesos de modelos no encontrados ni en backend/models ni en carpeta externa. Asegúrate de colocar 'yolov8n.pt' y 'best.pt'.")
 
-    camera_service = CameraService(camera_id=0, db_config=db_config, models_dir=models_dir)
+    # Modo borde: réplica local de los datos de decisión + cola de eventos
+    edge_replica = None
+    access_log = None
+    if os.getenv('EDGE_MODE', '0').lower() in ('1', 'true', 'yes', 'on'):
+        edge_db = os.getenv('EDGE_DB_PATH') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'edge_replica.db'))
+        edge_replica = EdgeReplica(edge_db, full_interval=float(os.getenv('EDGE_FULL_SYNC_INTERVAL', '86400')))
+        edge_replica.start(interval=float(os.getenv('EDGE_SYNC_INTERVAL', '10')))
+        print(f"📦 Modo borde activo → réplica local en {edge_db}")
+    else:
+        access_log = get_access_log_writer()
+
+    camera_service = CameraService(
+        camera_id=0, db_config=db_config, models_dir=models_dir, edge_replica=edge_replica,
+        inference_workers=int(os.getenv('INFERENCE_WORKERS', '0')),
+        evidence_store=get_evidence_store(), access_log=access_log,
+        actuator=create_actuator(),
+    )
     return camera_service
 
 def get_camera_service():
@@ -0,0 +1,422 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+# Backends de captura disponibles (CAPTURE_BACKEND)
+BACKENDS = ("auto", "opencv", "ffmpeg", "gstreamer")
+
+# Opciones de FFmpeg para el backend OpenCV: sin buffer de entrada ni
+# reordenamiento, así cada read() devuelve el frame más reciente
+LOW_DELAY_FFMPEG_OPTIONS = "fflags;nobuffer|flags;low_delay|max_delay;0"
+
+# OPENCV_FFMPEG_CAPTURE_OPTIONS es global al proceso: serializar las aperturas
+_ffmpeg_env_lock = threading.Lock()
+
+
+def _is_rtsp(source) -> bool:
+    return isinstance(source, str) and source.lower().startswith(("rtsp://", "rtsps://"))
+
+
+class ExponentialBackoff:
+    """Espera creciente entre reintentos: base, 2·base, 4·base... hasta `maximum`."""
+
+    def __init__(self, base: float = 0.5, maximum: float = 30.0, jitter: float = 0.1):
+        self.base = base
+        self.maximum = maximum
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next(self) -> float:
+        delay = min(self.maximum, self.base * (2 ** self.attempts))
+        self.attempts += 1
+        # Jitter para que varias cámaras no reconecten todas a la vez
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def reset(self):
+        self.attempts = 0
+
+
+class CaptureConfig:
+    """
+    Parámetros de captura leídos del entorno (ver env.example):
+    backend, tamaño de salida, decimación, aceleración por hardware,
+    pipeline de GStreamer propio y decimación en reposo.
+    """
+
+    def __init__(self, backend: str = "auto", width: int = 0, height: int = 0,
+                 decimation: int = 1, idle_decimation: int = 5, hwaccel: str = "auto",
+                 pipeline: str = "", ffmpeg_options: str = "", read_timeout: float = 10.0):
+        backend = (backend or "auto").lower()
+        if backend not in BACKENDS:
+            print(f"⚠️ CAPTURE_BACKEND desconocido '{backend}', usando auto")
+            backend = "auto"
+        self.backend = backend
+        self.width = max(0, width)
+        self.height = max(0, height)
+        self.decimation = max(1, decimation)
+        self.idle_decimation = max(1, idle_decimation)
+        self.hwaccel = (hwaccel or "none").lower()
+        self.pipeline = pipeline
+        self.ffmpeg_options = ffmpeg_options
+        self.read_timeout = read_timeout
+
+    @classmethod
+    def from_env(cls) -> "CaptureConfig":
+        return cls(
+            backend=os.getenv("CAPTURE_BACKEND", "auto"),
+            width=int(os.getenv("CAPTURE_WIDTH", "0")),
+            height=int(os.getenv("CAPTURE_HEIGHT", "0")),
+            decimation=int(os.getenv("CAPTURE_DECIMATION", "1")),
+            idle_decimation=int(os.getenv("CAPTURE_IDLE_DECIMATION", "5")),
+            hwaccel=os.getenv("CAPTURE_HWACCEL", "auto"),
+            pipeline=os.getenv("CAPTURE_PIPELINE", ""),
+            ffmpeg_options=os.getenv("CAPTURE_FFMPEG_OPTIONS", ""),
+            read_timeout=float(os.getenv("CAPTURE_READ_TIMEOUT", "10")),
+        )
+
+
+class VideoSource(ABC):
+    """
+    Interfaz común de las fuentes de video, compatible con lo que usa el
+    servicio de cámara de `cv2.VideoCapture`: `isOpened`, `read(image=...)`
+    y `release`. `read` escribe en `image` si se le pasa un array del tamaño
+    correcto (el slot del buffer circular), sin asignar memoria.
+
+    `set_idle(True)` pasa la fuente a modo reposo (menos frames decodificados)
+    mientras no hay actividad en el carril.
+    """
+
+    name = "base"
+
+    def __init__(self, source, config: CaptureConfig):
+        self.source = source
+        self.config = config
+        self.idle = False
+
+    @abstractmethod
+    def open(self) -> bool:
+        """Abre la fuente; False si no se pudo."""
+
+    @abstractmethod
+    def isOpened(self) -> bool:
+        pass
+
+    @abstractmethod
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        pass
+
+    @abstractmethod
+    def release(self):
+        pass
+
+    def set_idle(self, idle: bool):
+        self.idle = idle
+
+    def describe(self) -> str:
+        return f"{self.name} {self.source}"
+
+
+class OpenCVSource(VideoSource):
+    """
+    `cv2.VideoCapture` con buffer mínimo. Para URLs usa FFmpeg con opciones
+    de baja latencia y decodificación por hardware si OpenCV la soporta.
+    La decimación descarta frames con `grab()` (sin convertir a BGR ni
+    copiar) y el escalado se hace con `resize(dst=...)` sobre el slot.
+    """
+
+    name = "opencv"
+
+    def __init__(self, source, config: CaptureConfig, api: Optional[int] = None):
+        super().__init__(source, config)
+        self.api = api
+        self._cap = None
+        self._scratch: Optional[np.ndarray] = None
+
+    def _create(self):
+        if isinstance(self.source, int):
+            return cv2.VideoCapture(self.source) if self.api is None else cv2.VideoCapture(self.source, self.api)
+        params = []
+        if self.config.hwaccel != "none" and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        options = self.config.ffmpeg_options or LOW_DELAY_FFMPEG_OPTIONS
+        if _is_rtsp(self.source) and "rtsp_transport" not in options:
+            options = "rtsp_transport;tcp|" + options
+        with _ffmpeg_env_lock:
+            previous = os.environ.get("OPENCV_FFMPEG_CAPTURE_OPTIONS")
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = options
+            try:
+                if params:
+                    return cv2.VideoCapture(self.source, cv2.CAP_FFMPEG, params)
+                return cv2.VideoCapture(self.source, cv2.CAP_FFMPEG)
+            finally:
+                if previous is None:
+                    os.environ.pop("OPENCV_FFMPEG_CAPTURE_OPTIONS", None)
+                else:
+                    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = previous
+
+    def open(self) -> bool:
+        self._cap = self._create()
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            return False
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return True
+
+    def isOpened(self) -> bool:
+        return self._cap is not None and self._cap.isOpened()
+
+    @property
+    def _skip(self) -> int:
+        decimation = self.config.decimation * (self.config.idle_decimation if self.idle else 1)
+        return decimation - 1
+
+    def _target_size(self, frame_shape) -> Optional[Tuple[int, int]]:
+        w, h = self.config.width, self.config.height
+        if not w and not h:
+            return None
+        fh, fw = frame_shape[:2]
+        if not h:
+            h = max(2, round(fh * w / fw / 2) * 2)
+        elif not w:
+            w = max(2, round(fw * h / fh / 2) * 2)
+        return None if (w, h) == (fw, fh) else (w, h)
+
+    def read(self, image: Optional[np.ndarray] = None):
+        for _ in range(self._skip):
+            if not self._cap.grab():
+                return False, None
+        if not self.config.width and not self.config.height:
+            return self._cap.read(image=image) if image is not None else self._cap.read()
+        ret, raw = self._cap.read(image=self._scratch) if self._scratch is not None else self._cap.read()
+        if not ret:
+            return False, None
+        self._scratch = raw
+        size = self._target_size(raw.shape)
+        if size is None:
+            return True, raw
+        if image is not None and image.shape[:2] == (size[1], size[0]):
+            cv2.resize(raw, size, dst=image, interpolation=cv2.INTER_AREA)
+            return True, image
+        return True, cv2.resize(raw, size, interpolation=cv2.INTER_AREA)
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class GStreamerSource(OpenCVSource):
+    """
+    Pipeline de GStreamer vía `cv2.CAP_GSTREAMER`: `decodebin` elige el
+    decodificador por hardware disponible (VA-API, NVDEC, V4L2...), el
+    escalado se hace en el pipeline y `appsink drop=true max-buffers=1`
+    entrega siempre el último frame. CAPTURE_PIPELINE permite uno propio
+    con los marcadores {url}, {width} y {height}.
+    """
+
+    name = "gstreamer"
+
+    def _pipeline(self) -> str:
+        w, h = self.config.width, self.config.height
+        caps = "video/x-raw,format=BGR" + (f",width={w}" if w else "") + (f",height={h}" if h else "")
+        if self.config.pipeline:
+            return self.config.pipeline.format(url=self.source, width=w, height=h)
+        if _is_rtsp(self.source):
+            src = f"rtspsrc location={self.source} latency=0 protocols=tcp ! decodebin"
+        else:
+            src = f"uridecodebin uri={self.source}"
+        return f"{src} ! videoconvert ! videoscale ! {caps} ! appsink drop=true max-buffers=1 sync=false"
+
+    def _create(self):
+        return cv2.VideoCapture(self._pipeline(), cv2.CAP_GSTREAMER)
+
+    def read(self, image: Optional[np.ndarray] = None):
+        # El pipeline ya entrega el tamaño pedido: solo decimar
+        for _ in range(self._skip):
+            if not self._cap.grab():
+                return False, None
+        return self._cap.read(image=image) if image is not None else self._cap.read()
+
+    def describe(self) -> str:
+        return f"{self.name} {self._pipeline()}"
+
+
+class FFmpegSource(VideoSource):
+    """
+    Proceso `ffmpeg` que decodifica el stream y entrega BGR crudo por stdout.
+
+    - Baja latencia: `-fflags nobuffer -flags low_delay`, RTSP por TCP.
+    - Decodificación por hardware con `-hwaccel` (CAPTURE_HWACCEL).
+    - Escalado y decimación en el filtro de ffmpeg, antes de copiar nada:
+      los frames descartados nunca se convierten ni cruzan el pipe.
+    - En reposo reinicia con `-skip_frame nokey`: solo se decodifican los
+      keyframes (típicamente 1 por segundo en cámaras IP).
+
+    Cada frame se lee con `readinto` directo en el slot del buffer circular.
+    Un watchdog mata el proceso si no llegan frames en CAPTURE_READ_TIMEOUT
+    segundos, así `read` falla y el servicio reconecta.
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, source: str, config: CaptureConfig):
+        super().__init__(source, config)
+        self._proc: Optional[subprocess.Popen] = None
+        self._shape: Optional[Tuple[int, int, int]] = None
+        self._last_frame = 0.0
+        self._keyframes_only = False
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+    def _probe_size(self) -> Optional[Tuple[int, int]]:
+        cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "stream=width,height", "-of", "json"]
+        if _is_rtsp(self.source):
+            cmd += ["-rtsp_transport", "tcp"]
+        try:
+            out = subprocess.run(cmd + [self.source], capture_output=True, timeout=self.config.read_timeout, check=True)
+            stream = json.loads(out.stdout)["streams"][0]
+            return int(stream["width"]), int(stream["height"])
+        except Exception as e:
+            print(f"⚠️ ffprobe no pudo leer {self.source}: {e}")
+            return None
+
+    def _output_size(self) -> Optional[Tuple[int, int]]:
+        w, h = self.config.width, self.config.height
+        if w and h:
+            return w, h
+        probed = self._probe_size()
+        if probed is None:
+            return None
+        pw, ph = probed
+        if w:
+            return w, max(2, round(ph * w / pw / 2) * 2)
+        if h:
+            return max(2, round(pw * h / ph / 2) * 2), h
+        return pw, ph
+
+    def _command(self, width: int, height: int) -> list:
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+               "-fflags", "nobuffer", "-flags", "low_delay"]
+        if self.config.hwaccel != "none":
+            cmd += ["-hwaccel", self.config.hwaccel]
+        if _is_rtsp(self.source):
+            cmd += ["-rtsp_transport", "tcp"]
+        filters = []
+        if self._keyframes_only:
+            cmd += ["-skip_frame", "nokey"]
+        elif self.config.decimation > 1:
+            filters.append(f"select=not(mod(n\\,{self.config.decimation}))")
+        filters.append(f"scale={width}:{height}")
+        cmd += ["-i", self.source, "-an", "-vf", ",".join(filters),
+                "-vsync", "passthrough", "-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+        return cmd
+
+    def open(self) -> bool:
+        if self._shape is None:
+            size = self._output_size()
+            if size is None:
+                return False
+            self._shape = (size[1], size[0], 3)
+        h, w, _ = self._shape
+        try:
+            self._proc = subprocess.Popen(self._command(w, h), stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL, bufsize=0)
+        except OSError as e:
+            print(f"❌ No se pudo iniciar ffmpeg: {e}")
+            return False
+        self._last_frame = time.monotonic()
+        threading.Thread(target=self._watchdog, args=(self._proc,), daemon=True).start()
+        return True
+
+    def _watchdog(self, proc: subprocess.Popen):
+        while proc.poll() is None:
+            time.sleep(1)
+            if time.monotonic() - self._last_frame > self.config.read_timeout:
+                print(f"⚠️ ffmpeg sin frames hace {self.config.read_timeout:.0f}s, cerrando")
+                proc.kill()
+                return
+
+    def isOpened(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def read(self, image: Optional[np.ndarray] = None):
+        if self._proc is None:
+            return False, None
+        if image is None or image.shape != self._shape or not image.flags.c_contiguous:
+            image = np.empty(self._shape, dtype=np.uint8)
+        buf = memoryview(image).cast("B")
+        got, total = 0, len(buf)
+        stdout = self._proc.stdout
+        while got < total:
+            n = stdout.readinto(buf[got:])
+            if not n:
+                return False, None  # ffmpeg terminó (stream caído o watchdog)
+            got += n
+        self._last_frame = time.monotonic()
+        return True, image
+
+    def set_idle(self, idle: bool):
+        super().set_idle(idle)
+        if idle != self._keyframes_only:
+            # Reiniciar ffmpeg con/sin -skip_frame nokey; mismo tamaño de salida
+            self._keyframes_only = idle
+            self.release()
+            self.open()
+
+    def release(self):
+        proc, self._proc = self._proc, None
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+            proc.stdout.close()
+
+    def describe(self) -> str:
+        h, w, _ = self._shape or (0, 0, 0)
+        modo = "keyframes" if self._keyframes_only else f"1/{self.config.decimation}"
+        return f"{self.name} {self.source} → {w}x{h} ({modo}, hwaccel={self.config.hwaccel})"
+
+
+def open_source(source: Union[str, int], config: Optional[CaptureConfig] = None,
+                api: Optional[int] = None) -> Optional[VideoSource]:
+    """
+    Abre `source` (URL o índice de dispositivo) con el backend configurado.
+    `auto` usa el proceso ffmpeg para RTSP si está instalado y OpenCV en
+    los demás casos. Si el backend pedido falla se prueba con OpenCV.
+    """
+    config = config or CaptureConfig.from_env()
+    backend = config.backend
+    if isinstance(source, int):
+        backend = "opencv"
+    elif backend == "auto":
+        backend = "ffmpeg" if _is_rtsp(source) and FFmpegSource.available() else "opencv"
+    elif backend == "ffmpeg" and not FFmpegSource.available():
+        print("⚠️ ffmpeg/ffprobe no están instalados, usando OpenCV")
+        backend = "opencv"
+
+    candidates = {
+        "ffmpeg": lambda: FFmpegSource(source, config),
+        "gstreamer": lambda: GStreamerSource(source, config),
+        "opencv": lambda: OpenCVSource(source, config, api=api),
+    }
+    order = [backend] + (["opencv"] if backend != "opencv" else [])
+    for name in order:
+        try:
+            src = candidates[name]()
+            if src.open():
+                return src
+        except Exception as e:
+            print(f"⚠️ Backend de captura {name} falló: {e}")
+    return None
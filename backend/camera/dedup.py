@@ -0,0 +1,152 @@
+"""
+Deduplicación de lecturas por (carril, patente normalizada).
+
+Un auto detenido frente a la barrera se lee en cada frame; solo la primera
+lectura consulta la base y notifica. Las siguientes se descartan mientras
+la patente se siga viendo dentro de `window` segundos (ventana deslizante),
+y como máximo `max_hold` segundos desde la primera: pasado ese tiempo se
+vuelve a decidir (p.ej. el pago se registró mientras esperaba). Una patente
+distinta pasa de inmediato. Si la consulta no llegó a decidir, `defer` deja
+pasar la patente de nuevo recién tras `retry` segundos, el doble en cada
+intento (hasta `window`), en lugar de consultar en cada frame.
+
+Mapa con TTL sobre un `OrderedDict` ordenado por último avistamiento: las
+entradas vencidas se purgan desde el frente en cada llamada y el tamaño
+queda acotado por `max_entries` (se descartan las más viejas).
+
+`DecisionCache` guarda con el mismo esquema las últimas decisiones por
+patente, para no volver a la base si la patente reaparece al rato.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class PlateDedup:
+    def __init__(self, window: float = 5.0, max_hold: float = 60.0, max_entries: int = 1024,
+                 retry: float = 0.5, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.max_hold = max_hold
+        self.max_entries = max(1, max_entries)
+        self.retry = retry
+        self._clock = clock
+        # (carril, patente) -> (primer avistamiento, último avistamiento,
+        #                       reintento permitido desde, intentos sin decisión)
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[float, float, Optional[float], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.suppressed = 0
+        self.retried = 0
+
+    def _purge(self, now: float):
+        while self._entries:
+            _, last, _, _ = next(iter(self._entries.values()))
+            if now - last <= self.window:
+                break
+            self._entries.popitem(last=False)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def admit(self, lane: Hashable, plate: str) -> bool:
+        """
+        True si la lectura debe procesarse (patente nueva en el carril, o
+        ventana vencida); False si es una repetición. Registra el avistamiento.
+        """
+        key = (lane, plate)
+        with self._lock:
+            now = self._clock()
+            self._purge(now)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.max_hold:
+                first, _, retry_at, attempts = entry
+                if retry_at is None or now < retry_at:
+                    self._entries[key] = (first, now, retry_at, attempts)
+                    self._entries.move_to_end(key)
+                    self.suppressed += 1
+                    return False
+                # Reintento de una lectura sin decisión: mismo avistamiento
+                self._entries[key] = (first, now, None, attempts)
+                self._entries.move_to_end(key)
+                self.retried += 1
+                return True
+            self._entries[key] = (now, now, None, 0)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.admitted += 1
+            return True
+
+    def defer(self, lane: Hashable, plate: str) -> bool:
+        """
+        La lectura admitida no llegó a decidir: la patente vuelve a pasar
+        recién tras `retry` segundos (el doble en cada intento, hasta
+        `window`). True solo la primera vez en el avistamiento, para notificar
+        y aplicar la política de falla una sola vez.
+        """
+        key = (lane, plate)
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(key)
+            first, attempts = (entry[0], entry[3]) if entry is not None else (now, 0)
+            delay = min(self.retry * (2 ** attempts), self.window)
+            self._entries[key] = (first, now, now + delay, attempts + 1)
+            self._entries.move_to_end(key)
+            return attempts == 0
+
+    def status(self) -> dict:
+        with self._lock:
+            self._purge(self._clock())
+            return {
+                "ventana_s": self.window,
+                "max_retencion_s": self.max_hold,
+                "reintento_s": self.retry,
+                "entradas": len(self._entries),
+                "procesadas": self.admitted,
+                "suprimidas": self.suppressed,
+                "reintentos": self.retried,
+            }
+
+
+class DecisionCache:
+    """Decisión por patente normalizada durante `ttl` segundos (también "no existe")."""
+
+    MISSING = object()
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, plate: str) -> Any:
+        """La decisión guardada, o `MISSING` si no hay una vigente."""
+        with self._lock:
+            entry = self._entries.get(plate)
+            if entry is None or self._clock() - entry[0] > self.ttl:
+                self.misses += 1
+                return self.MISSING
+            self.hits += 1
+            return entry[1]
+
+    def put(self, plate: str, value: Any):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[plate] = (self._clock(), value)
+            self._entries.move_to_end(plate)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"ttl_s": self.ttl, "entradas": len(self._entries),
+                    "aciertos": self.hits, "fallos": self.misses}
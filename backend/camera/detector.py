@@ -1,10 +1,12 @@
 import os
+import time
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import urllib.request
 from pathlib import Path
-import easyocr
+
+from .model_cache import cache_dir, easyocr_dir, load_yolo
+from .ocr_engines import create_engines
 
 # ================== DESCARGA AUTOMÁTICA DE MODELOS ==================
 
@@ -60,13 +62,158 @@ def _format_license(text: str) -> str:
             res.append(dict_int_to_char.get(ch, ch))
     return ''.join(res)
 
+# ================== ROI Y RESOLUCIÓN DINÁMICA ==================
+
+def parse_roi(text: str):
+    """
+    ROI como fracciones del frame: "x1,y1,x2,y2" (p.ej. "0.2,0.4,0.8,1.0"
+    para el carril en la mitad inferior). Vacío o inválido = frame completo.
+    """
+    if not text:
+        return None
+    try:
+        x1, y1, x2, y2 = (float(v) for v in text.split(","))
+    except ValueError:
+        print(f"⚠️ ROI inválida '{text}', se usa el frame completo")
+        return None
+    x1, x2 = sorted((min(max(x1, 0.0), 1.0), min(max(x2, 0.0), 1.0)))
+    y1, y2 = sorted((min(max(y1, 0.0), 1.0), min(max(y2, 0.0), 1.0)))
+    if x2 - x1 < 0.05 or y2 - y1 < 0.05:
+        return None
+    return (x1, y1, x2, y2)
+
+
+def production_frame_shape():
+    """Forma de los frames de la cámara para el warmup (CAPTURE_WIDTH/HEIGHT o 720p)."""
+    w = int(os.getenv("CAPTURE_WIDTH", "0")) or 1280
+    h = int(os.getenv("CAPTURE_HEIGHT", "0")) or 720
+    return (h, w, 3)
+
+
+def _align32(n: int) -> int:
+    return max(32, int(round(n / 32.0)) * 32)
+
+
+class ResolutionPolicy:
+    """
+    Tamaño de entrada de YOLO según la actividad: con el carril vacío se
+    infiere a `low`; en cuanto aparece un vehículo o patente se sube a `high`
+    y se mantiene `hold_frames` frames después de la última detección.
+    Por defecto `low` = `high`: bajar `low` solo después de medir con
+    benchmark_anpr.py que no se pierden vehículos al entrar al carril.
+    """
+
+    def __init__(self, low: int = 640, high: int = 640, hold_frames: int = 15):
+        self.low = _align32(low)
+        self.high = _align32(max(low, high))
+        self.hold_frames = hold_frames
+        self._hold = 0
+
+    @property
+    def imgsz(self) -> int:
+        return self.high if self._hold > 0 else self.low
+
+    @property
+    def idle(self) -> bool:
+        return self._hold == 0
+
+    def update(self, activity: bool):
+        if activity:
+            self._hold = self.hold_frames
+        elif self._hold > 0:
+            self._hold -= 1
+
+# ================== PREPROCESAMIENTO DE RECORTES ==================
+
+class PlatePreprocessor:
+    """
+    Genera las variantes para OCR de todos los recortes de un frame sobre
+    buffers preasignados (`dst=`): los recortes se ubican lado a lado en un
+    lienzo, cada uno a su altura (solo se agrandan hasta `min_h`, como antes,
+    y se reducen por encima de `MAX_H`). La conversión a gris y la
+    inversión son por píxel y se aplican una vez al lienzo; ecualización,
+    blur, umbral adaptativo y bilateral corren sobre la región de cada
+    recorte, así ningún filtro mezcla píxeles de dos patentes. Cada
+    variante de cada recorte es una vista del lienzo, sin copias.
+
+    mode='quality' (por defecto) es el preprocesamiento original:
+    equalizeHist + bilateralFilter. mode='fast' usa CLAHE y reutiliza el
+    blur como variante suavizada; medir con benchmark_anpr.py antes de
+    activarlo.
+    """
+
+    PAD = 8          # columnas vacías entre recortes
+    MAX_H = 160      # los recortes más altos se reducen
+    WIDTH_STEP = 64  # ancho redondeado para reutilizar buffers
+
+    def __init__(self, min_h: int = 80, mode: str = "quality"):
+        self.min_h = min_h
+        self.mode = mode
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 2))
+        self._buffers = {}
+
+    def _buf(self, name: str, shape) -> np.ndarray:
+        key = (name,) + tuple(shape)
+        buf = self._buffers.get(key)
+        if buf is None:
+            if len(self._buffers) > 64:
+                self._buffers.clear()
+            buf = self._buffers[key] = np.empty(shape, dtype=np.uint8)
+        return buf
+
+    def variants(self, crops):
+        """Lista (por recorte) de variantes [umbral, suavizada, umbral invertido]."""
+        if not crops:
+            return []
+        heights = [int(min(self.MAX_H, max(self.min_h, c.shape[0]))) for c in crops]
+        widths = [max(1, int(round(c.shape[1] * h / float(c.shape[0])))) for c, h in zip(crops, heights)]
+        total = sum(widths) + self.PAD * (len(crops) + 1)
+        W = -(-total // self.WIDTH_STEP) * self.WIDTH_STEP
+        H = max(heights)
+
+        canvas = self._buf("bgr", (H, W, 3))
+        regions = []
+        x = self.PAD
+        for crop, h, w in zip(crops, heights, widths):
+            interp = cv2.INTER_CUBIC if crop.shape[0] < h else cv2.INTER_AREA
+            cv2.resize(crop, (w, h), dst=canvas[:h, x:x + w], interpolation=interp)
+            regions.append((slice(0, h), slice(x, x + w)))
+            x += w + self.PAD
+
+        gray = self._buf("gray", (H, W))
+        cv2.cvtColor(canvas, cv2.COLOR_BGR2GRAY, dst=gray)
+        eq = self._buf("eq", (H, W))
+        blur = self._buf("blur", (H, W))
+        thr = self._buf("thr", (H, W))
+        quality = self.mode == "quality"
+        smooth = self._buf("smooth", (H, W)) if quality else blur
+        for r in regions:
+            if quality:
+                cv2.equalizeHist(gray[r], dst=eq[r])
+            else:
+                self._clahe.apply(gray[r], dst=eq[r])
+            cv2.GaussianBlur(eq[r], (3, 3), 0, dst=blur[r])
+            cv2.adaptiveThreshold(blur[r], 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2,
+                                  dst=thr[r])
+            if quality:
+                cv2.bilateralFilter(eq[r], 7, 50, 50, dst=smooth[r])
+        inv = self._buf("inv", (H, W))
+        cv2.bitwise_not(thr, dst=inv)
+
+        return [[thr[r], smooth[r], inv[r]] for r in regions]
+
 # ================== CLASE PRINCIPAL DEL DETECTOR ==================
 
 class ANPRDetector:
-    def __init__(self, models_dir: str):
+    def __init__(self, models_dir: str, roi=None, imgsz_low: int = None, imgsz_high: int = None,
+                 ocr_engine: str = None):
         """
         models_dir puede no tener pesos locales.
         Si faltan → Se descargan automáticamente.
+        roi: (x1, y1, x2, y2) en fracciones del frame; la detección corre solo
+        sobre esa región, reducida al tamaño de inferencia. El OCR usa
+        recortes del frame completo en resolución original.
+        ocr_engine: motor de OCR (por defecto OCR_ENGINE, ver ocr_engines.py).
         """
 
         # VEHICULOS
@@ -85,68 +232,159 @@ class ANPRDetector:
             env_var="PLATE_WEIGHTS_URL"
         )
 
-        self.vehicle_model = YOLO(vehicle_weights)
-        self.plate_model = YOLO(plate_weights)
+        # Pesos fusionados desde la caché local (MODEL_CACHE_DIR)
+        cache = cache_dir(models_dir)
+        self.vehicle_model, vehicle_hit = load_yolo(vehicle_weights, cache)
+        self.plate_model, plate_hit = load_yolo(plate_weights, cache)
+        self.cache = {
+            "dir": str(cache) if cache else None,
+            "vehiculos": vehicle_hit,
+            "patentes": plate_hit,
+        }
         self.vehicles_classes = {2, 3, 5, 7}  # car, motorcycle, bus, truck
-        self.ocr = easyocr.Reader(['en'], gpu=False)
+        # Motores de OCR en orden: el segundo solo lee si el primero no encontró patente
+        self.ocr_engines = create_engines(models_dir, ocr_engine, model_dir=easyocr_dir(cache))
         self.min_crop_h = 80
+        self.preprocessor = PlatePreprocessor(
+            min_h=self.min_crop_h, mode=os.getenv("PLATE_PREPROC", "quality")
+        )
 
-    def _read_plate(self, img: np.ndarray):
-        h, w = img.shape[:2]
-        if h < self.min_crop_h:
-            scale = self.min_crop_h / float(h)
-            img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_CUBIC)
+        self.roi = roi
+        self.policy = ResolutionPolicy(
+            low=imgsz_low or int(os.getenv("INFER_IMGSZ_LOW", "640")),
+            high=imgsz_high or int(os.getenv("INFER_IMGSZ_HIGH", "640")),
+        )
+        self.last_timings = {}
+        # cold → warming → warm (ver `warmup`)
+        self.warm_state = "cold"
+        self.warmup_ms = None
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        eq = cv2.equalizeHist(gray)
-        blur = cv2.GaussianBlur(eq, (3, 3), 0)
-        thr_ad = cv2.adaptiveThreshold(blur,255,cv2.ADAPTIVE_THRESH_GAUSSIAN_C,cv2.THRESH_BINARY,11,2)
+    def warmup(self, frame_shape=None):
+        """
+        Inferencias de prueba a la forma de los frames de producción y a los
+        dos tamaños de la política de resolución, más un OCR sobre una
+        patente sintética: la inicialización perezosa de torch, la
+        compilación de kernels por forma y la carga de EasyOCR se pagan acá
+        y no con el primer auto.
+        """
+        self.warm_state = "warming"
+        t0 = time.perf_counter()
+        try:
+            frame = np.zeros(frame_shape or production_frame_shape(), dtype=np.uint8)
+            for imgsz in sorted({self.policy.low, self.policy.high}):
+                small, _, _, _ = self._inference_input(frame, imgsz)
+                self.vehicle_model(small, imgsz=imgsz, verbose=False)
+                self.plate_model(small, imgsz=imgsz, verbose=False)
+            # Con un frame vacío no hay recortes: el OCR necesita texto para
+            # ejercitar el detector y el reconocedor de EasyOCR
+            crop = np.full((self.min_crop_h, self.min_crop_h * 4, 3), 255, dtype=np.uint8)
+            cv2.putText(crop, "AB 123 CD", (8, int(self.min_crop_h * 0.7)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+            self._read_plate(crop)
+        except Exception as e:
+            print(f"⚠️ Warmup del detector falló, el primer frame pagará la inicialización: {e}")
+            self.warm_state = "cold"
+            return None
+        self.warmup_ms = (time.perf_counter() - t0) * 1000
+        self.warm_state = "warm"
+        return self.warmup_ms
 
-        variants = [thr_ad]
-        variants.append(cv2.bilateralFilter(eq,7,50,50))
-        variants.append(255-thr_ad)
+    def warm_status(self) -> dict:
+        return {"estado": self.warm_state, "warmup_ms": self.warmup_ms, "cache": self.cache,
+                "ocr": [e.name for e in self.ocr_engines]}
 
+    def _inference_input(self, frame: np.ndarray, imgsz: int):
+        """Región del carril reducida a `imgsz`: (imagen, escala, x0, y0)."""
+        rx1, ry1, rx2, ry2 = self._roi_pixels(frame.shape)
+        region = frame[ry1:ry2, rx1:rx2]
+        scale = min(1.0, imgsz / float(max(region.shape[:2])))
+        if scale < 1.0:
+            small = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = region
+        return small, scale, rx1, ry1
+
+    def _roi_pixels(self, shape):
+        h, w = shape[:2]
+        if not self.roi:
+            return 0, 0, w, h
+        x1, y1, x2, y2 = self.roi
+        return int(x1 * w), int(y1 * h), int(x2 * w), int(y2 * h)
+
+    def _ocr_variants(self, variants):
         best_text, best_score = None, 0
-        for v in variants:
-            detections = self.ocr.readtext(v)
-            for _, text, score in detections:
-                text = text.upper().replace(" ","")
-                if _license_complies_format(text):
-                    text = _format_license(text)
-                    if score > best_score:
-                        best_text, best_score = text, score
+        for engine in self.ocr_engines:
+            for candidates in engine.read_many(variants):
+                for text, score in candidates:
+                    text = text.upper().replace(" ","")
+                    if _license_complies_format(text):
+                        text = _format_license(text)
+                        if score > best_score:
+                            best_text, best_score = text, score
+            if best_text:
+                break
 
         return best_text, (best_score if best_text else None)
 
+    def _read_plate(self, img: np.ndarray):
+        return self._ocr_variants(self.preprocessor.variants([img])[0])
+
     def detect_plate_from_frame(self, frame: np.ndarray):
-        vehicle_result = self.vehicle_model(frame, verbose=False)[0]
+        t0 = time.perf_counter()
+        # Región del carril, reducida una sola vez al tamaño de inferencia
+        imgsz = self.policy.imgsz
+        small, scale, rx1, ry1 = self._inference_input(frame, imgsz)
+        t1 = time.perf_counter()
+
+        vehicle_result = self.vehicle_model(small, imgsz=imgsz, verbose=False)[0]
         vehicle_boxes = [
             [x1, y1, x2, y2, score]
             for x1,y1,x2,y2,score,cls in vehicle_result.boxes.data.tolist()
             if int(cls) in self.vehicles_classes
         ]
+        t2 = time.perf_counter()
 
-        plate_result = self.plate_model(frame, verbose=False)[0]
-        best = None
+        plate_result = self.plate_model(small, imgsz=imgsz, verbose=False)[0]
+        plate_boxes = plate_result.boxes.data.tolist()
+        t3 = time.perf_counter()
+        self.policy.update(bool(vehicle_boxes) or bool(plate_boxes))
 
-        for x1,y1,x2,y2,p_score,_ in plate_result.boxes.data.tolist():
-            crop = frame[int(y1):int(y2), int(x1):int(x2)]
+        fh, fw = frame.shape[:2]
+        boxes, crops = [], []
+        for x1,y1,x2,y2,p_score,_ in plate_boxes:
+            # Coordenadas del frame completo: el OCR lee en resolución original
+            x1 = max(0, int(rx1 + x1 / scale)); y1 = max(0, int(ry1 + y1 / scale))
+            x2 = min(fw, int(rx1 + x2 / scale)); y2 = min(fh, int(ry1 + y2 / scale))
+            crop = frame[y1:y2, x1:x2]
             if crop.size == 0:
                 continue
+            boxes.append(([x1, y1, x2, y2], float(p_score)))
+            crops.append(crop)
 
-            text, t_score = self._read_plate(crop)
+        # Variantes de todos los recortes en una sola pasada
+        all_variants = self.preprocessor.variants(crops)
+        t4 = time.perf_counter()
+
+        best = None
+        for (bbox, p_score), variants in zip(boxes, all_variants):
+            text, t_score = self._ocr_variants(variants)
             if text and (best is None or (t_score or 0) > (best['text_score'] or 0)):
                 best = {
                     'text': text,
                     'text_score': t_score,
-                    'bbox': [int(x1),int(y1),int(x2),int(y2)],
-                    'bbox_score': float(p_score)
+                    'bbox': bbox,
+                    'bbox_score': p_score
                 }
+        t5 = time.perf_counter()
+        self.last_timings = {
+            'resize_ms': (t1 - t0) * 1000,
+            'vehicle_ms': (t2 - t1) * 1000,
+            'plate_ms': (t3 - t2) * 1000,
+            'preproc_ms': (t4 - t3) * 1000,
+            'ocr_ms': (t5 - t4) * 1000,
+            'imgsz': imgsz,
+        }
 
         if best and best['text_score'] and best['text_score'] >= 0.4:
             return best
         return None
-
-
-
-
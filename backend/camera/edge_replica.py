@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+class EdgeReplica:
+    """
+    Réplica local (SQLite) de los datos de decisión para el modo borde.
+
+    La caja del portón decide sin depender de Postgres: las filas de
+    `vehiculos` (+ último pago y tarifa) se copian a un SQLite local y se
+    mantienen en un dict en memoria, así que una consulta cuesta un lookup.
+    Un hilo sincroniza de forma incremental con el registro de cambios
+    (marca de agua (txid, id), ver sql/06_replica_borde.sql), que también
+    trae las bajas, y sube los eventos de acceso encolados cuando vuelve la
+    conectividad. Cada `full_interval` segundos (y la primera vez) rehace
+    una copia completa, que además borra lo que ya no está en la base.
+    """
+
+    SYNC_BATCH = 1000
+    UPLOAD_BATCH = 500
+
+    def __init__(self, path: str, fetch_changes: Callable = None, upload_events: Callable = None,
+                 fetch_all: Callable = None, full_interval: float = 86400.0):
+        if fetch_changes is None or upload_events is None or fetch_all is None:
+            from db import vehiculos_completo, vehiculos_modificados_desde
+            from access_log import registrar_eventos
+            fetch_changes = fetch_changes or vehiculos_modificados_desde
+            fetch_all = fetch_all or vehiculos_completo
+            upload_events = upload_events or registrar_eventos
+        self._fetch_changes = fetch_changes
+        self._fetch_all = fetch_all
+        self._upload_events = upload_events
+        self.full_interval = full_interval
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS vehiculos (
+                matricula_norm TEXT PRIMARY KEY,
+                matricula TEXT,
+                estado INTEGER,
+                activo INTEGER,
+                id_departamento INTEGER,
+                fecha_pago TEXT,
+                tarifa TEXT,
+                updated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS eventos_pendientes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                matricula TEXT NOT NULL,
+                acceso INTEGER NOT NULL,
+                confianza REAL,
+                ts TEXT NOT NULL,
+                observaciones TEXT
+            );
+        """)
+        self._lock = threading.RLock()
+        self._rows: Dict[str, dict] = {}
+        self._load_memory()
+
+        self.last_sync: Optional[float] = None
+        self.last_sync_error: Optional[str] = None
+        self._running = False
+
+    # --- Consulta local --------------------------------------------------
+    def _load_memory(self):
+        cur = self._db.execute(
+            "SELECT matricula_norm, matricula, estado, activo, id_departamento, fecha_pago, tarifa FROM vehiculos"
+        )
+        self._rows = {r[0]: self._row_dict(r) for r in cur.fetchall()}
+
+    @staticmethod
+    def _row_dict(r) -> dict:
+        return {
+            "matricula_norm": r[0],
+            "matricula": r[1],
+            "estado": r[2],
+            "activo": None if r[3] is None else bool(r[3]),
+            "id_departamento": r[4],
+            "fecha_pago": r[5],
+            "tarifa": r[6],
+        }
+
+    @property
+    def ready(self) -> bool:
+        """True si la réplica tiene datos (al menos una sincronización previa).
+        `watermark_ts` es la marca de una versión anterior: sus datos sirven
+        hasta la primera copia completa."""
+        return self._get_meta("watermark_txid") is not None or self._get_meta("watermark_ts") is not None
+
+    def lookup(self, matricula_norm: str) -> Optional[dict]:
+        """Fila de decisión local (mismo formato que `db.verificar_matriculas`)."""
+        return self._rows.get(matricula_norm)
+
+    def plates(self) -> List[str]:
+        return list(self._rows)
+
+    # --- Sincronización --------------------------------------------------
+    def _get_meta(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _watermark(self):
+        txid = self._get_meta("watermark_txid")
+        return (int(txid), int(self._get_meta("watermark_id"))) if txid is not None else None
+
+    @staticmethod
+    def _valores(f) -> tuple:
+        return (
+            f["matricula_norm"], f["matricula"], f["estado"],
+            None if f["activo"] is None else int(bool(f["activo"])),
+            f["id_departamento"],
+            str(f["fecha_pago"])[:10] if f["fecha_pago"] is not None else None,
+            f["tarifa"],
+            f["updated_at"].isoformat() if hasattr(f["updated_at"], "isoformat") else f["updated_at"],
+        )
+
+    def _needs_full_sync(self) -> bool:
+        completa = self._get_meta("ultima_completa")
+        return self._watermark() is None or completa is None or time.time() - float(completa) >= self.full_interval
+
+    def full_sync(self) -> int:
+        """Reemplaza la copia local por la tabla completa. Retorna filas."""
+        watermark, filas = self._fetch_all()
+        valores = [self._valores(f) for f in filas]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM vehiculos")
+            self._db.executemany("INSERT INTO vehiculos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", valores)
+            self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+                ("watermark_txid", str(watermark[0])), ("watermark_id", str(watermark[1])),
+                ("ultima_completa", str(time.time())),
+            ])
+            self._db.execute("DELETE FROM meta WHERE key IN ('watermark_ts', 'watermark_key')")
+            self._db.execute("COMMIT")
+            self._rows = {v[0]: self._row_dict(v) for v in valores}
+        return len(valores)
+
+    def sync(self) -> int:
+        """Trae los cambios desde la base central. Retorna filas aplicadas."""
+        if self._needs_full_sync():
+            total = self.full_sync()
+            self.last_sync = time.time()
+            return total
+        total = 0
+        while True:
+            filas = self._fetch_changes(self._watermark(), self.SYNC_BATCH)
+            if not filas:
+                break
+            # Última versión de cada patente del lote; None = ya no existe
+            cambios = {}
+            for f in filas:
+                cambios[f["cambio_norm"]] = self._valores(f) if f["matricula_norm"] is not None else None
+            ultima = filas[-1]
+            with self._lock:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO vehiculos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [v for v in cambios.values() if v is not None],
+                )
+                self._db.executemany(
+                    "DELETE FROM vehiculos WHERE matricula_norm = ?",
+                    [(k,) for k, v in cambios.items() if v is None],
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    [("watermark_txid", str(ultima["txid"])), ("watermark_id", str(ultima["cambio"]))],
+                )
+                self._db.execute("COMMIT")
+                for k, v in cambios.items():
+                    if v is None:
+                        self._rows.pop(k, None)
+                    else:
+                        self._rows[k] = self._row_dict(v)
+            total += len(filas)
+            if len(filas) < self.SYNC_BATCH:
+                break
+        self.last_sync = time.time()
+        return total
+
+    # --- Eventos de acceso -----------------------------------------------
+    def enqueue_event(self, matricula: str, acceso: bool, confianza: float = None,
+                      ts: datetime = None, observaciones: str = None):
+        """Encola un evento para subirlo a `eventos_acceso` (nunca bloquea en red)."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO eventos_pendientes (matricula, acceso, confianza, ts, observaciones) VALUES (?, ?, ?, ?, ?)",
+                (matricula, int(bool(acceso)), confianza, (ts or datetime.now()).isoformat(), observaciones),
+            )
+
+    def pending_events(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM eventos_pendientes").fetchone()[0]
+
+    def flush_events(self) -> int:
+        """Sube los eventos pendientes por lotes; los borra solo si se insertaron."""
+        total = 0
+        while True:
+            with self._lock:
+                filas = self._db.execute(
+                    "SELECT id, matricula, acceso, confianza, ts, observaciones FROM eventos_pendientes ORDER BY id LIMIT ?",
+                    (self.UPLOAD_BATCH,),
+                ).fetchall()
+            if not filas:
+                break
+            self._upload_events([
+                {"matricula": m, "acceso": bool(a), "confianza": c, "ts": datetime.fromisoformat(ts),
+                 "motivo": obs, "origen": "borde"}
+                for _, m, a, c, ts, obs in filas
+            ])
+            with self._lock:
+                self._db.execute("DELETE FROM eventos_pendientes WHERE id <= ?", (filas[-1][0],))
+            total += len(filas)
+        return total
+
+    # --- Hilo de fondo ---------------------------------------------------
+    def start(self, interval: float = 10.0):
+        """Sincroniza y sube eventos cada `interval` segundos en segundo plano."""
+        if self._running:
+            return
+        self._running = True
+
+        def loop():
+            while self._running:
+                try:
+                    self.sync()
+                    self.flush_events()
+                    self.last_sync_error = None
+                except Exception as e:
+                    # Sin conectividad: se sigue decidiendo con la réplica local
+                    if self.last_sync_error != str(e):
+                        print(f"⚠️ Réplica de borde sin sincronizar: {e}")
+                    self.last_sync_error = str(e)
+                time.sleep(interval)
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def status(self) -> dict:
+        return {
+            "vehiculos": len(self._rows),
+            "ultima_sincronizacion": self.last_sync,
+            "error": self.last_sync_error,
+            "eventos_pendientes": self.pending_events(),
+        }
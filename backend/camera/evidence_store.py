@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Identificadores de evidencia: hex de uuid4 (evita rutas arbitrarias)
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_SHA_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Margen alrededor de la patente en el recorte guardado (fracción del bbox)
+CROP_MARGIN = 0.15
+
+
+class EvidenceStore:
+    """
+    Almacén local de imágenes de evidencia de cada detección confirmada.
+
+    `submit` solo copia el frame y lo encola (`put_nowait`): el encode JPEG
+    y la escritura a disco corren en un hilo aparte, así la captura nunca
+    espera al disco. Si la cola está llena la evidencia se descarta y se
+    cuenta en `dropped`.
+
+    Los JPEG se guardan direccionados por contenido (`blobs/ab/<sha256>.jpg`,
+    escritos una sola vez) y cada detección tiene su referencia
+    `refs/<id>.json` con la patente, la decisión y los hashes del frame y
+    del recorte. La retención borra referencias más viejas que `max_age_days`
+    y las más antiguas mientras el total supere `max_bytes`; los blobs sin
+    referencias se eliminan después.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3, max_age_days: float = 30,
+                 jpeg_quality: int = 85, queue_size: int = 16):
+        self.root = os.path.abspath(root)
+        self.blobs_dir = os.path.join(self.root, "blobs")
+        self.refs_dir = os.path.join(self.root, "refs")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        # id -> (ts, (sha frame, sha recorte)); sha -> tamaño en bytes
+        self._refs: Dict[str, Tuple[float, Tuple[str, ...]]] = {}
+        self._blob_sizes: Dict[str, int] = {}
+        self._running = False
+        self.written = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+        self._scan()
+
+    # --- Rutas -------------------------------------------------------------
+    def blob_path(self, sha: str) -> str:
+        return os.path.join(self.blobs_dir, sha[:2], sha + ".jpg")
+
+    def ref_path(self, evidence_id: str) -> str:
+        return os.path.join(self.refs_dir, evidence_id + ".json")
+
+    def _scan(self):
+        """Reconstruye el índice en memoria desde el disco (al iniciar)."""
+        for name in os.listdir(self.refs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.refs_dir, name), encoding="utf-8") as f:
+                    ref = json.load(f)
+                self._refs[ref["id"]] = (ref["ts"], tuple(h for h in (ref.get("frame"), ref.get("placa")) if h))
+            except (OSError, ValueError, KeyError):
+                continue
+        for sub in os.listdir(self.blobs_dir):
+            subdir = os.path.join(self.blobs_dir, sub)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if name.endswith(".jpg"):
+                    self._blob_sizes[name[:-4]] = os.path.getsize(os.path.join(subdir, name))
+
+    # --- Productor (hilo de captura / inferencia) --------------------------
+    def submit(self, frame: np.ndarray, bbox=None, meta: Optional[dict] = None) -> Optional[str]:
+        """
+        Encola el frame (copiado: el slot del buffer circular se reutiliza)
+        y retorna el id de la evidencia, o None si la cola está llena.
+        """
+        if frame is None:
+            return None
+        evidence_id = uuid.uuid4().hex
+        try:
+            self._queue.put_nowait((evidence_id, time.time(), frame.copy(), bbox, dict(meta or {})))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return evidence_id
+
+    # --- Hilo de escritura --------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._writer_loop, name="evidence-writer", daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def _writer_loop(self):
+        last_retention = 0.0
+        while self._running:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    self._write(*item)
+                    self.written += 1
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"❌ Error guardando evidencia: {e}")
+            if time.time() - last_retention > 60 or self._total_bytes() > self.max_bytes:
+                try:
+                    self.apply_retention()
+                except Exception as e:
+                    print(f"⚠️ Error aplicando retención de evidencias: {e}")
+                last_retention = time.time()
+
+    def _crop(self, frame: np.ndarray, bbox):
+        if not bbox:
+            return None
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in bbox[:4])
+        mx, my = int((x2 - x1) * CROP_MARGIN), int((y2 - y1) * CROP_MARGIN)
+        crop = frame[max(0, y1 - my):min(h, y2 + my), max(0, x1 - mx):min(w, x2 + mx)]
+        return crop if crop.size else None
+
+    def _put_blob(self, img: np.ndarray) -> str:
+        ok, buf = cv2.imencode(".jpg", img, self.jpeg_params)
+        if not ok:
+            raise RuntimeError("cv2.imencode falló")
+        data = buf.tobytes()
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha)
+        if sha not in self._blob_sizes:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, data)
+            with self._lock:
+                self._blob_sizes[sha] = len(data)
+        return sha
+
+    def _write(self, evidence_id: str, ts: float, frame: np.ndarray, bbox, meta: dict):
+        frame_sha = self._put_blob(frame)
+        crop = self._crop(frame, bbox)
+        crop_sha = self._put_blob(crop) if crop is not None else None
+        ref = {"id": evidence_id, "ts": ts, "frame": frame_sha, "placa": crop_sha,
+               "bbox": list(bbox) if bbox else None, **meta}
+        _atomic_write(self.ref_path(evidence_id), json.dumps(ref, default=str).encode())
+        with self._lock:
+            self._refs[evidence_id] = (ts, tuple(h for h in (frame_sha, crop_sha) if h))
+
+    # --- Retención ------------------------------------------------------------
+    def _total_bytes(self) -> int:
+        return sum(self._blob_sizes.values())
+
+    def apply_retention(self) -> int:
+        """Borra evidencias por antigüedad y por tamaño total. Retorna cuántas."""
+        with self._lock:
+            by_age = sorted(self._refs.items(), key=lambda kv: kv[1][0])
+            cutoff = time.time() - self.max_age
+            total = self._total_bytes()
+            expired = []
+            for evidence_id, (ts, hashes) in by_age:
+                if ts >= cutoff and total <= self.max_bytes:
+                    break
+                expired.append(evidence_id)
+                # Estimación: el blob puede estar compartido, se recalcula al final
+                total -= sum(self._blob_sizes.get(h, 0) for h in hashes)
+            for evidence_id in expired:
+                self._refs.pop(evidence_id, None)
+            alive = {h for _, hashes in self._refs.values() for h in hashes}
+            orphans = [h for h in self._blob_sizes if h not in alive]
+            for h in orphans:
+                self._blob_sizes.pop(h, None)
+
+        # El borrado de archivos no necesita el lock
+        for evidence_id in expired:
+            _remove(self.ref_path(evidence_id))
+        for h in orphans:
+            _remove(self.blob_path(h))
+        return len(expired)
+
+    # --- Lectura (endpoint) ---------------------------------------------------
+    def get_ref(self, evidence_id: str) -> Optional[dict]:
+        """Referencia de la evidencia leída del disco (sirve desde cualquier proceso)."""
+        if not _ID_RE.match(evidence_id or ""):
+            return None
+        try:
+            with open(self.ref_path(evidence_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def file_for(self, evidence_id: str, kind: str = "frame") -> Optional[Tuple[str, str]]:
+        """(ruta, sha256) del JPEG `frame` o `placa` de una evidencia."""
+        ref = self.get_ref(evidence_id)
+        sha = ref.get(kind) if ref else None
+        if not sha or not _SHA_RE.match(sha):
+            return None
+        path = self.blob_path(sha)
+        return (path, sha) if os.path.exists(path) else None
+
+    def status(self) -> dict:
+        return {
+            "evidencias": len(self._refs),
+            "bytes": self._total_bytes(),
+            "en_cola": self._queue.qsize(),
+            "escritas": self.written,
+            "descartadas": self.dropped,
+            "error": self.last_error,
+        }
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Instancia global del almacén de evidencias
+evidence_store: Optional[EvidenceStore] = None
+
+
+def get_evidence_store() -> Optional[EvidenceStore]:
+    """
+    Almacén configurado por EVIDENCE_DIR / EVIDENCE_MAX_MB / EVIDENCE_MAX_DAYS.
+    Se crea al primer uso; retorna None si EVIDENCE_STORE=0.
+    """
+    global evidence_store
+    if evidence_store is None:
+        if os.getenv("EVIDENCE_STORE", "1").lower() not in ("1", "true", "yes", "on"):
+            return None
+        root = os.getenv("EVIDENCE_DIR") or os.path.join(os.path.dirname(__file__), "..", "data", "evidence")
+        evidence_store = EvidenceStore(
+            root,
+            max_bytes=int(float(os.getenv("EVIDENCE_MAX_MB", "2048")) * 1024 * 1024),
+            max_age_days=float(os.getenv("EVIDENCE_MAX_DAYS", "30")),
+            jpeg_quality=int(os.getenv("EVIDENCE_JPEG_QUALITY", "85")),
+        )
+    return evidence_store
@@ -0,0 +1,167 @@
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+# Encabezado: [ultimo_seq, slots, alto, ancho, canales] + estado de cada slot
+_HEADER_FIELDS = 5
+
+
+class FrameRingBuffer:
+    """
+    Buffer circular de frames preasignados, opcionalmente en memoria compartida.
+
+    La captura escribe cada frame en el siguiente slot, en el lugar
+    (`begin_write` / `commit`), sin asignar memoria nueva. Los consumidores
+    (inferencia, encoder MJPEG, snapshot) leen el último frame como vista de
+    solo lectura o copiándolo a un buffer propio.
+
+    Cada slot tiene un estado tipo seqlock: `2*seq + 1` mientras se escribe y
+    `2*seq` cuando el frame `seq` está completo. Un lector compara el estado
+    antes y después de leer; si cambió, el frame se pisó a mitad de la
+    lectura (torn read) y se descarta.
+
+    Con `shm_name` los datos viven en `multiprocessing.shared_memory`, así
+    otro proceso (p.ej. los workers de inferencia) puede `attach` y leer los
+    frames sin serializarlos.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], slots: int = 4, dtype=np.uint8,
+                 shm_name: Optional[str] = None, start_seq: int = 0,
+                 _attach: bool = False, _track: bool = True):
+        if len(shape) == 2:
+            shape = (shape[0], shape[1], 1)
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        header_bytes = (_HEADER_FIELDS + slots) * 8
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        total = header_bytes + frame_bytes * slots
+
+        self._shm = None
+        if shm_name:
+            if _attach:
+                self._shm = shared_memory.SharedMemory(name=shm_name)
+                if not _track:
+                    # Proceso ajeno (worker de la API): que su resource_tracker
+                    # no borre el segmento de la cámara al terminar
+                    resource_tracker.unregister(self._shm._name, "shared_memory")
+            else:
+                try:
+                    self._shm = shared_memory.SharedMemory(name=shm_name, create=True, size=total)
+                except FileExistsError:
+                    # Quedó de una ejecución anterior: recrearlo con el tamaño actual
+                    old = shared_memory.SharedMemory(name=shm_name)
+                    old.close()
+                    old.unlink()
+                    self._shm = shared_memory.SharedMemory(name=shm_name, create=True, size=total)
+            raw = self._shm.buf
+        else:
+            raw = bytearray(total)
+
+        self._header = np.ndarray((_HEADER_FIELDS + slots,), dtype=np.int64, buffer=raw)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=raw, offset=header_bytes)
+        if not _attach:
+            self._header[:] = 0
+            self._header[1:5] = (slots,) + self.shape
+            # Al recrear el buffer (cambio de resolución) la numeración sigue:
+            # los lectores con `after_seq` del buffer anterior no se traban
+            self._header[0] = start_seq
+        self._writing: Optional[int] = None
+
+    @classmethod
+    def attach(cls, shm_name: str, track: bool = True) -> "FrameRingBuffer":
+        """
+        Se conecta (desde otro proceso) a un buffer creado con `shm_name`.
+        `track=False` para procesos que no descienden del que lo creó.
+        """
+        probe = shared_memory.SharedMemory(name=shm_name)
+        try:
+            head = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=probe.buf).copy()
+        finally:
+            probe.close()
+        slots, h, w, c = (int(v) for v in head[1:5])
+        return cls((h, w, c), slots=slots, shm_name=shm_name, _attach=True, _track=track)
+
+    @property
+    def name(self) -> Optional[str]:
+        return self._shm.name if self._shm else None
+
+    @property
+    def latest_seq(self) -> int:
+        """Número del último frame completo (0 = todavía no hay frames)."""
+        return int(self._header[0])
+
+    def _state(self, slot: int) -> int:
+        return int(self._header[_HEADER_FIELDS + slot])
+
+    # --- Escritura (un solo productor) -----------------------------------
+    def begin_write(self) -> np.ndarray:
+        """Reserva el próximo slot y devuelve su array para escribir en el lugar."""
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        self._header[_HEADER_FIELDS + slot] = 2 * seq + 1
+        self._writing = seq
+        return self._frames[slot]
+
+    def commit(self) -> int:
+        """Publica el frame escrito en el slot reservado."""
+        seq = self._writing
+        self._header[_HEADER_FIELDS + seq % self.slots] = 2 * seq
+        self._header[0] = seq
+        self._writing = None
+        return seq
+
+    def abort(self):
+        """Descarta la escritura en curso (p.ej. falló la lectura de la cámara)."""
+        if self._writing is not None:
+            self._header[_HEADER_FIELDS + self._writing % self.slots] = 0
+            self._writing = None
+
+    def write(self, frame: np.ndarray) -> int:
+        np.copyto(self.begin_write(), frame.reshape(self.shape))
+        return self.commit()
+
+    # --- Lectura ----------------------------------------------------------
+    def is_valid(self, seq: int) -> bool:
+        """True si el frame `seq` sigue intacto en su slot."""
+        return seq > 0 and self._state(seq % self.slots) == 2 * seq
+
+    def view(self, seq: Optional[int] = None) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Vista de solo lectura del frame `seq` (o del último), sin copiar.
+        El productor puede pisarla `slots - 1` frames después: quien la use
+        por más tiempo debe confirmar con `is_valid(seq)` al terminar.
+        """
+        seq = self.latest_seq if seq is None else seq
+        if not self.is_valid(seq):
+            return seq, None
+        v = self._frames[seq % self.slots].view()
+        v.flags.writeable = False
+        return seq, v
+
+    def read(self, dst: Optional[np.ndarray] = None, seq: Optional[int] = None,
+             retries: int = 3) -> Tuple[int, Optional[np.ndarray]]:
+        """Copia el frame `seq` (o el último) a `dst`, descartando lecturas rotas."""
+        if dst is None:
+            dst = np.empty(self.shape, dtype=self.dtype)
+        for _ in range(retries):
+            s = self.latest_seq if seq is None else seq
+            if not self.is_valid(s):
+                if seq is not None:
+                    return s, None  # el frame pedido ya no existe
+                continue
+            np.copyto(dst, self._frames[s % self.slots])
+            if self.is_valid(s):
+                return s, dst
+        return (seq or self.latest_seq), None
+
+    def close(self):
+        if self._shm is not None:
+            # Liberar las vistas antes de cerrar el segmento
+            self._header = None
+            self._frames = None
+            self._shm.close()
+
+    def unlink(self):
+        if self._shm is not None:
+            self._shm.unlink()
@@ -0,0 +1,282 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import wait as wait_sentinels
+from typing import Callable, Dict, Optional
+
+# Segundos sin respuesta tras los cuales un trabajo se da por perdido
+JOB_TIMEOUT = 30.0
+
+
+def _worker_main(worker_id: int, models_dir: str, shm_name: str, tasks, results,
+                 torch_threads: int, cv2_threads: int, detector_kwargs: dict):
+    """
+    Proceso de inferencia: carga los modelos una vez, hace warmup y luego
+    atiende trabajos (número de frame) leyendo el frame desde la memoria
+    compartida del buffer de captura, sin serializarlo.
+    """
+    # Limitar hilos ANTES de importar torch/cv2 para no sobresuscribir núcleos
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(torch_threads)
+
+    import numpy as np
+    import cv2
+    cv2.setNumThreads(cv2_threads)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+
+    from camera.detector import ANPRDetector
+    from camera.frame_buffer import FrameRingBuffer
+
+    t0 = time.perf_counter()
+    detector = ANPRDetector(models_dir=models_dir, **detector_kwargs)
+    load_ms = (time.perf_counter() - t0) * 1000
+    # Warmup a la forma de producción antes de aceptar trabajos
+    if os.getenv("MODEL_WARMUP", "1").lower() in ("1", "true", "yes", "on"):
+        detector.warmup()
+    results.put(("ready", worker_id, None, {"carga_ms": load_ms, **detector.warm_status()}))
+
+    buffer: Optional[FrameRingBuffer] = None
+    frame = None
+
+    while True:
+        job = tasks.get()
+        if job is None:
+            break
+        job_id, seq, shape, captured = job
+        # Avisa qué trabajo tomó: si el proceso muere, el supervisor lo da
+        # por fallido enseguida en lugar de esperar JOB_TIMEOUT
+        results.put(("taken", worker_id, job_id, None))
+        try:
+            if buffer is None or buffer.shape != tuple(shape):
+                # Primer trabajo o la captura recreó el buffer (cambió la resolución)
+                if buffer is not None:
+                    buffer.close()
+                buffer = FrameRingBuffer.attach(shm_name)
+                frame = np.empty(buffer.shape, dtype=buffer.dtype)
+            # Copia local: la inferencia tarda más que `slots` frames de captura
+            _, got = buffer.read(frame, seq=seq)
+            if got is None:
+                results.put(("stale", worker_id, job_id, None))
+                continue
+            t_start = time.perf_counter()
+            result = detector.detect_plate_from_frame(frame)
+            results.put(("result", worker_id, job_id, {
+                "seq": seq,
+                "captured": captured,
+                "result": result,
+                "inference_ms": (time.perf_counter() - t_start) * 1000,
+            }))
+        except Exception as e:
+            results.put(("error", worker_id, job_id, str(e)))
+
+
+class InferencePool:
+    """
+    Pool de procesos de inferencia ANPR, fuera del GIL del proceso de la API.
+
+    Cada worker carga los modelos una sola vez y recibe solo el número de
+    frame; lee el frame de `FrameRingBuffer` en memoria compartida. Si un
+    worker muere, el supervisor lo reinicia. `submit` nunca bloquea: si
+    todos los workers están ocupados, el frame se saltea.
+    """
+
+    def __init__(self, models_dir: str, shm_name: str, workers: int = 1,
+                 torch_threads: Optional[int] = None, cv2_threads: int = 1,
+                 on_result: Optional[Callable[[dict], None]] = None,
+                 detector_kwargs: Optional[dict] = None):
+        self.models_dir = models_dir
+        self.detector_kwargs = detector_kwargs or {}
+        self.shm_name = shm_name
+        self.workers = max(1, workers)
+        cpus = os.cpu_count() or 1
+        self.torch_threads = torch_threads or max(1, cpus // self.workers)
+        self.cv2_threads = cv2_threads
+        self.on_result = on_result
+
+        self._ctx = mp.get_context("spawn")
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._procs: Dict[int, mp.Process] = {}
+        self._ready: Dict[int, dict] = {}
+        self._inflight: Dict[int, float] = {}
+        self._taken_by: Dict[int, int] = {}  # job_id -> worker que lo tomó
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._running = False
+        self.restarts = 0
+        self.skipped = 0
+        self.lost_jobs = 0
+        self.last_inference_ms: Optional[float] = None
+
+    # --- Ciclo de vida ----------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        self._running = True
+        for wid in range(self.workers):
+            self._spawn(wid)
+        threading.Thread(target=self._result_loop, daemon=True).start()
+        threading.Thread(target=self._supervise, daemon=True).start()
+        print(f"🧠 Pool de inferencia: {self.workers} procesos × {self.torch_threads} hilos torch")
+
+    def stop(self):
+        self._running = False
+        for _ in self._procs:
+            self._tasks.put(None)
+        for p in self._procs.values():
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        with self._lock:
+            self._inflight.clear()
+            self._taken_by.clear()
+        self._ready.clear()
+
+    def _spawn(self, wid: int):
+        p = self._ctx.Process(
+            target=_worker_main,
+            args=(wid, self.models_dir, self.shm_name, self._tasks, self._results,
+                  self.torch_threads, self.cv2_threads, self.detector_kwargs),
+            name=f"anpr-worker-{wid}",
+            daemon=True,
+        )
+        p.start()
+        self._procs[wid] = p
+        self._ready.pop(wid, None)
+
+    def _supervise(self):
+        backoff: Dict[int, float] = {}
+        failed = set()  # workers muertos cuyos trabajos ya se liberaron
+        while self._running:
+            # Se despierta apenas muere un worker (su sentinel queda listo)
+            sentinels = [p.sentinel for p in self._procs.values() if p.is_alive()]
+            if sentinels:
+                wait_sentinels(sentinels, timeout=1)
+            else:
+                time.sleep(1)
+            if not self._running:
+                break
+            now = time.time()
+            for wid, p in list(self._procs.items()):
+                if p.is_alive():
+                    continue
+                if wid not in failed:
+                    failed.add(wid)
+                    self._fail_jobs_of(wid)
+                if now < backoff.get(wid, 0):
+                    continue
+                print(f"⚠️ Worker de inferencia {wid} terminó (exit={p.exitcode}), reiniciando")
+                self.restarts += 1
+                backoff[wid] = now + min(30, 2 ** min(self.restarts, 5))
+                failed.discard(wid)
+                self._spawn(wid)
+            # Respaldo: un trabajo sin respuesta (p.ej. el aviso de `taken` se
+            # perdió con el proceso) libera su lugar tras JOB_TIMEOUT
+            with self._lock:
+                for job_id, t in list(self._inflight.items()):
+                    if now - t > JOB_TIMEOUT:
+                        del self._inflight[job_id]
+                        self._taken_by.pop(job_id, None)
+
+    def _fail_jobs_of(self, wid: int):
+        """Libera los trabajos que tenía un worker muerto: nunca van a responder."""
+        with self._lock:
+            jobs = [job_id for job_id, w in self._taken_by.items() if w == wid]
+            for job_id in jobs:
+                self._taken_by.pop(job_id, None)
+                self._inflight.pop(job_id, None)
+            self.lost_jobs += len(jobs)
+        if jobs:
+            print(f"⚠️ {len(jobs)} trabajo(s) perdidos con el worker de inferencia {wid}")
+
+    # --- Trabajos ---------------------------------------------------------
+    def submit(self, seq: int, shape, captured: Optional[float] = None) -> bool:
+        """
+        Encola el frame `seq` si hay un worker libre. No bloquea.
+        `captured` (instante de captura) vuelve tal cual en el resultado.
+        """
+        with self._lock:
+            if len(self._inflight) >= self.workers:
+                self.skipped += 1
+                return False
+            job_id = next(self._job_ids)
+            self._inflight[job_id] = time.time()
+        self._tasks.put((job_id, seq, tuple(shape), captured))
+        return True
+
+    def _result_loop(self):
+        while self._running:
+            try:
+                kind, wid, job_id, payload = self._results.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if kind == "ready":
+                self._ready[wid] = payload
+                print(f"✅ Worker de inferencia {wid} listo ({payload['carga_ms']:.0f} ms de carga"
+                      f" + {payload['warmup_ms'] or 0:.0f} ms de warmup)")
+                continue
+            if kind == "taken":
+                p = self._procs.get(wid)
+                with self._lock:
+                    if job_id not in self._inflight:
+                        pass
+                    elif p is not None and not p.is_alive():
+                        # El aviso llegó después de que el supervisor vio la caída
+                        del self._inflight[job_id]
+                        self.lost_jobs += 1
+                    else:
+                        self._taken_by[job_id] = wid
+                continue
+            with self._lock:
+                self._inflight.pop(job_id, None)
+                self._taken_by.pop(job_id, None)
+            if kind == "error":
+                print(f"❌ Error en worker de inferencia {wid}: {payload}")
+            elif kind == "result":
+                self.last_inference_ms = payload["inference_ms"]
+                if self.on_result:
+                    try:
+                        self.on_result(payload)
+                    except Exception as e:
+                        print(f"❌ Error procesando resultado de inferencia: {e}")
+
+    @property
+    def warm_state(self) -> str:
+        """warm si todos los workers vivos terminaron el warmup."""
+        listos = sum(1 for wid, p in self._procs.items() if p.is_alive() and wid in self._ready)
+        if listos and listos == len(self._procs):
+            return "warm"
+        return "warming" if self._running else "cold"
+
+    def warm_status(self) -> dict:
+        ready = list(self._ready.values())
+        return {
+            "estado": self.warm_state,
+            "warmup_ms": max((r["warmup_ms"] or 0 for r in ready), default=None),
+            "cache": ready[0]["cache"] if ready else None,
+        }
+
+    def status(self) -> dict:
+        return {
+            "workers": self.workers,
+            "vivos": sum(1 for p in self._procs.values() if p.is_alive()),
+            "listos": len(self._ready),
+            "en_curso": len(self._inflight),
+            "reinicios": self.restarts,
+            "trabajos_perdidos": self.lost_jobs,
+            "frames_salteados": self.skipped,
+            "ultima_inferencia_ms": self.last_inference_ms,
+            "torch_threads": self.torch_threads,
+        }
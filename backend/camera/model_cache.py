@@ -0,0 +1,82 @@
+"""
+Caché local de modelos para arrancar en caliente.
+
+Los pesos YOLO se fusionan (Conv + BatchNorm) una sola vez y se guardan en
+MODEL_CACHE_DIR con el hash de los pesos originales y de las versiones de
+ultralytics/torch en el nombre: si cambian los pesos o se actualiza una
+librería, la clave cambia y se vuelve a generar. Los modelos de EasyOCR se
+descargan a la misma carpeta, que conviene persistir entre despliegues
+(volumen o disco del servicio).
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+# Bytes leídos por vuelta al calcular el hash de los pesos
+_CHUNK = 1 << 20
+
+
+def cache_dir(models_dir: str) -> Optional[Path]:
+    """MODEL_CACHE_DIR o `<models_dir>/cache`; `off` deshabilita la caché."""
+    value = os.getenv("MODEL_CACHE_DIR", "").strip()
+    if value.lower() in ("0", "off", "none"):
+        return None
+    path = Path(value or os.path.join(models_dir, "cache"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def weights_key(weights: str) -> str:
+    """Hash corto de los pesos + versiones de las librerías que los cargan."""
+    import torch
+    import ultralytics
+
+    h = hashlib.sha256()
+    with open(weights, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    h.update(f"ultralytics={ultralytics.__version__};torch={torch.__version__}".encode())
+    return h.hexdigest()[:16]
+
+
+def load_yolo(weights: str, cache: Optional[Path]) -> Tuple["YOLO", bool]:
+    """
+    Carga `weights` ya fusionado desde la caché, o lo fusiona y lo guarda.
+    Retorna (modelo, acierto_de_cache). Sin caché carga los pesos tal cual.
+    """
+    from ultralytics import YOLO
+
+    if cache is None:
+        return YOLO(weights), False
+    cached = cache / f"{Path(weights).stem}-{weights_key(weights)}.pt"
+    if cached.exists():
+        try:
+            return YOLO(str(cached)), True
+        except Exception as e:
+            print(f"⚠️ Caché de modelo inválida ({cached.name}), se regenera: {e}")
+            cached.unlink(missing_ok=True)
+
+    model = YOLO(weights)
+    model.fuse()
+    tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        model.save(str(tmp))
+        os.replace(tmp, cached)  # atómico: otro worker puede estar leyendo
+        print(f"💾 Modelo fusionado en caché: {cached}")
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar {cached.name} en la caché: {e}")
+        tmp.unlink(missing_ok=True)
+    return model, False
+
+
+def easyocr_dir(cache: Optional[Path]) -> Optional[str]:
+    """Carpeta de modelos de EasyOCR dentro de la caché (None = la de EasyOCR)."""
+    if cache is None:
+        return None
+    path = cache / "easyocr"
+    path.mkdir(exist_ok=True)
+    return str(path)
@@ -0,0 +1,167 @@
+"""
+Motores de OCR para los recortes de patente.
+
+- `easyocr`: detector + reconocedor de propósito general (pesado en CPU y
+  memoria, sin modelo propio).
+- `plate_ctc`: reconocedor compacto de patentes en ONNX (línea de texto
+  única, charset fijo, salida CTC). Requiere `onnxruntime` y el modelo en
+  PLATE_OCR_MODEL.
+
+OCR_ENGINE elige el motor; si no se puede cargar se usa EasyOCR.
+OCR_FALLBACK=easyocr agrega EasyOCR como segundo motor para los recortes
+en los que el primero no encuentra una patente válida (carga los dos).
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Candidatos de un recorte: (texto, confianza)
+Candidates = List[Tuple[str, float]]
+
+ENGINES = ("easyocr", "plate_ctc")
+DEFAULT_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class OCREngine(ABC):
+    name = "base"
+
+    @abstractmethod
+    def read(self, img: np.ndarray) -> Candidates:
+        """Candidatos (texto, confianza) de un recorte."""
+
+    def read_many(self, images: Sequence[np.ndarray]) -> List[Candidates]:
+        return [self.read(img) for img in images]
+
+
+class EasyOCREngine(OCREngine):
+    name = "easyocr"
+
+    def __init__(self, model_dir: Optional[str] = None):
+        import easyocr
+        self.reader = easyocr.Reader(['en'], gpu=False, model_storage_directory=model_dir)
+
+    def read(self, img: np.ndarray) -> Candidates:
+        return [(text, score) for _, text, score in self.reader.readtext(img)]
+
+
+class PlateCTCEngine(OCREngine):
+    """
+    Reconocedor CTC: entrada (N, C, H, W) en [0, 1], salida en logits o
+    log-probabilidades (N, T, clases) o (T, N, clases), con el blank en el
+    índice 0 y `charset` a partir del 1.
+    El alto, ancho y canales se toman del modelo; si el lote es dinámico
+    todas las variantes de un recorte van en una sola inferencia.
+    """
+
+    name = "plate_ctc"
+
+    def __init__(self, model_path: str, charset: str = DEFAULT_CHARSET, threads: int = 1):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, opts, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        _, channels, height, width = inp.shape
+        self.channels = channels if isinstance(channels, int) else 1
+        self.height = height if isinstance(height, int) else 32
+        self.width = width if isinstance(width, int) else 128
+        self.dynamic_batch = not isinstance(inp.shape[0], int)
+        self.charset = charset
+        self._buffers = {}
+
+    def _input(self, n: int) -> np.ndarray:
+        buf = self._buffers.get(n)
+        if buf is None:
+            buf = self._buffers[n] = np.empty((n, self.channels, self.height, self.width), dtype=np.float32)
+        return buf
+
+    def _fill(self, dst: np.ndarray, img: np.ndarray):
+        if img.ndim == 3 and self.channels == 1:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        elif img.ndim == 2 and self.channels == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        img = cv2.resize(img, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        if img.ndim == 2:
+            np.multiply(img, 1.0 / 255, out=dst[0])
+        else:
+            np.multiply(img.transpose(2, 0, 1), 1.0 / 255, out=dst)
+
+    def _decode(self, logits: np.ndarray) -> Tuple[str, float]:
+        """Decodificación greedy: colapsa repetidos y descarta el blank."""
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        chars, scores, prev = [], [], 0
+        for t, k in enumerate(best):
+            if k != 0 and k != prev and k <= len(self.charset):
+                chars.append(self.charset[k - 1])
+                scores.append(probs[t, k])
+            prev = k
+        return "".join(chars), float(np.prod(scores)) if scores else 0.0
+
+    def _run(self, images: Sequence[np.ndarray]) -> np.ndarray:
+        batch = self._input(len(images))
+        for i, img in enumerate(images):
+            self._fill(batch[i], img)
+        out = self.session.run(None, {self.input_name: batch})[0]
+        if out.shape[0] != len(images) and out.shape[1] == len(images):
+            out = out.transpose(1, 0, 2)  # (T, N, clases) -> (N, T, clases)
+        return out
+
+    def read(self, img: np.ndarray) -> Candidates:
+        text, score = self._decode(self._run([img])[0])
+        return [(text, score)] if text else []
+
+    def read_many(self, images: Sequence[np.ndarray]) -> List[Candidates]:
+        if not self.dynamic_batch or len(images) < 2:
+            return super().read_many(images)
+        results = []
+        for logits in self._run(images):
+            text, score = self._decode(logits)
+            results.append([(text, score)] if text else [])
+        return results
+
+
+def _create(name: str, models_dir: str, model_dir: Optional[str]) -> OCREngine:
+    if name == "easyocr":
+        return EasyOCREngine(model_dir)
+    if name == "plate_ctc":
+        model = os.getenv("PLATE_OCR_MODEL") or os.path.join(models_dir, "plate_ocr.onnx")
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"No existe el modelo de OCR de patentes: {model}")
+        return PlateCTCEngine(
+            model,
+            charset=os.getenv("PLATE_OCR_CHARSET", DEFAULT_CHARSET),
+            threads=int(os.getenv("PLATE_OCR_THREADS", "1")),
+        )
+    raise ValueError(f"Motor de OCR inválido: {name} (opciones: {', '.join(ENGINES)})")
+
+
+def create_engines(models_dir: str, engine: Optional[str] = None,
+                   model_dir: Optional[str] = None) -> List[OCREngine]:
+    """
+    Motores a usar en orden: el configurado (OCR_ENGINE) y, con
+    OCR_FALLBACK=easyocr, EasyOCR detrás. `model_dir` es la carpeta de
+    modelos de EasyOCR (caché local).
+    """
+    name = (engine or os.getenv("OCR_ENGINE", "easyocr")).strip().lower()
+    if name not in ENGINES:
+        raise ValueError(f"OCR_ENGINE inválido: {name} (opciones: {', '.join(ENGINES)})")
+    try:
+        engines = [_create(name, models_dir, model_dir)]
+    except Exception as e:
+        if name == "easyocr":
+            raise
+        print(f"⚠️ No se pudo cargar el OCR '{name}', se usa EasyOCR: {e}")
+        return [EasyOCREngine(model_dir)]
+    fallback = os.getenv("OCR_FALLBACK", "").strip().lower()
+    if fallback and fallback != name:
+        engines.append(_create(fallback, models_dir, model_dir))
+    return engines
@@ -0,0 +1,35 @@
+"""
+Proceso dedicado a la cámara (SMARTGATE_ROLE=camera).
+
+Captura e inferencia viven acá; los workers de la API (SMARTGATE_ROLE=api)
+reciben las detecciones por pub/sub (PUBSUB_URL) y leen los frames del
+segmento de memoria compartida (FRAME_BUFFER_SHM).
+
+Uso:
+    SMARTGATE_ROLE=camera PUBSUB_URL=postgres python camera_main.py
+"""
+import os
+import signal
+import threading
+
+os.environ.setdefault("SMARTGATE_ROLE", "camera")
+
+from app_state import state  # noqa: E402  (lee SMARTGATE_ROLE al importar)
+
+
+def main():
+    if state.role != "camera":
+        raise SystemExit(f"camera_main.py requiere SMARTGATE_ROLE=camera (actual: {state.role})")
+    detener = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: detener.set())
+
+    state.start()
+    print("🎥 Proceso de cámara en marcha (Ctrl+C para detener)")
+    detener.wait()
+    print("🛑 Deteniendo cámara...")
+    state.stop()
+
+
+if __name__ == "__main__":
+    main()
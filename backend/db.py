@@ -1,10 +1,18 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import os
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from jose import JWTError, jwt
+from plates import normalize_plate, PLATE_NORM_COLUMN
+from db_helpers import DB_SCHEMA, TABLAS_USADAS, table_name
+import queries
+import traceback
+from rows import Usuario, UsuarioLogin, columnas, fila, filas
 
 load_dotenv()
 
@@ -16,8 +24,6 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Configuración para hash de contraseñas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Schema de la base de datos (public es el default en PostgreSQL)
-DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
 
 # Configuración de base de datos PostgreSQL
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -34,6 +40,75 @@ else:
         "port": os.getenv("DB_PORT", "5432")
     }
 
+_SQL_SEARCH_PATH = f"SET search_path TO {DB_SCHEMA}, public"
+
+# Pool de conexiones para las consultas calientes (ver `pooled_connection`)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+def _prepared_statements_enabled() -> bool:
+    """
+    DB_PREPARED_STATEMENTS=auto|1|0. En `auto` se desactivan detrás de un
+    pooler en modo transacción (hosts `-pooler` de Neon o el puerto 6432 de
+    PgBouncer), donde una sentencia preparada no sobrevive a la transacción.
+    """
+    valor = os.getenv("DB_PREPARED_STATEMENTS", "auto").lower()
+    if valor != "auto":
+        return valor in ("1", "true", "yes", "on")
+    destino = db_config.get("dsn") or f"{db_config.get('host')}:{db_config.get('port')}"
+    return "-pooler" not in destino and ":6432" not in destino
+
+PREPARED_STATEMENTS = _prepared_statements_enabled()
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool falla si está agotado: el semáforo hace esperar
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, connection_factory=queries.PreparedConnection, **db_config
+                )
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    """
+    Conexión del pool para consultas cortas: hace commit al salir, rollback
+    si hubo error, y la devuelve al pool (cerrándola si quedó rota). Las
+    sentencias de `queries` quedan preparadas en la conexión entre usos.
+    """
+    _pool_slots.acquire()
+    conn = None
+    roto = False
+    try:
+        pool = _get_pool()
+        conn = pool.getconn()
+        if not conn.configured:
+            with conn.cursor() as cursor:
+                cursor.execute(_SQL_SEARCH_PATH)
+            conn.commit()
+            conn.configured = True
+            if not PREPARED_STATEMENTS:
+                conn.prepared = None  # `queries.execute` usa el SQL común
+        yield conn
+        conn.commit()
+    except psycopg2.OperationalError:
+        roto = True
+        raise
+    except Exception:
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            pool.putconn(conn, close=roto or bool(conn.closed))
+        _pool_slots.release()
+
 def get_connection():
     """Obtiene una conexión a la base de datos con el schema correcto configurado"""
     if "dsn" in db_config:
@@ -43,58 +118,175 @@ def get_connection():
     # Configurar el search_path para usar el schema correcto
     # Con esto, no necesitamos especificar el schema en las consultas
     with conn.cursor() as cursor:
-        cursor.execute(f"SET search_path TO {DB_SCHEMA}, public")
+        cursor.execute(_SQL_SEARCH_PATH)
     conn.commit()
     return conn
 
-def table_name(table: str) -> str:
+def tiene_permiso(matricula: str) -> bool:
     """
-    Retorna el nombre de tabla con schema si es necesario.
-    Para schema 'public', no es necesario especificarlo si search_path está configurado.
-    Pero lo mantenemos explícito por claridad y seguridad.
+    Verifica si un vehículo tiene permiso de acceso según `decision_acceso`.
+    Retorna False si no existe, si no cumple la regla o si la base falla.
     """
-    if DB_SCHEMA == "public":
-        # Para public, podemos omitirlo o incluirlo sin comillas
-        return f"public.{table}"
-    else:
-        return f"{DB_SCHEMA}.{table}"
+    try:
+        # Misma fila (vehículo + último pago + tarifa) que el lote y la cámara
+        fila = verificar_matriculas([matricula]).get(normalize_plate(matricula))
+        return decision_acceso(matricula, fila)["acceso"]
+    except Exception as e:
+        print("Error DB:", e)
+        return False
 
-def tiene_permiso(matricula: str) -> bool:
+def calcular_vencimiento(fecha_pago, descripcion_tarifa: str) -> date:
+    """Fecha de vencimiento de una cochera según el último pago y la tarifa
+    ('mensual' = 30 días, 'anual' = 365 días, otra = el mismo día del pago)."""
+    if isinstance(fecha_pago, str):
+        fecha_pago = datetime.strptime(fecha_pago, "%Y-%m-%d").date()
+    elif isinstance(fecha_pago, datetime):
+        fecha_pago = fecha_pago.date()
+    descripcion = (descripcion_tarifa or "").lower()
+    if descripcion == "mensual":
+        return fecha_pago + timedelta(days=30)
+    if descripcion == "anual":
+        return fecha_pago + timedelta(days=365)
+    return fecha_pago
+
+# Cambios terminados después de la marca de agua (txid, id), con la fila de
+# decisión actual de cada patente (NULL si el vehículo se borró)
+_SQL_CAMBIOS_DESDE = f"""
+    SELECT c.txid, c.id AS cambio, c.matricula_norm AS cambio_norm, d.*
+    FROM {table_name('vehiculos_cambios')} c
+    LEFT JOIN LATERAL ({queries.select_decision(f"v.{PLATE_NORM_COLUMN} = c.matricula_norm", extra_columns=", v.updated_at")}) d ON TRUE
+    WHERE (c.txid, c.id) > (%s, %s) AND c.txid < txid_snapshot_xmin(txid_current_snapshot())
+    ORDER BY c.txid, c.id LIMIT %s
+"""
+_SQL_XMIN = "SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin"
+_SQL_DECISION_TODAS = queries.select_decision("TRUE", extra_columns=", v.updated_at")
+
+def vehiculos_modificados_desde(watermark, limit: int = 1000) -> list:
     """
-    Verifica si un vehículo tiene permiso de acceso.
-    Retorna True si estado = 1 (permitido) y activo = True
-    Retorna False si estado = 0 (denegado) o no existe o no está activo
+    Cambios del registro `vehiculos_cambios` posteriores a `watermark`
+    (txid, id), en ese orden y solo de transacciones ya terminadas: una
+    transacción larga que confirma tarde entra en una lectura posterior.
+    Cada fila trae `txid`, `cambio`, `cambio_norm` y la fila de decisión
+    actual (`matricula_norm` None si el vehículo ya no existe).
+    Usado por la réplica local del modo borde (camera/edge_replica.py).
     """
+    conn = get_connection()
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        # Con search_path configurado, podemos usar solo el nombre de tabla
-        # Pero usamos el schema explícito para mayor claridad
-        query = f"SELECT estado, activo FROM {table_name('vehiculos')} WHERE matricula = %s"
-        cursor.execute(query, (matricula,))
-        resultado = cursor.fetchone()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(_SQL_CAMBIOS_DESDE, (*watermark, limit))
+        filas = cursor.fetchall()
         cursor.close()
+    finally:
         conn.close()
-        if resultado is not None:
-            estado = resultado[0]
-            activo = resultado[1] if len(resultado) > 1 else True
-            # estado = 1 significa acceso permitido, estado = 0 significa denegado
-            # Además debe estar activo
-            return estado == 1 and activo == True
-        else:
-            return False
-    except Exception as e:
-        print("Error DB:", e)
-        return False
+    return filas
+
+def vehiculos_completo() -> tuple:
+    """
+    Copia completa para la réplica de borde: (watermark, filas de decisión).
+    El watermark es (xmin, 0) tomado antes de la lectura: todo lo terminado
+    antes ya está en las filas y lo posterior se lee con
+    `vehiculos_modificados_desde` (releer algo ya copiado no cambia nada).
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(_SQL_XMIN)
+        xmin = cursor.fetchone()["xmin"]
+        cursor.execute(_SQL_DECISION_TODAS)
+        filas = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return (xmin, 0), filas
+
+def verificar_matriculas(matriculas) -> dict:
+    """
+    Resuelve varias matrículas con una única consulta `= ANY(%s)`.
+    Retorna {matricula_normalizada: fila} solo para las que existen.
+    """
+    normalizadas = list({normalize_plate(m) for m in matriculas if normalize_plate(m)})
+    if not normalizadas:
+        return {}
+    with pooled_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        filas = queries.fetchall(cursor, "vehiculos_decision_lote", (normalizadas,))
+    return {f["matricula_norm"]: f for f in filas}
+
+def decision_acceso(matricula: str, fila, hoy: date = None, requiere_cochera: bool = False) -> dict:
+    """
+    Decisión de acceso para una matrícula a partir de la fila de
+    `verificar_matriculas` (o None si no está registrada). Es la única regla:
+    la usan `tiene_permiso`, el lote, /cocheras/verificar-acceso y la cámara.
+
+    Permite si el vehículo está activo (`activo = TRUE`), con estado 1 y, si
+    tiene departamento, con un pago y una tarifa cuya cochera no venció.
+    Con `requiere_cochera` un vehículo sin departamento también se deniega.
+    """
+    decision = {
+        "matricula": matricula,
+        "acceso": False,
+        "motivo": None,
+        "dias_restantes": None,
+        "vencimiento": None,
+    }
+    if fila is None:
+        decision["motivo"] = "Vehículo no registrado"
+        return decision
+    if fila.get("activo") is not True:
+        decision["motivo"] = "Vehículo inactivo"
+        return decision
+    if fila.get("estado") != 1:
+        decision["motivo"] = "Estado del vehículo denegado"
+        return decision
+    if fila.get("id_departamento") is None:
+        if requiere_cochera:
+            decision["motivo"] = "Vehículo sin cochera/departamento asociado"
+            return decision
+        decision["acceso"] = True
+        return decision
+    if fila.get("fecha_pago") is None:
+        decision["motivo"] = "No se encontraron pagos para este departamento"
+        return decision
+    if fila.get("tarifa") is None:
+        decision["motivo"] = "No se encontró tarifa para el departamento"
+        return decision
+    vencimiento = calcular_vencimiento(fila["fecha_pago"], fila["tarifa"])
+    dias_restantes = (vencimiento - (hoy or date.today())).days
+    decision["dias_restantes"] = dias_restantes
+    decision["vencimiento"] = vencimiento.strftime("%Y-%m-%d")
+    if dias_restantes <= 0:
+        decision["motivo"] = "Mensualidad vencida"
+        return decision
+    decision["acceso"] = True
+    return decision
 
 def test_db_connection():
     try:
         conn = get_connection()
         conn.close()
-        return {"db_status": "Conexión exitosa", "schema": DB_SCHEMA}
+        return {"db_status": "Conexión exitosa", "schema": DB_SCHEMA,
+                "prepared_statements": PREPARED_STATEMENTS, "queries": queries.status()}
     except Exception as e:
         return {"db_status": "Error de conexión", "detail": str(e), "schema": DB_SCHEMA}
 
+def validar_catalogo() -> list:
+    """
+    Verifica al arrancar que el schema configurado existe, que están todas
+    las tablas usadas por el SQL precalculado y que cada sentencia del
+    registro de `queries` compila contra el catálogo. Retorna los errores.
+    """
+    errores = []
+    with pooled_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_namespace WHERE nspname = %s", (DB_SCHEMA,))
+        if cursor.fetchone() is None:
+            return [f"El schema '{DB_SCHEMA}' no existe"]
+        cursor.execute(
+            "SELECT t FROM unnest(%s::text[]) AS t WHERE to_regclass(%s || '.' || t) IS NULL",
+            (sorted(TABLAS_USADAS), DB_SCHEMA),
+        )
+        errores += [f"Falta la tabla {DB_SCHEMA}.{fila[0]}" for fila in cursor.fetchall()]
+        errores += queries.validate(cursor)
+    return errores
+
 # Funciones de autenticación adaptadas a tu estructura de tabla
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica si la contraseña coincide con el hash"""
@@ -105,35 +297,27 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def authenticate_user(username: str, password: str):
-    """Autentica un usuario verificando sus credenciales"""
+    """Autentica un usuario verificando sus credenciales (retorna `UsuarioLogin` o False)"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
         # Buscar usuario por username usando tu estructura de tabla
-        cursor.execute(f"SELECT * FROM {table_name('usuarios')} WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with pooled_connection() as conn, conn.cursor() as cursor:
+            user = fila(UsuarioLogin, queries.fetchone(cursor, "usuario_login", (username,)))
         
         if not user:
             print(f"❌ Usuario '{username}' no encontrado en la base de datos")
             return False
         
-        # Convertir a diccionario si es necesario
-        user_dict = dict(user) if not isinstance(user, dict) else user
-        
-        print(f"🔍 Usuario encontrado: {user_dict.get('username')}")
-        print(f"   Activo: {user_dict.get('activo')}")
-        print(f"   Hash preview: {str(user_dict.get('password_hash', ''))[:30]}...")
+        print(f"🔍 Usuario encontrado: {user.username}")
+        print(f"   Activo: {user.activo}")
+        print(f"   Hash preview: {str(user.password_hash or '')[:30]}...")
         
         # Verificar si el usuario está activo
-        if not user_dict.get("activo", True):
+        if user.activo is False:
             print(f"❌ Usuario '{username}' está inactivo")
             return False
         
         # Verificar contraseña usando password_hash
-        password_hash = user_dict.get("password_hash")
+        password_hash = user.password_hash
         if not password_hash:
             print(f"❌ Usuario '{username}' no tiene password_hash")
             return False
@@ -156,10 +340,9 @@ def authenticate_user(username: str, password: str):
             return False
         
         print(f"✅ Autenticación exitosa para '{username}'")
-        return user_dict
+        return user
     except Exception as e:
         print(f"❌ Error en autenticación: {e}")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -186,19 +369,20 @@ def verify_token(token: str):
         return None
 
 def get_user_by_username(username: str):
-    """Obtiene información de un usuario por su username"""
+    """Obtiene un usuario (`Usuario`, sin contraseña) por su username"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(f"SELECT id_usuario, username, nombre, rol, activo FROM {table_name('usuarios')} WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return dict(user) if user else None
+        with pooled_connection() as conn, conn.cursor() as cursor:
+            return fila(Usuario, queries.fetchone(cursor, "usuario_por_username", (username,)))
     except Exception as e:
         print("Error obteniendo usuario:", e)
         return None
 
+_SQL_USUARIO_EXISTE = f"SELECT id_usuario FROM {table_name('usuarios')} WHERE username = %s"
+_SQL_USUARIO_INSERTAR = (
+    f"INSERT INTO {table_name('usuarios')} (username, password_hash, nombre, rol, activo, primer_login) "
+    "VALUES (%s, %s, %s, %s, %s, %s)"
+)
+
 def create_user(username: str, password: str, nombre: str, rol: str = "ope"):
     """Crea un nuevo usuario en la base de datos"""
     try:
@@ -206,7 +390,7 @@ def create_user(username: str, password: str, nombre: str, rol: str = "ope"):
         cursor = conn.cursor()
         
         # Verificar si el usuario ya existe
-        cursor.execute(f"SELECT id_usuario FROM {table_name('usuarios')} WHERE username = %s", (username,))
+        cursor.execute(_SQL_USUARIO_EXISTE, (username,))
         if cursor.fetchone():
             cursor.close()
             conn.close()
@@ -215,7 +399,7 @@ def create_user(username: str, password: str, nombre: str, rol: str = "ope"):
         # Crear nuevo usuario usando tu estructura de tabla
         hashed_password = get_password_hash(password)
         cursor.execute(
-            f"INSERT INTO {table_name('usuarios')} (username, password_hash, nombre, rol, activo, primer_login) VALUES (%s, %s, %s, %s, %s, %s)",
+            _SQL_USUARIO_INSERTAR,
             (username, hashed_password, nombre, rol, True, True)
         )
         conn.commit()
@@ -227,26 +411,58 @@ def create_user(username: str, password: str, nombre: str, rol: str = "ope"):
         print("Error creando usuario:", e)
         return {"success": False, "message": f"Error: {str(e)}"}
 
-def get_all_users():
-    """Obtiene todos los usuarios (sin contraseñas)"""
+USUARIOS_COLUMNAS = columnas(Usuario)
+
+# Variantes (con after_id?, con limit?) armadas una sola vez
+_SQL_USUARIOS = {
+    (desde, limite): (
+        f"SELECT {USUARIOS_COLUMNAS} FROM {table_name('usuarios')}"
+        + (" WHERE id_usuario > %s" if desde else "")
+        + " ORDER BY id_usuario"
+        + (" LIMIT %s" if limite else "")
+    )
+    for desde in (False, True) for limite in (False, True)
+}
+
+def get_all_users(limit: int = None, after_id: int = None):
+    """Obtiene usuarios (`Usuario`, sin contraseñas) ordenados por id.
+    Con `limit`/`after_id` pagina por keyset: WHERE id_usuario > after_id."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(f"SELECT id_usuario, username, nombre, rol, activo, primer_login, fecha_creacion, ultimo_login FROM {table_name('usuarios')}")
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return [dict(user) for user in users]
+        params = [p for p in (after_id, limit) if p is not None]
+        with pooled_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(_SQL_USUARIOS[(after_id is not None, limit is not None)], params)
+            return filas(Usuario, cursor.fetchall())
     except Exception as e:
         print("Error obteniendo usuarios:", e)
         return []
 
+def stream_query(query: str, params=None, itersize: int = 500):
+    """
+    Ejecuta `query` con un cursor del lado del servidor (cursor con nombre) y
+    genera las filas como dicts, trayendo de a `itersize`. La conexión se
+    cierra al agotar (o abandonar) el generador.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(name="smartgate_stream", cursor_factory=RealDictCursor)
+        cursor.itersize = itersize
+        cursor.execute(query, params)
+        for row in cursor:
+            yield row
+        cursor.close()
+    finally:
+        conn.close()
+
+_SQL_ULTIMO_LOGIN = (
+    f"UPDATE {table_name('usuarios')} SET ultimo_login = CURRENT_TIMESTAMP, primer_login = FALSE WHERE username = %s"
+)
+
 def update_last_login(username: str):
     """Actualiza el último login del usuario"""
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute(f"UPDATE {table_name('usuarios')} SET ultimo_login = CURRENT_TIMESTAMP, primer_login = FALSE WHERE username = %s", (username,))
+        cursor.execute(_SQL_ULTIMO_LOGIN, (username,))
         conn.commit()
         cursor.close()
         conn.close()
@@ -1,20 +1,61 @@
 """
 Funciones auxiliares para construir consultas SQL con manejo de schemas
 """
+import base64
+import json
 import os
+import re
+from typing import Set
 from dotenv import load_dotenv
 
 load_dotenv()
+
+# Schema de la base de datos (public es el default en PostgreSQL). Se
+# interpola en el SQL, así que solo se aceptan identificadores simples.
 DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
+if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", DB_SCHEMA):
+    raise ValueError(f"DB_SCHEMA inválido: {DB_SCHEMA!r}")
+
+# Tablas referenciadas por el SQL armado con `table_name` (ver `db.validar_catalogo`)
+TABLAS_USADAS: Set[str] = set()
 
 def table_name(table: str) -> str:
     """
-    Retorna el nombre de tabla con schema si es necesario.
-    Para schema 'public', omite el schema (PostgreSQL lo busca por defecto).
+    Nombre de tabla calificado con el schema configurado (`public.x`,
+    `smartgate.x`). Única implementación: el SQL se arma con esto una sola
+    vez, al importar cada módulo.
     """
-    if DB_SCHEMA == "public":
-        return table
-    else:
-        return f"{DB_SCHEMA}.{table}"
+    TABLAS_USADAS.add(table)
+    return f"{DB_SCHEMA}.{table}"
+
+
+# Paginación por keyset -----------------------------------------------------
 
+def encode_cursor(*values) -> str:
+    """Codifica la clave de la última fila entregada en un cursor opaco."""
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
+def decode_cursor(cursor: str) -> list:
+    """Inversa de `encode_cursor`. Lanza ValueError si el cursor no es válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if not isinstance(values, list):
+        raise ValueError("Cursor inválido")
+    return values
+
+def json_array_stream(key: str, rows, extra: dict = None):
+    """
+    Genera `{"<key>": [fila, fila, ...], **extra}` por partes, sin armar la
+    lista completa en memoria. Pensado para filas de un cursor del servidor.
+    """
+    prefix = json.dumps(extra or {}, ensure_ascii=False, default=str)[:-1]
+    yield (prefix + ", " if extra else "{") + json.dumps(key) + ": ["
+    first = True
+    for row in rows:
+        yield ("" if first else ",") + json.dumps(row, ensure_ascii=False, default=str)
+        first = False
+    yield "]}"
@@ -0,0 +1,159 @@
+"""
+Bus de eventos acotado entre la cámara y sus consumidores.
+
+`publish` nunca bloquea: el hilo que decide la barrera deja el evento en la
+cola de cada consumidor y sigue. Cada consumidor tiene su hilo, su tamaño
+máximo y su política cuando se llena:
+
+- `drop_oldest`: se descarta el evento más viejo pendiente.
+- `coalesce`: un evento nuevo con la misma clave (p.ej. la matrícula)
+  reemplaza al pendiente; si igual se llena, se descarta el más viejo.
+
+Cada evento lleva el instante de publicación; las métricas de cada
+consumidor (profundidad, descartes, latencia cola → entrega) se ven en
+`/auto-access/metrics`.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, Optional
+
+POLICIES = ("drop_oldest", "coalesce")
+
+
+class LatencyStats:
+    """Últimas `size` latencias (ms) con percentiles para las métricas."""
+
+    def __init__(self, size: int = 512):
+        self._samples = deque(maxlen=size)
+
+    def add(self, ms: float):
+        self._samples.append(ms)
+
+    def summary(self) -> dict:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"n": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+        n = len(samples)
+        return {
+            "n": n,
+            "p50_ms": round(samples[n // 2], 2),
+            "p99_ms": round(samples[min(n - 1, int(n * 0.99))], 2),
+            "max_ms": round(samples[-1], 2),
+        }
+
+
+class Consumer:
+    def __init__(self, name: str, handler: Callable[[Any], None], maxsize: int = 64,
+                 policy: str = "drop_oldest", key: Optional[Callable[[Any], Hashable]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Política inválida: {policy} (opciones: {', '.join(POLICIES)})")
+        if policy == "coalesce" and key is None:
+            raise ValueError("La política coalesce necesita una función `key`")
+        self.name = name
+        self.handler = handler
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.key = key
+        # clave -> (publicado, evento); sin `key` cada evento tiene clave propia
+        self._pending: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latency = LatencyStats()
+
+    def offer(self, event: Any, published: float):
+        with self._cond:
+            if self.policy == "coalesce":
+                k = self.key(event)
+                if k in self._pending:
+                    # Conserva el instante del primero: la latencia mide la espera real
+                    first, _ = self._pending.pop(k)
+                    self._pending[k] = (first, event)
+                    self.coalesced += 1
+                    self._cond.notify()
+                    return
+            else:
+                self._seq += 1
+                k = self._seq
+            if len(self._pending) >= self.maxsize:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[k] = (published, event)
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # detenido y sin pendientes
+                _, (published, event) = self._pending.popitem(last=False)
+            try:
+                self.handler(event)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Error en consumidor {self.name} del bus: {e}")
+            self.latency.add((time.time() - published) * 1000)
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, name=f"bus-{self.name}", daemon=True).start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def status(self) -> dict:
+        with self._cond:
+            depth = len(self._pending)
+        return {
+            "politica": self.policy,
+            "capacidad": self.maxsize,
+            "en_cola": depth,
+            "max_en_cola": self.max_depth,
+            "entregados": self.delivered,
+            "descartados": self.dropped,
+            "combinados": self.coalesced,
+            "errores": self.errors,
+            "latencia": self.latency.summary(),
+        }
+
+
+class EventBus:
+    def __init__(self):
+        self._consumers: Dict[str, Consumer] = {}
+        self.published = 0
+
+    def subscribe(self, name: str, handler: Callable[[Any], None], maxsize: int = 64,
+                  policy: str = "drop_oldest", key: Optional[Callable[[Any], Hashable]] = None) -> Consumer:
+        consumer = Consumer(name, handler, maxsize=maxsize, policy=policy, key=key)
+        self._consumers[name] = consumer
+        consumer.start()
+        return consumer
+
+    def publish(self, event: Any):
+        """Encola el evento en todos los consumidores. No bloquea."""
+        now = time.time()
+        self.published += 1
+        for consumer in list(self._consumers.values()):
+            consumer.offer(event, now)
+
+    def close(self):
+        for consumer in self._consumers.values():
+            consumer.stop()
+
+    def status(self) -> dict:
+        return {
+            "publicados": self.published,
+            "consumidores": {name: c.status() for name, c in self._consumers.items()},
+        }
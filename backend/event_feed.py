@@ -0,0 +1,269 @@
+"""
+Feed de eventos de detección con IDs crecientes y buffer circular en memoria.
+
+Los productores (hilo de la cámara) llaman a `publish` sin bloquear; los
+clientes SSE/WebSocket se suscriben con el último ID que vieron y reciben
+lo que se perdieron más los eventos nuevos, agrupados en lotes. Cada evento
+se serializa una sola vez al publicarse (fastjson: datetime en ISO 8601,
+Decimal como número), en dos formatos:
+
+- completo: `{"type": "detection", "id": N, "data": {...}}` (formato histórico del WS)
+- compacto: claves cortas, sin nulos (ver `COMPACT_KEYS`)
+
+Cada suscriptor elige qué hacer si se atrasa: `drop_oldest` (se saltea lo
+que exceda `max_lag` eventos pendientes) o `coalesce` (de varios eventos
+pendientes de la misma matrícula se entrega solo el último).
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Set
+
+from event_bus import POLICIES, LatencyStats
+from fastjson import dumps_str
+
+# Campo de la detección -> clave en el formato compacto
+COMPACT_KEYS = {
+    "matricula": "m",
+    "acceso": "a",
+    "motivo": "r",
+    "confianza": "c",
+    "departamento": "d",
+    "propietario": "p",
+    "dias_restantes": "n",
+    "evidencia_id": "e",
+}
+
+
+class FeedEvent:
+    __slots__ = ("id", "ts", "key", "full_json", "compact_json")
+
+    def __init__(self, event_id: int, ts: float, data: dict):
+        self.id = event_id
+        self.ts = ts
+        self.key = data.get("matricula")
+        self.full_json = dumps_str({"type": "detection", "id": event_id, "data": data})
+        compact = {"i": event_id, "t": int(ts * 1000)}
+        for key, short in COMPACT_KEYS.items():
+            value = data.get(key)
+            if value is None:
+                continue
+            if key == "acceso":
+                value = int(bool(value))
+            elif key == "confianza":
+                value = round(float(value), 3)
+            compact[short] = value
+        self.compact_json = dumps_str(compact)
+
+
+class FeedBatch:
+    """Eventos a entregar; `missed` indica que se perdieron eventos viejos."""
+    __slots__ = ("events", "missed", "first_id", "dropped")
+
+    def __init__(self, events: List[FeedEvent], missed: bool = False, first_id: Optional[int] = None,
+                 dropped: int = 0):
+        self.events = events
+        self.missed = missed
+        self.first_id = first_id
+        self.dropped = dropped  # salteados por `max_lag`
+
+    @property
+    def last_id(self) -> Optional[int]:
+        return self.events[-1].id if self.events else None
+
+    @property
+    def gap(self) -> bool:
+        """True si el cliente no recibe todo desde su último ID: eventos que
+        ya salieron del buffer (`missed`) o salteados por `max_lag`."""
+        return self.missed or self.dropped > 0
+
+    def compact_json(self) -> str:
+        return "[" + ",".join(e.compact_json for e in self.events) + "]"
+
+
+class Subscriber:
+    __slots__ = ("loop", "waiter", "policy", "max_lag", "delivered", "dropped", "coalesced")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, policy: str, max_lag: int):
+        self.loop = loop
+        self.waiter = asyncio.Event()
+        self.policy = policy
+        self.max_lag = max_lag
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def shape(self, batch: FeedBatch) -> FeedBatch:
+        """Aplica la política del suscriptor al lote pendiente."""
+        self.dropped += batch.dropped
+        events = batch.events
+        if self.policy == "coalesce" and len(events) > 1:
+            last = {}
+            for event in events:
+                last[event.key] = event
+            if len(last) < len(events):
+                self.coalesced += len(events) - len(last)
+                # El último evento del lote siempre queda: `last_id` no cambia
+                batch = FeedBatch(sorted(last.values(), key=lambda e: e.id),
+                                  missed=batch.missed, first_id=batch.first_id, dropped=batch.dropped)
+        self.delivered += len(batch.events)
+        return batch
+
+    def status(self) -> dict:
+        return {"politica": self.policy, "max_pendientes": self.max_lag or None,
+                "entregados": self.delivered, "descartados": self.dropped, "combinados": self.coalesced}
+
+
+class EventFeed:
+    """
+    Buffer circular de los últimos `capacity` eventos. Los IDs arrancan en
+    el epoch en milisegundos del inicio del proceso que los asigna, así
+    siguen creciendo después de un reinicio y un cliente con un ID viejo
+    recibe `missed`.
+    """
+
+    def __init__(self, capacity: int = 1000, coalesce_ms: float = 50, max_batch: int = 200,
+                 max_lag: int = 0):
+        self.capacity = capacity
+        self.coalesce = coalesce_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_lag = max_lag  # por defecto para los suscriptores (0 = el buffer completo)
+        self._events: Deque[FeedEvent] = deque(maxlen=capacity)
+        self._ids = itertools.count(int(time.time() * 1000))
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscriber] = set()
+        self.published = 0
+        # Cámara -> feed (`ts_camara` del evento) y feed -> enviado al cliente
+        self.ingest_latency = LatencyStats()
+        self.delivery_latency = LatencyStats()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def publish(self, data: dict, event_id: Optional[int] = None) -> Optional[int]:
+        """
+        Agrega un evento y despierta a los suscriptores. Seguro desde cualquier hilo.
+        `event_id` viene del proceso de cámara (pub/sub) para que todos los
+        workers de la API usen los mismos IDs; un ID repetido o viejo se ignora.
+        """
+        ts = time.time()
+        with self._lock:
+            if event_id is None:
+                event_id = next(self._ids)
+            elif event_id <= self._last_id:
+                return None
+            event = FeedEvent(event_id, ts, data)
+            self._events.append(event)
+            self._last_id = event.id
+            self.published += 1
+            subscribers = list(self._subscribers)
+        if data.get("ts_camara"):
+            self.ingest_latency.add((ts - data["ts_camara"]) * 1000)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.waiter.set)
+            except RuntimeError:
+                pass  # el loop del suscriptor ya cerró
+        return event.id
+
+    def since(self, last_id: Optional[int], max_lag: int = 0) -> FeedBatch:
+        """
+        Eventos con ID > `last_id` (a lo sumo `max_batch`). Con `max_lag`,
+        si hay más pendientes se saltean los más viejos.
+        """
+        with self._lock:
+            if not self._events:
+                return FeedBatch([])
+            first_id = self._events[0].id
+            if last_id is None:
+                last_id = self._last_id
+            if self._last_id - first_id == len(self._events) - 1:
+                # IDs consecutivos: el offset es directo
+                start = max(0, last_id - first_id + 1)
+            else:
+                # Hubo saltos (reinicio del proceso de cámara): buscar desde el final
+                start = len(self._events)
+                while start > 0 and self._events[start - 1].id > last_id:
+                    start -= 1
+            dropped = 0
+            if max_lag and len(self._events) - start > max_lag:
+                dropped = len(self._events) - start - max_lag
+                start += dropped
+            events = list(itertools.islice(self._events, start, start + self.max_batch))
+        # last_id = 0 pide todo el buffer: no es una reanudación
+        return FeedBatch(events, missed=0 < last_id < first_id - 1, first_id=first_id, dropped=dropped)
+
+    async def subscribe(self, last_id: Optional[int] = None, heartbeat: float = 15.0,
+                        policy: str = "drop_oldest", max_lag: Optional[int] = None) -> AsyncIterator[FeedBatch]:
+        """
+        Lotes desde `last_id` (None = solo eventos nuevos). Si no hay eventos
+        en `heartbeat` segundos se entrega un lote vacío para mantener viva la
+        conexión. Tras un evento espera `coalesce_ms` para agrupar ráfagas.
+        `policy` y `max_lag` definen qué se descarta si el cliente se atrasa.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Política inválida: {policy} (opciones: {', '.join(POLICIES)})")
+        if max_lag is not None and max_lag < 0:
+            raise ValueError("max_lag no puede ser negativo")
+        sub = Subscriber(asyncio.get_running_loop(), policy, self.max_lag if max_lag is None else max_lag)
+        with self._lock:
+            self._subscribers.add(sub)
+            if last_id is None or last_id > self._last_id:
+                last_id = self._last_id
+        try:
+            while True:
+                batch = self.since(last_id, sub.max_lag)
+                if batch.events or batch.missed:
+                    last_id = batch.last_id or self._last_id
+                    batch = sub.shape(batch)
+                    yield batch
+                    # El consumidor pide el siguiente lote después de enviar este
+                    if batch.events:
+                        self.delivery_latency.add((time.time() - batch.events[-1].ts) * 1000)
+                    continue
+                sub.waiter.clear()
+                if self._last_id > last_id:
+                    continue  # publicado entre `since` y `clear`
+                try:
+                    await asyncio.wait_for(sub.waiter.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield FeedBatch([])
+                    continue
+                if self.coalesce:
+                    await asyncio.sleep(self.coalesce)
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "ultimo_id": self._last_id or None,
+                "primer_id": self._events[0].id if self._events else None,
+                "en_buffer": len(self._events),
+                "publicados": self.published,
+                "suscriptores": len(self._subscribers),
+            }
+
+    def metrics(self) -> dict:
+        with self._lock:
+            subscribers = [sub.status() for sub in self._subscribers]
+        return {
+            **self.status(),
+            "latencia_ingreso": self.ingest_latency.summary(),
+            "latencia_entrega": self.delivery_latency.summary(),
+            "por_suscriptor": subscribers,
+        }
+
+
+# Feed global de detecciones
+event_feed = EventFeed(
+    capacity=int(os.getenv("EVENT_FEED_CAPACITY", "1000")),
+    coalesce_ms=float(os.getenv("EVENT_FEED_COALESCE_MS", "50")),
+    max_lag=int(os.getenv("EVENT_FEED_MAX_LAG", "0")),
+)
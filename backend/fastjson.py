@@ -0,0 +1,62 @@
+"""
+Serialización JSON rápida para las respuestas de la API.
+
+Usa `orjson` si está instalado (serializa dataclasses, datetime y UUID en C,
+sin dicts intermedios) y si no cae a `json` de la librería estándar con el
+mismo resultado. `FastJSONResponse` se devuelve desde los endpoints que
+arman sus filas con `rows.py` y no necesitan validación de Pydantic.
+"""
+import dataclasses
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+
+def _default(obj: Any):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada con `dumps` (orjson si está disponible)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -6,13 +6,22 @@ from routers.general import router as general_router
 from routers.cocheras import router as cocheras_router
 from routers.auth import router as auth_router
 from routers.auto_access import router as auto_access_router
+from routers.analytics import router as analytics_router
+from routers.admin import router as admin_router
+from app_state import state
+from db import DB_SCHEMA, validar_catalogo
+from fastjson import FastJSONResponse
 
-app = FastAPI()
+# Todas las respuestas JSON se serializan con orjson (si está instalado)
+app = FastAPI(default_response_class=FastJSONResponse)
+app.state.smartgate = state
 
 app.include_router(general_router)
 app.include_router(cocheras_router)
 app.include_router(auth_router)
 app.include_router(auto_access_router)
+app.include_router(analytics_router)
+app.include_router(admin_router)
 
 # Configurar CORS para producción
 # En desarrollo permite localhost, en producción permite el dominio de Netlify
@@ -35,4 +44,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+)
+
+
+@app.on_event("startup")
+def startup_event():
+    """Valida el SQL precalculado contra la base y arranca lo que corresponde
+    al rol del proceso (SMARTGATE_ROLE)"""
+    if os.getenv("DB_VALIDATE_ON_STARTUP", "1").lower() in ("1", "true", "yes", "on"):
+        try:
+            errores = validar_catalogo()
+        except Exception as e:
+            print(f"⚠️ No se pudo validar el catálogo de la base: {e}")
+        else:
+            for error in errores:
+                print(f"❌ Catálogo ({DB_SCHEMA}): {error}")
+            if not errores:
+                print(f"✅ Consultas validadas contra el schema '{DB_SCHEMA}'")
+    state.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    state.stop()
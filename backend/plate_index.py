@@ -0,0 +1,275 @@
+"""
+Índice en memoria para búsqueda aproximada de matrículas.
+
+Cuando el OCR erra un carácter la búsqueda exacta por `matricula_norm`
+falla. Este índice encuentra las patentes registradas a distancia de
+edición 1-2, ponderando las confusiones típicas del OCR (O/0, I/1, B/8...),
+sin recorrer la tabla:
+
+- Vecindario de borrados (distancia 1): cada patente se indexa junto con
+  todas sus variantes con un carácter borrado. Una consulta genera sus
+  propios borrados y cruza las claves; cubre una sustitución, inserción
+  o borrado con ~8 lookups de diccionario.
+- Segmentos (distancia 2, mismo largo): una patente Mercosur se parte en
+  AA / NNN / AA. Con dos sustituciones al menos un segmento coincide
+  exacto, así que solo se verifican las patentes que comparten segmento.
+
+Los candidatos se verifican con Levenshtein ponderado y se devuelven
+ordenados por puntaje (1.0 = idéntica). `best_match` acepta por su cuenta
+solo una patente que difiere de la lectura en confusiones de OCR: con una
+sustitución cualquiera puede ser otro auto, y esos candidatos quedan para
+que los confirme el guardia.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import queries
+from db import pooled_connection
+from plates import normalize_plate
+
+# Pares que el OCR confunde habitualmente (simétricos)
+OCR_CONFUSIONS = [
+    ("O", "0"), ("D", "0"), ("Q", "0"), ("U", "0"),
+    ("I", "1"), ("L", "1"), ("T", "1"),
+    ("Z", "2"), ("J", "3"), ("A", "4"), ("S", "5"),
+    ("G", "6"), ("B", "8"), ("B", "3"),
+    ("M", "N"), ("V", "Y"), ("C", "G"), ("P", "R"), ("K", "X"),
+]
+
+# Costos en medias unidades para trabajar con enteros:
+# sustitución confundible = 1, cualquier otra edición = 2
+_COST_CONFUSABLE = 1
+_COST_EDIT = 2
+
+_CONFUSABLE: Set[Tuple[str, str]] = set()
+for _a, _b in OCR_CONFUSIONS:
+    _CONFUSABLE.add((_a, _b))
+    _CONFUSABLE.add((_b, _a))
+
+# Segmentos AA / NNN / AA para patentes de 7 caracteres; para otros largos
+# se parte en tres tramos parecidos
+_SEGMENTS_7 = ((0, 2), (2, 5), (5, 7))
+
+
+def _segments(length: int) -> Tuple[Tuple[int, int], ...]:
+    if length == 7:
+        return _SEGMENTS_7
+    a = length // 3
+    b = length - a
+    return ((0, a), (a, b), (b, length))
+
+
+def _deletes(text: str) -> Set[str]:
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+def _sub_cost(a: str, b: str) -> int:
+    if a == b:
+        return 0
+    return _COST_CONFUSABLE if (a, b) in _CONFUSABLE else _COST_EDIT
+
+
+def weighted_distance(a: str, b: str, max_cost: Optional[int] = None) -> int:
+    """Levenshtein con costo reducido para confusiones de OCR (medias unidades).
+    Si se pasa `max_cost`, corta apenas se supera y devuelve max_cost + 1."""
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if max_cost is not None and abs(la - lb) * _COST_EDIT > max_cost:
+        return max_cost + 1
+    prev = list(range(0, (lb + 1) * _COST_EDIT, _COST_EDIT))
+    for i in range(1, la + 1):
+        ca = a[i - 1]
+        cur = [i * _COST_EDIT] + [0] * lb
+        row_min = cur[0]
+        for j in range(1, lb + 1):
+            cost = min(
+                prev[j] + _COST_EDIT,
+                cur[j - 1] + _COST_EDIT,
+                prev[j - 1] + _sub_cost(ca, b[j - 1]),
+            )
+            cur[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if max_cost is not None and row_min > max_cost:
+            return max_cost + 1
+        prev = cur
+    return prev[lb]
+
+
+def only_ocr_confusions(a: str, b: str) -> bool:
+    """True si `a` y `b` tienen el mismo largo y cada diferencia es un par
+    que el OCR confunde (O/0, I/1, B/8...)."""
+    return len(a) == len(b) and all(ca == cb or (ca, cb) in _CONFUSABLE for ca, cb in zip(a, b))
+
+
+def _substitution_cost(a: str, b: str, max_cost: int) -> int:
+    """Costo con solo sustituciones (mismo largo), con corte temprano."""
+    cost = 0
+    for ca, cb in zip(a, b):
+        if ca != cb:
+            cost += _COST_CONFUSABLE if (ca, cb) in _CONFUSABLE else _COST_EDIT
+            if cost > max_cost:
+                return max_cost + 1
+    return cost
+
+
+class PlateIndex:
+    """Índice de matrículas normalizadas para búsqueda aproximada."""
+
+    def __init__(self, max_edits: int = 2):
+        self.max_edits = max_edits
+        self._plates: Set[str] = set()
+        self._deletes: Dict[str, Set[str]] = {}
+        self._segments: Dict[Tuple[int, int, str], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self):
+        return len(self._plates)
+
+    def __contains__(self, plate: str):
+        return normalize_plate(plate) in self._plates
+
+    # --- Mantenimiento ---------------------------------------------------
+    def load(self, plates: Iterable[str]):
+        """Reconstruye el índice completo y lo reemplaza de forma atómica."""
+        new = PlateIndex(self.max_edits)
+        for p in plates:
+            new._add(normalize_plate(p))
+        with self._lock:
+            self._plates = new._plates
+            self._deletes = new._deletes
+            self._segments = new._segments
+            self.loaded_at = time.time()
+
+    def add(self, plate: str):
+        with self._lock:
+            self._add(normalize_plate(plate))
+
+    def remove(self, plate: str):
+        plate = normalize_plate(plate)
+        with self._lock:
+            if plate not in self._plates:
+                return
+            self._plates.discard(plate)
+            for key in _deletes(plate) | {plate}:
+                bucket = self._deletes.get(key)
+                if bucket is not None:
+                    bucket.discard(plate)
+                    if not bucket:
+                        del self._deletes[key]
+            for i, (s, e) in enumerate(_segments(len(plate))):
+                key = (len(plate), i, plate[s:e])
+                bucket = self._segments.get(key)
+                if bucket is not None:
+                    bucket.discard(plate)
+                    if not bucket:
+                        del self._segments[key]
+
+    def _add(self, plate: str):
+        if not plate or plate in self._plates:
+            return
+        self._plates.add(plate)
+        for key in _deletes(plate) | {plate}:
+            self._deletes.setdefault(key, set()).add(plate)
+        if self.max_edits >= 2:
+            for i, (s, e) in enumerate(_segments(len(plate))):
+                self._segments.setdefault((len(plate), i, plate[s:e]), set()).add(plate)
+
+    # --- Consulta --------------------------------------------------------
+    def candidates(self, text: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Devuelve [(matricula_norm, puntaje)] ordenado de mejor a peor.
+        Una coincidencia exacta devuelve [(matricula, 1.0)]."""
+        query = normalize_plate(text)
+        if not query:
+            return []
+        max_cost = self.max_edits * _COST_EDIT
+        # `add`/`remove` modifican los conjuntos en su lugar: se copian bajo
+        # el lock y el puntaje se calcula afuera
+        found: Set[str] = set()
+        with self._lock:
+            if query in self._plates:
+                return [(query, 1.0)]
+            for key in _deletes(query) | {query}:
+                bucket = self._deletes.get(key)
+                if bucket:
+                    found |= bucket
+        scored = self._score(query, found, max_cost, weighted_distance)
+
+        # Solo si no hubo nada a distancia ~1 se buscan dos sustituciones
+        if not scored and self.max_edits >= 2:
+            found = set()
+            with self._lock:
+                for i, (s, e) in enumerate(_segments(len(query))):
+                    bucket = self._segments.get((len(query), i, query[s:e]))
+                    if bucket:
+                        found |= bucket
+            scored = self._score(query, found, max_cost, _substitution_cost)
+
+        scored.sort(key=lambda c: (-c[1], c[0]))
+        return scored[:limit]
+
+    @staticmethod
+    def _score(query: str, plates: Iterable[str], max_cost: int, distance) -> List[Tuple[str, float]]:
+        out = []
+        for plate in plates:
+            cost = distance(query, plate, max_cost)
+            if cost <= max_cost:
+                scale = 2.0 * max(len(query), len(plate))
+                out.append((plate, round(1.0 - cost / scale, 4)))
+        return out
+
+    def best_match(self, text: str, min_score: float = 0.85) -> Optional[Tuple[str, float]]:
+        """Mejor candidato si supera `min_score`, no hay empate con otro y
+        solo difiere de la lectura en confusiones de OCR. Con cualquier otra
+        edición retorna None: ver `candidates` para pedir confirmación."""
+        cands = self.candidates(text, limit=2)
+        if not cands or cands[0][1] < min_score:
+            return None
+        if len(cands) > 1 and cands[1][1] == cands[0][1]:
+            return None
+        if not only_ocr_confusions(normalize_plate(text), cands[0][0]):
+            return None
+        return cands[0]
+
+
+# ================== ÍNDICE GLOBAL SINCRONIZADO CON LA TABLA ==================
+
+PLATE_INDEX_TTL = float(os.getenv("PLATE_INDEX_TTL", "60"))
+PLATE_FUZZY_MAX_EDITS = int(os.getenv("PLATE_FUZZY_MAX_EDITS", "2"))
+PLATE_FUZZY_MIN_SCORE = float(os.getenv("PLATE_FUZZY_MIN_SCORE", "0.85"))
+
+plate_index = PlateIndex(max_edits=PLATE_FUZZY_MAX_EDITS)
+_refresh_lock = threading.Lock()
+
+
+def _load_plates_from_db() -> List[str]:
+    with pooled_connection() as conn, conn.cursor() as cursor:
+        rows = queries.fetchall(cursor, "vehiculos_matriculas")
+    return [r[0] for r in rows if r[0]]
+
+
+def get_plate_index(loader: Callable[[], Iterable[str]] = _load_plates_from_db) -> PlateIndex:
+    """Devuelve el índice global, recargándolo desde `vehiculos` si venció el TTL.
+    Si la recarga falla se sigue usando la última versión cargada."""
+    idx = plate_index
+    if idx.loaded_at is not None and time.time() - idx.loaded_at < PLATE_INDEX_TTL:
+        return idx
+    if not _refresh_lock.acquire(blocking=idx.loaded_at is None):
+        return idx  # otro hilo ya está recargando
+    try:
+        if idx.loaded_at is None or time.time() - idx.loaded_at >= PLATE_INDEX_TTL:
+            idx.load(loader())
+    except Exception as e:
+        print(f"⚠️ No se pudo recargar el índice de matrículas: {e}")
+    finally:
+        _refresh_lock.release()
+    return idx
+
+
+def invalidate_plate_index():
+    """Fuerza la recarga en la próxima consulta (p.ej. tras alta/baja de vehículos)."""
+    plate_index.loaded_at = None
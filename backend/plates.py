@@ -0,0 +1,25 @@
+"""
+Normalización canónica de matrículas.
+
+Toda matrícula que llega al sistema (API, detector, scripts) pasa por
+`normalize_plate` antes de consultar `vehiculos`. La misma transformación
+está materializada en la columna `vehiculos.matricula_norm` (ver
+sql/04_matricula_normalizada.sql), por lo que las búsquedas siempre usan
+el índice, sin importar cómo se haya cargado la patente ('AB 123 CD',
+'ab-123-cd', 'AB123CD').
+"""
+import re
+
+# Columna generada e indexada en `vehiculos`
+PLATE_NORM_COLUMN = "matricula_norm"
+
+# Debe coincidir con la expresión SQL de la columna generada:
+#   upper(regexp_replace(matricula, '[^A-Za-z0-9]', '', 'g'))
+_NON_ALNUM = re.compile(r"[^A-Za-z0-9]")
+
+
+def normalize_plate(text: str) -> str:
+    """Quita espacios/guiones/símbolos y pasa a mayúsculas: 'ab 123-cd' -> 'AB123CD'."""
+    if not text:
+        return ""
+    return _NON_ALNUM.sub("", text).upper()
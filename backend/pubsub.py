@@ -0,0 +1,218 @@
+"""
+Pub/sub local entre el proceso de cámara y los workers de la API.
+
+- `InProcessPubSub`: callbacks en el mismo proceso (rol `all` y pruebas).
+- `RedisPubSub`: Redis o compatible (`PUBSUB_URL=redis://...`, requiere el
+  paquete opcional `redis`).
+- `PostgresPubSub`: `LISTEN/NOTIFY` sobre la base existente
+  (`PUBSUB_URL=postgres`), sin infraestructura extra.
+
+Los mensajes son strings (JSON); los callbacks corren en un hilo del
+suscriptor y no deben bloquear.
+"""
+import os
+import select
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List
+
+import psycopg2
+
+from fastjson import dumps_str, loads
+
+# Canales (identificadores válidos también para LISTEN/NOTIFY)
+CANAL_DETECCIONES = "smartgate_detecciones"
+CANAL_ESTADO = "smartgate_estado"
+# La API avisa al proceso de cámara que descarte cachés (importación masiva)
+CANAL_INVALIDAR = "smartgate_invalidar"
+
+# NOTIFY acepta payloads de hasta 8000 bytes
+PG_MAX_PAYLOAD = 7999
+
+Callback = Callable[[str], None]
+
+
+class PubSub(ABC):
+    name = "base"
+
+    def __init__(self):
+        self._callbacks: Dict[str, List[Callback]] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def publish(self, channel: str, message: str):
+        """Envía `message` a los suscriptores de `channel`."""
+
+    def subscribe(self, channel: str, callback: Callback):
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+
+    def _dispatch(self, channel: str, message: str):
+        for callback in self._callbacks.get(channel, ()):
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"❌ Error en suscriptor de {channel}: {e}")
+
+    def close(self):
+        pass
+
+
+class InProcessPubSub(PubSub):
+    name = "memoria"
+
+    def publish(self, channel: str, message: str):
+        self._dispatch(channel, message)
+
+
+class RedisPubSub(PubSub):
+    name = "redis"
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PUBSUB_URL=redis://... requiere `pip install redis`")
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._running = False
+
+    def publish(self, channel: str, message: str):
+        self._client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callback):
+        super().subscribe(channel, callback)
+        if self._pubsub is None:
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(channel)
+        if not self._running:
+            self._running = True
+            threading.Thread(target=self._listen, name="pubsub-redis", daemon=True).start()
+
+    def _listen(self):
+        while self._running:
+            try:
+                msg = self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                print(f"⚠️ Pub/sub Redis desconectado: {e}")
+                time.sleep(1)
+                continue
+            if msg and msg.get("type") == "message":
+                channel = msg["channel"].decode() if isinstance(msg["channel"], bytes) else msg["channel"]
+                data = msg["data"].decode() if isinstance(msg["data"], bytes) else msg["data"]
+                self._dispatch(channel, data)
+
+    def close(self):
+        self._running = False
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+
+class PostgresPubSub(PubSub):
+    """
+    LISTEN/NOTIFY con conexiones dedicadas en autocommit: una para publicar
+    (protegida por lock) y otra para escuchar, que se reconecta con espera
+    exponencial si la base se cae.
+    """
+
+    name = "postgres"
+
+    def __init__(self, connect: Callable[[], "psycopg2.extensions.connection"]):
+        super().__init__()
+        self._connect = connect
+        self._pub_conn = None
+        self._pub_lock = threading.Lock()
+        self._channels: List[str] = []
+        self._running = False
+
+    def _new_conn(self):
+        conn = self._connect()
+        conn.autocommit = True
+        return conn
+
+    def publish(self, channel: str, message: str):
+        if len(message.encode()) > PG_MAX_PAYLOAD:
+            raise ValueError(f"Mensaje demasiado grande para NOTIFY ({len(message)} bytes)")
+        with self._pub_lock:
+            for intento in (1, 2):
+                try:
+                    if self._pub_conn is None or self._pub_conn.closed:
+                        self._pub_conn = self._new_conn()
+                    with self._pub_conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (channel, message))
+                    return
+                except psycopg2.OperationalError:
+                    # Conexión caída: reintentar una vez con una nueva
+                    self._pub_conn = None
+                    if intento == 2:
+                        raise
+
+    def subscribe(self, channel: str, callback: Callback):
+        super().subscribe(channel, callback)
+        if channel not in self._channels:
+            self._channels.append(channel)
+        if not self._running:
+            self._running = True
+            threading.Thread(target=self._listen, name="pubsub-postgres", daemon=True).start()
+
+    def _listen(self):
+        conn, backoff = None, 0.5
+        while self._running:
+            try:
+                if conn is None:
+                    conn = self._new_conn()
+                    with conn.cursor() as cursor:
+                        for channel in list(self._channels):
+                            cursor.execute(f'LISTEN "{channel}"')
+                    backoff = 0.5
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    n = conn.notifies.pop(0)
+                    self._dispatch(n.channel, n.payload)
+            except Exception as e:
+                print(f"⚠️ LISTEN de Postgres caído, reintento en {backoff:.1f}s: {e}")
+                try:
+                    if conn is not None:
+                        conn.close()
+                except Exception:
+                    pass
+                conn = None
+                time.sleep(backoff)
+                backoff = min(30.0, backoff * 2)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        self._running = False
+        with self._pub_lock:
+            if self._pub_conn is not None:
+                self._pub_conn.close()
+                self._pub_conn = None
+
+
+def create_pubsub(url: str = None) -> PubSub:
+    """Pub/sub según PUBSUB_URL: vacío/`memory`, `redis://...` o `postgres`."""
+    url = (url if url is not None else os.getenv("PUBSUB_URL", "")).strip()
+    if not url or url == "memory":
+        return InProcessPubSub()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisPubSub(url)
+    if url in ("postgres", "postgresql", "pg") or url.startswith(("postgres://", "postgresql://")):
+        if "://" in url:
+            return PostgresPubSub(lambda: psycopg2.connect(url))
+        from db import get_connection
+        return PostgresPubSub(get_connection)
+    raise ValueError(f"PUBSUB_URL no soportado: {url}")
+
+
+def encode_message(event_id: int, data: dict) -> str:
+    return dumps_str({"id": event_id, "data": data})
+
+
+def decode_message(message: str):
+    obj = loads(message)
+    return obj["id"], obj["data"]
@@ -0,0 +1,192 @@
+"""
+Registro de las consultas calientes (camino de la barrera y autenticación).
+El SQL se arma una sola vez al importar, con el schema configurado
+(`db_helpers.table_name`), y se valida contra el catálogo al arrancar
+(`db.validar_catalogo`).
+
+Cada sentencia se define una sola vez y se prepara (`PREPARE`) la primera
+vez que se usa en cada conexión del pool; después se ejecuta por nombre
+(`EXECUTE`), sin que Postgres vuelva a parsear ni planificar. Los tipos de
+los parámetros los infiere Postgres del contexto.
+
+Detrás de un pooler en modo transacción (PgBouncer, hosts `-pooler` de
+Neon) las sentencias preparadas no sobreviven entre transacciones: ahí la
+conexión no las registra y se ejecuta el SQL común (ver
+`db.PREPARED_STATEMENTS`).
+"""
+import re
+from typing import Dict, Optional, Sequence
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from db_helpers import table_name
+from plates import PLATE_NORM_COLUMN
+from rows import Tarifa, Usuario, UsuarioLogin, columnas
+
+_PLACEHOLDER = re.compile(r"%s|%%")
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Conexión que recuerda qué sentencias del registro ya preparó."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.configured = False
+
+
+class Statement:
+    """Sentencia con parámetros `%s` (formato psycopg2) y su versión preparada."""
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        counter = iter(range(1, sql.count("%s") + 1))
+        body = _PLACEHOLDER.sub(lambda m: f"${next(counter)}" if m.group() == "%s" else "%", sql)
+        self.prepare_sql = f"PREPARE {name} AS {body}"
+        n = sql.count("%s")
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * n)})" if n else f"EXECUTE {name}"
+
+
+REGISTRY: Dict[str, Statement] = {}
+executions = {"preparadas": 0, "ejecutadas": 0, "sin_preparar": 0}
+
+
+def register(name: str, sql: str) -> Statement:
+    if name in REGISTRY:
+        raise ValueError(f"Sentencia duplicada en el registro: {name}")
+    statement = Statement(name, sql)
+    REGISTRY[name] = statement
+    return statement
+
+
+def execute(cursor, name: str, params: Sequence = ()):
+    """
+    Ejecuta la sentencia `name` en `cursor`: preparada si la conexión lo
+    admite (`PreparedConnection` del pool), SQL común si no.
+    """
+    statement = REGISTRY[name]
+    conn = cursor.connection
+    prepared: Optional[set] = getattr(conn, "prepared", None)
+    if prepared is None:
+        executions["sin_preparar"] += 1
+        cursor.execute(statement.sql, params)
+        return cursor
+    # Dentro de una transacción con sentencias previas (p.ej. escrituras) el
+    # reintento vuelve a un savepoint; si la sentencia es la primera, basta
+    # con descartar la transacción
+    en_curso = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    # Cursor aparte: el RELEASE no debe pisar el resultado de `cursor`
+    control = conn.cursor() if en_curso else None
+    try:
+        for intento in (1, 2):
+            if en_curso:
+                control.execute("SAVEPOINT queries_reintento")
+            try:
+                if name not in prepared:
+                    cursor.execute(statement.prepare_sql)
+                    prepared.add(name)
+                    executions["preparadas"] += 1
+                cursor.execute(statement.execute_sql, params)
+                executions["ejecutadas"] += 1
+                if en_curso:
+                    control.execute("RELEASE SAVEPOINT queries_reintento")
+                return cursor
+            except (psycopg2.errors.InvalidSqlStatementName,
+                    psycopg2.errors.DuplicatePreparedStatement,
+                    psycopg2.errors.FeatureNotSupported):
+                # La sesión perdió la sentencia, ya la tenía, o cambió el esquema
+                # ("cached plan must not change result type"): volver a prepararla
+                if en_curso:
+                    control.execute("ROLLBACK TO SAVEPOINT queries_reintento")
+                else:
+                    conn.rollback()
+                if intento == 2:
+                    raise
+                cursor.execute("DEALLOCATE ALL")
+                prepared.clear()
+    finally:
+        if control is not None:
+            control.close()
+
+
+def fetchone(cursor, name: str, params: Sequence = ()):
+    return execute(cursor, name, params).fetchone()
+
+
+def fetchall(cursor, name: str, params: Sequence = ()):
+    return execute(cursor, name, params).fetchall()
+
+
+def validate(cursor) -> list:
+    """
+    Prepara y descarta cada sentencia con un nombre de prueba: Postgres
+    resuelve tablas, columnas y tipos sin ejecutarla. Retorna los errores.
+    """
+    errores = []
+    for name, statement in REGISTRY.items():
+        cursor.execute("SAVEPOINT validar")
+        try:
+            cursor.execute(statement.prepare_sql.replace(f"PREPARE {name} ", f"PREPARE validar_{name} ", 1))
+            cursor.execute(f"DEALLOCATE validar_{name}")
+            cursor.execute("RELEASE SAVEPOINT validar")
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT validar")
+            errores.append(f"Sentencia '{name}': {str(e).strip()}")
+    return errores
+
+
+def status() -> dict:
+    return {"sentencias": sorted(REGISTRY), **executions}
+
+
+# --- Sentencias ---------------------------------------------------------------
+
+def select_decision(where: str, extra_columns: str = "") -> str:
+    # Vehículo + último pago + tarifa del departamento: todo lo que hace falta
+    # para decidir el acceso (ver `db.decision_acceso`)
+    return f"""
+        SELECT v.{PLATE_NORM_COLUMN} AS matricula_norm, v.matricula, v.estado, v.activo,
+               v.id_departamento, p.fecha_pago, t.descripcion AS tarifa{extra_columns}
+        FROM {table_name('vehiculos')} v
+        LEFT JOIN LATERAL (
+            SELECT fecha_pago FROM {table_name('pagos')}
+            WHERE id_departamento = v.id_departamento
+            ORDER BY fecha_pago DESC LIMIT 1
+        ) p ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT id_tarifa FROM {table_name('inquilinos')}
+            WHERE id_departamento = v.id_departamento
+            LIMIT 1
+        ) i ON TRUE
+        LEFT JOIN {table_name('tarifas')} t ON t.id_tarifa = i.id_tarifa
+        WHERE {where}
+    """
+
+
+# Vehículo + contacto del propietario (cámara) -> rows.Vehiculo
+register("vehiculo_por_matricula", f"""
+    SELECT v.matricula, v.{PLATE_NORM_COLUMN}, v.estado, v.activo, v.id_departamento,
+           p.nombre, p.telefono, p.email
+    FROM {table_name('vehiculos')} v
+    LEFT JOIN {table_name('propietarios')} p ON p.id_propietario = v.id_propietario
+    WHERE v.{PLATE_NORM_COLUMN} = %s LIMIT 1
+""")
+# Departamento del vehículo (cocheras)
+register("vehiculo_departamento",
+         f"SELECT id_departamento FROM {table_name('vehiculos')} WHERE {PLATE_NORM_COLUMN} = %s")
+# Decisión de acceso (`db.decision_acceso`) por lote (`= ANY(text[])`)
+register("vehiculos_decision_lote", select_decision(f"v.{PLATE_NORM_COLUMN} = ANY(%s)"))
+# Tarifas vigentes -> rows.Tarifa
+register("tarifas", f"SELECT {columnas(Tarifa)} FROM {table_name('tarifas')} ORDER BY id_tarifa")
+# Usuario con hash para login -> rows.UsuarioLogin
+register("usuario_login", f"SELECT {columnas(UsuarioLogin)} FROM {table_name('usuarios')} WHERE username = %s")
+# Patentes normalizadas para el índice aproximado (plate_index)
+register("vehiculos_matriculas", f"SELECT {PLATE_NORM_COLUMN} FROM {table_name('vehiculos')}")
+# Cochera vencida: el vehículo pasa a denegado
+register("vehiculo_denegar",
+         f"UPDATE {table_name('vehiculos')} SET estado = 1 WHERE {PLATE_NORM_COLUMN} = %s")
+# Usuario sin contraseña (cada request autenticado) -> rows.Usuario
+register("usuario_por_username", f"SELECT {columnas(Usuario)} FROM {table_name('usuarios')} WHERE username = %s")
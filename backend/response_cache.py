@@ -0,0 +1,89 @@
+"""
+Caché de respuestas para endpoints de solo lectura (tarifas y similares).
+
+Guarda el JSON ya serializado (y su versión gzip) con un ETag. Las lecturas
+repetidas no tocan la base de datos y, si el cliente manda
+`If-None-Match`, se responde 304 sin cuerpo.
+"""
+import gzip
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+from fastjson import dumps
+
+# Por debajo de este tamaño no vale la pena comprimir
+GZIP_MIN_BYTES = 512
+
+
+class CachedResponse:
+    __slots__ = ("body", "gzip_body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+
+class ResponseCache:
+    def __init__(self):
+        self._entries: Dict[str, CachedResponse] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: float) -> CachedResponse:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            return entry
+        with self._lock:
+            # Otro request pudo haberla cargado mientras esperábamos
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                return entry
+            data = loader()  # si falla, no se cachea nada
+            body = dumps(data)  # orjson si está instalado; dataclasses de rows.py sin dicts
+            entry = CachedResponse(body, ttl)
+            self._entries[key] = entry
+            return entry
+
+    def invalidate(self, key: Optional[str] = None):
+        """Invalida una clave o, sin argumentos, toda la caché."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+response_cache = ResponseCache()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return etag in tags or ("W/" + etag) in tags
+
+
+def cached_json_response(request: Request, key: str, loader: Callable[[], Any], ttl: float) -> Response:
+    """
+    Respuesta JSON servida desde la caché:
+    - 304 si `If-None-Match` coincide con el ETag actual
+    - cuerpo gzip si el cliente lo acepta
+    El cliente siempre revalida (`no-cache`), lo que cuesta solo el 304.
+    """
+    entry = response_cache.get_or_load(key, loader, ttl)
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if _etag_matches(request.headers.get("if-none-match", ""), entry.etag):
+        return Response(status_code=304, headers=headers)
+
+    if entry.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=entry.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
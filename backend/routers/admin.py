@@ -0,0 +1,78 @@
+import os
+from datetime import date
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+
+import bulk_data
+from app_state import state
+from routers.auth import get_current_admin
+from rows import Usuario
+
+router = APIRouter(prefix="/admin", tags=["Administración"])
+
+_MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def _formato(archivo: UploadFile, formato: str = None) -> str:
+    """El indicado, o el de la extensión del archivo (CSV por defecto)."""
+    if formato:
+        return formato.lower()
+    extension = os.path.splitext(archivo.filename or "")[1].lower()
+    return "parquet" if extension in (".parquet", ".pq") else "csv"
+
+
+@router.post("/importar/{tabla}")
+def importar(
+    tabla: str,
+    current_admin: Annotated[Usuario, Depends(get_current_admin)],
+    archivo: UploadFile = File(..., description="CSV (coma o punto y coma) o Parquet"),
+    formato: str = Query(None, description="csv o parquet (por defecto, según la extensión)"),
+    simular: bool = Query(False, description="Valida y cuenta los cambios sin aplicarlos"),
+    parcial: bool = Query(False, description="Aplica las filas válidas aunque otras tengan errores"),
+):
+    """
+    Alta/actualización masiva de propietarios, vehiculos, pagos o usuarios.
+    Con errores (y sin `parcial`) no se aplica nada; la respuesta lista las
+    filas rechazadas.
+    """
+    try:
+        resultado = bulk_data.importar(tabla, archivo.file, _formato(archivo, formato),
+                                       simular=simular, parcial=parcial)
+    except (ValueError, RuntimeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if resultado["aplicado"]:
+        # Índice de patentes y decisiones de la cámara (también en otro proceso)
+        state.invalidate_caches(tabla)
+    return resultado
+
+
+@router.get("/exportar/{tabla}")
+def exportar(
+    tabla: str,
+    current_admin: Annotated[Usuario, Depends(get_current_admin)],
+    formato: str = Query("csv", description="csv o parquet"),
+):
+    """Descarga la tabla con las mismas columnas que acepta la importación."""
+    formato = formato.lower()
+    try:
+        salida = bulk_data.exportar(tabla, formato)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def contenido():
+        with salida:
+            while chunk := salida.read(1 << 16):
+                yield chunk
+
+    nombre = f"{tabla}-{date.today()}.{formato}"
+    return StreamingResponse(
+        contenido(),
+        media_type=_MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
@@ -0,0 +1,99 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional, Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from access_log import (
+    accesos_por_hora,
+    denegaciones_por_motivo,
+    recalcular_rollups,
+    resumen_dia,
+    top_matriculas,
+)
+from response_cache import cached_json_response
+from routers.auth import get_current_admin
+from rows import Usuario
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+# Segundos que se reutiliza el resumen del dashboard
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "15"))
+# Rango máximo consultable de una vez
+MAX_DIAS = 366
+
+
+def _rango_dias(desde: Optional[date], hasta: Optional[date], default_dias: int):
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=default_dias - 1)
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="'desde' no puede ser posterior a 'hasta'")
+    if (hasta - desde).days >= MAX_DIAS:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {MAX_DIAS} días")
+    return desde, hasta
+
+
+@router.get("/resumen")
+def resumen(request: Request):
+    """Totales de hoy y de ayer (para las tarjetas del dashboard)."""
+    def cargar():
+        hoy = date.today()
+        return {"hoy": resumen_dia(hoy), "ayer": resumen_dia(hoy - timedelta(days=1))}
+    try:
+        return cached_json_response(request, f"analytics:resumen:{date.today()}", cargar, ANALYTICS_CACHE_TTL)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/accesos-por-hora")
+def get_accesos_por_hora(
+    desde: Optional[datetime] = Query(None, description="Inicio (por defecto, hace 24 h)"),
+    hasta: Optional[datetime] = Query(None, description="Fin (por defecto, ahora)"),
+):
+    hasta = hasta or datetime.now()
+    desde = desde or hasta - timedelta(hours=24)
+    if desde > hasta or (hasta - desde).days >= MAX_DIAS:
+        raise HTTPException(status_code=400, detail="Rango de fechas inválido")
+    try:
+        return {"desde": desde, "hasta": hasta, "horas": accesos_por_hora(desde, hasta)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/denegaciones")
+def get_denegaciones(desde: Optional[date] = None, hasta: Optional[date] = None):
+    """Denegaciones agrupadas por motivo (por defecto, últimos 30 días)."""
+    desde, hasta = _rango_dias(desde, hasta, 30)
+    try:
+        return {"desde": desde, "hasta": hasta, "motivos": denegaciones_por_motivo(desde, hasta)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/top-matriculas")
+def get_top_matriculas(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+):
+    """Matrículas con más accesos (por defecto, últimos 30 días)."""
+    desde, hasta = _rango_dias(desde, hasta, 30)
+    try:
+        return {"desde": desde, "hasta": hasta, "matriculas": top_matriculas(desde, hasta, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/rollups/recalcular")
+def post_recalcular_rollups(
+    current_admin: Annotated[Usuario, Depends(get_current_admin)],
+    desde: date,
+    hasta: Optional[date] = None,
+):
+    """Reconstruye los rollups de un rango de días desde `eventos_acceso` (solo admin)."""
+    desde, hasta = _rango_dias(desde, hasta, 1)
+    try:
+        eventos = recalcular_rollups(desde, hasta)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"desde": desde, "hasta": hasta, "eventos": eventos}
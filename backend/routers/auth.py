@@ -1,10 +1,14 @@
 # auth_router.py
+import traceback
+from dataclasses import asdict
 from typing import Any, Dict, Optional, List, Annotated
 from datetime import timedelta
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 
+import queries
 from db import (
     authenticate_user,
     create_access_token,
@@ -12,9 +16,17 @@ from db import (
     get_user_by_username,
     create_user,
     get_all_users,
+    stream_query,
     update_last_login,
+    pooled_connection,
+    table_name,
+    DB_SCHEMA,
+    USUARIOS_COLUMNAS,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
+from db_helpers import encode_cursor, decode_cursor, json_array_stream
+from fastjson import FastJSONResponse
+from rows import Usuario, UsuarioLogin, fila
 
 router = APIRouter(prefix="/auth", tags=["Autenticación"])
 
@@ -47,6 +59,7 @@ class Message(BaseModel):
 
 class UsersResponse(BaseModel):
     users: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
 
 # --- Seguridad ----------------------------
 security = HTTPBearer(auto_error=False)
@@ -75,20 +88,31 @@ def get_current_user(credentials: Annotated[Optional[HTTPAuthorizationCredential
     user = get_user_by_username(username)
     if not user:
         _raise_unauthorized("Usuario no encontrado")
-    if user.get("activo") is False:
+    if user.activo is False:
         _raise_unauthorized("Usuario inactivo")
 
     return user
 
 # Verificación de admin
-def get_current_admin(current_user: Annotated[Dict[str, Any], Depends(get_current_user)]):
-    if current_user.get("rol") != "admin":
+def get_current_admin(current_user: Annotated[Usuario, Depends(get_current_user)]):
+    if current_user.rol != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Acceso denegado. Se requieren permisos de administrador",
         )
     return current_user
 
+def _user_info(user) -> dict:
+    """Cuerpo de `UserInfo` armado desde la fila, sin validación de Pydantic."""
+    return {
+        "id": user.id_usuario,
+        "username": user.username,
+        "nombre": user.nombre,
+        "rol": user.rol,
+        "primer_login": user.primer_login is not False,
+        "activo": user.activo is not False,
+    }
+
 # --- Endpoints ----------------------------
 @router.post("/login", response_model=Token, status_code=status.HTTP_200_OK)
 def login(data: LoginRequest):
@@ -97,41 +121,27 @@ def login(data: LoginRequest):
     if not user:
         _raise_unauthorized("Credenciales incorrectas")
 
-    if user.get("activo") is False:
+    if user.activo is False:
         _raise_unauthorized("Usuario inactivo")
 
     try:
-        update_last_login(user["username"])
+        update_last_login(user.username)
     except Exception:
         pass
 
     access_token_expires = timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
-    access_token = create_access_token(data={"sub": user["username"]}, expires_delta=access_token_expires)
-
-    user_info = UserInfo(
-        id=user["id_usuario"],
-        username=user["username"],
-        nombre=user["nombre"],
-        rol=user["rol"],
-        primer_login=user.get("primer_login", True),
-        activo=user.get("activo", True),
-    )
-    return Token(access_token=access_token, user_info=user_info)
+    access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+
+    # Mismo cuerpo que `Token` (el modelo queda para la documentación)
+    return FastJSONResponse({"access_token": access_token, "token_type": "bearer", "user_info": _user_info(user)})
 
 @router.get("/me", response_model=UserInfo)
-def get_current_user_info(current_user: Annotated[Dict[str, Any], Depends(get_current_user)]):
+def get_current_user_info(current_user: Annotated[Usuario, Depends(get_current_user)]):
     """Información del usuario actual (derivada del token)."""
-    return UserInfo(
-        id=current_user["id_usuario"],
-        username=current_user["username"],
-        nombre=current_user["nombre"],
-        rol=current_user["rol"],
-        primer_login=current_user.get("primer_login", True),
-        activo=current_user.get("activo", True),
-    )
+    return FastJSONResponse(_user_info(current_user))
 
 @router.post("/register", response_model=Message, status_code=status.HTTP_201_CREATED)
-def register_user(data: UserCreate, current_admin: Annotated[Dict[str, Any], Depends(get_current_admin)]):
+def register_user(data: UserCreate, current_admin: Annotated[Usuario, Depends(get_current_admin)]):
     """Crea usuarios (solo admin)."""
     result = create_user(
         username=data.username,
@@ -143,36 +153,62 @@ def register_user(data: UserCreate, current_admin: Annotated[Dict[str, Any], Dep
         return Message(message=result.get("message", "Usuario creado"))
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result.get("message", "Error al crear usuario"))
 
+_SQL_USUARIOS_TODOS = f"SELECT {USUARIOS_COLUMNAS} FROM {table_name('usuarios')} ORDER BY id_usuario"
+
 @router.get("/users", response_model=UsersResponse)
-def get_users(current_admin: Annotated[Dict[str, Any], Depends(get_current_admin)]):
-    """Lista de usuarios (solo admin)."""
-    users = get_all_users()
-    return UsersResponse(users=users)
+def get_users(
+    current_admin: Annotated[Usuario, Depends(get_current_admin)],
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+):
+    """Lista de usuarios (solo admin), paginada por id con `next_cursor`.
+    Con `stream=true` devuelve todos los usuarios en streaming (cursor del servidor)."""
+    if stream:
+        rows = stream_query(_SQL_USUARIOS_TODOS)
+        return StreamingResponse(json_array_stream("users", rows), media_type="application/json")
+
+    after_id = None
+    if cursor:
+        try:
+            (after_id,) = decode_cursor(cursor)
+            after_id = int(after_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+    # Se pide una fila de más para saber si hay otra página
+    users = get_all_users(limit=limit + 1, after_id=after_id)
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id_usuario)
+    # Filas tipadas serializadas directo (sin validar cada dict con Pydantic)
+    return FastJSONResponse({"users": users, "next_cursor": next_cursor})
 
 @router.get("/verify-token")
-def verify_token_endpoint(current_user: Annotated[Dict[str, Any], Depends(get_current_user)]):
+def verify_token_endpoint(current_user: Annotated[Usuario, Depends(get_current_user)]):
     """Devuelve válido si el token está correcto."""
     return {"valid": True, "user": {
-        "id": current_user["id_usuario"],
-        "username": current_user["username"],
-        "rol": current_user["rol"]
+        "id": current_user.id_usuario,
+        "username": current_user.username,
+        "rol": current_user.rol
     }}
 
 # --- Diagnóstico (deshabilitar en producción) ----------------------------
+_SQL_EJEMPLOS_USUARIOS = f"SELECT username, nombre, rol, activo FROM {table_name('usuarios')} LIMIT 5"
+
 @router.get("/test-user/{username}")
 def test_user(username: str):
     """Endpoint de diagnóstico para revisar un usuario y el hash de password."""
-    from db import get_connection, table_name, DB_SCHEMA
-    from psycopg2.extras import RealDictCursor
-
     try:
-        conn = get_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(f"SELECT * FROM {table_name('usuarios')} WHERE username = %s", (username,))
-        user = cur.fetchone()
+        with pooled_connection() as conn, conn.cursor() as cur:
+            user = fila(UsuarioLogin, queries.fetchone(cur, "usuario_login", (username,)))
+            if not user:
+                cur.execute(_SQL_EJEMPLOS_USUARIOS)
+                ejemplos = [dict(zip(("username", "nombre", "rol", "activo"), e)) for e in cur.fetchall()]
 
         if user:
-            user_dict = dict(user)
+            user_dict = asdict(user)
             password_hash = user_dict.get("password_hash") or ""
             hash_valid = password_hash.startswith("$2b$") or password_hash.startswith("$2a$")
             if "password_hash" in user_dict:
@@ -197,19 +233,14 @@ def test_user(username: str):
                 info["diagnostico"]["problemas"].append("Password hash inválido (no es bcrypt)")
                 info["diagnostico"]["solucion"] = "Ejecuta: python fix_user_password.py <username> <nueva_contraseña>"
 
-            cur.close(); conn.close()
             return info
 
-        cur.execute(f"SELECT username, nombre, rol, activo FROM {table_name('usuarios')} LIMIT 5")
-        ejemplos = cur.fetchall()
-        cur.close(); conn.close()
         return {
             "encontrado": False,
             "mensaje": f"Usuario '{username}' no encontrado en schema '{DB_SCHEMA}'",
-            "ejemplos": [dict(e) for e in ejemplos] if ejemplos else [],
+            "ejemplos": ejemplos,
         }
 
     except Exception as e:
-        import traceback
         return {"error": str(e), "traceback": traceback.format_exc(), "schema_usado": DB_SCHEMA}
 
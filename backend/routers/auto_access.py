@@ -1,111 +1,251 @@
-from fastapi import APIRouter, BackgroundTasks, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, Response
 import cv2
 import numpy as np
 import json
 import asyncio
-from typing import List
+from typing import Optional
 import os
-from camera.camera_service import init_camera_service, get_camera_service
-from db import db_config
-import threading
-import queue
+from app_state import state
+from camera.evidence_store import get_evidence_store
+from event_bus import POLICIES
+from event_feed import event_feed
+import time
 
 router = APIRouter(prefix="/auto-access", tags=["Auto Access"])
 
-detection_queue = queue.Queue()
-
-
-active_connections: List[WebSocket] = []
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, formato: str = "completo",
+                             politica: str = "drop_oldest", max_pendientes: Optional[int] = None):
+    """
+    WebSocket para alertas en tiempo real.
+    - `since`: último ID recibido; al reconectar se reenvían los eventos perdidos
+      (`since=0` entrega todo el buffer).
+    - `formato=compacto`: lotes `{"type": "batch", "last_id", "events": [...]}`
+      con el esquema compacto; si no, un mensaje `detection` por evento.
+    - `politica` (`drop_oldest` o `coalesce`) y `max_pendientes`: qué se
+      descarta si el cliente se atrasa (ver event_feed.py).
+    Si se perdieron eventos (fuera del buffer o salteados por
+    `max_pendientes`) antes del lote llega `{"type": "reset", "primer_id",
+    "descartados"}`: el cliente debe recargar el estado completo.
+    """
+    if politica not in POLICIES or (max_pendientes is not None and max_pendientes < 0):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    compacto = formato == "compacto"
 
+    async def drain():
+        # Los mensajes del cliente (pings) se descartan; termina al desconectarse
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
 
-camera_service = None
+    receiver = asyncio.create_task(drain())
+    feed = event_feed.subscribe(since, policy=politica, max_lag=max_pendientes)
+    next_batch = None
+    try:
+        while not receiver.done():
+            next_batch = asyncio.ensure_future(feed.__anext__())
+            await asyncio.wait({next_batch, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_batch.done():
+                break
+            batch = next_batch.result()
+            if batch.gap:
+                await websocket.send_text(json.dumps(
+                    {"type": "reset", "primer_id": batch.first_id, "descartados": batch.dropped}
+                ))
+            if not batch.events:
+                await websocket.send_text('{"type":"ping"}')
+            elif compacto:
+                await websocket.send_text(
+                    f'{{"type":"batch","last_id":{batch.last_id},"events":{batch.compact_json()}}}'
+                )
+            else:
+                for event in batch.events:
+                    await websocket.send_text(event.full_json)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        # Cancelar la espera del feed y dejar que termine antes de cerrarlo:
+        # `aclose()` sobre un generador con un `__anext__` pendiente falla
+        # y la suscripción quedaría hasta que la junte el GC
+        pendientes = [t for t in (next_batch, receiver) if t is not None and not t.done()]
+        for task in pendientes:
+            task.cancel()
+        await asyncio.gather(*pendientes, return_exceptions=True)
+        await feed.aclose()
 
-def init_camera():
-    """Inicializa el servicio de cámara"""
-    global camera_service
-    camera_service = init_camera_service(db_config)
-    
-    def detection_callback(vehicle_data):
-        """Callback cuando se detecta una patente"""
-        if os.getenv('DETECTIONS_LOG', '').lower() in ('1', 'true', 'yes', 'on'):
-            print(f"🚗 DETECCIÓN: {vehicle_data['matricula']} - {'PERMITIDO' if vehicle_data['acceso'] else 'DENEGADO'}")
-        
-        # Enviar a la cola para WebSocket
-        detection_queue.put(vehicle_data)
-    
-    camera_service.set_detection_callback(detection_callback)
-    camera_service.start_background_capture()
 
-@router.on_event("startup")
-async def startup_event():
+@router.get("/events")
+async def get_events(
+    request: Request,
+    since: Optional[int] = Query(None, description="Último ID recibido (0 = todo el buffer)"),
+    politica: str = Query("drop_oldest", pattern="^(drop_oldest|coalesce)$"),
+    max_pendientes: Optional[int] = Query(None, ge=0, description="Eventos pendientes antes de descartar"),
+    last_event_id: Optional[str] = Header(None),
+):
     """
-    Inicializa la cámara solo si ENABLE_CAMERA está activa.
-    Evita que Render falle al no tener cámara ni modelo local.
+    Server-Sent Events con el esquema compacto. Cada mensaje `detections`
+    trae un lote y su `id` es el del último evento: al reconectar, el
+    navegador manda `Last-Event-ID` y el servidor reenvía lo que faltó.
+    Si igual hubo eventos perdidos o salteados llega antes un `reset`.
     """
-    if os.getenv("ENABLE_CAMERA", "0").lower() not in ("1", "true", "yes", "on"):
-        print("🔌 ENABLE_CAMERA=0 → Cámara deshabilitada en este entorno.")
-        return
-    
-    print("🎥 ENABLE_CAMERA=1 → Inicializando cámara...")
-    init_camera()
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
 
+    async def stream():
+        yield "retry: 1500\n\n"
+        feed = event_feed.subscribe(since, policy=politica, max_lag=max_pendientes)
+        try:
+            async for batch in feed:
+                if await request.is_disconnected():
+                    break
+                if batch.gap:
+                    yield f'event: reset\ndata: {{"primer_id":{batch.first_id},"descartados":{batch.dropped}}}\n\n'
+                if not batch.events:
+                    yield ": ping\n\n"
+                    continue
+                yield f"id: {batch.last_id}\nevent: detections\ndata: {batch.compact_json()}\n\n"
+        finally:
+            await feed.aclose()
 
-
-@router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket para alertas en tiempo real"""
-    await websocket.accept()
-    active_connections.append(websocket)
-    
-    try:
-        while True:
-            # Mantener la conexión activa
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        active_connections.remove(websocket)
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("/video-feed")
 async def get_video_feed():
     """Stream de video en tiempo real"""
     def generate_frames():
+        frame = None  # buffer propio de este cliente, reutilizado en cada frame
+        seq = 0
         while True:
-            if camera_service and camera_service.get_current_frame() is not None:
-                frame = camera_service.get_current_frame().copy()
-                # Overlay de última patente detectada (texto y bbox)
-                overlay = camera_service.get_last_plate_for_overlay()
-                if overlay:
-                    try:
-                        x1, y1, x2, y2 = overlay.get('bbox') or [0,0,0,0]
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        label = overlay.get('text', '')
-                        if label:
-                            cv2.putText(frame, label, (x1, max(0, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0,255,0), 2)
-                    except Exception:
-                        pass
-                # Convertir a bytes para streaming
-                ret, buffer = cv2.imencode('.jpg', frame)
-                frame_bytes = buffer.tobytes()
-                
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            else:
+            frames = state.frames
+            if frames is None:
                 # Frame vacío si no hay cámara
                 yield (b'--frame\r\n'
                        b'Content-Type: image/jpeg\r\n\r\n' + b'\r\n')
+                time.sleep(0.5)
+                continue
+            new_seq, new_frame = frames.read_frame(frame, after_seq=seq)
+            if new_frame is None:
+                # Sin frame nuevo: no re-encodear el mismo
+                time.sleep(0.01)
+                continue
+            seq, frame = new_seq, new_frame
+            # Overlay de última patente detectada (texto y bbox)
+            overlay = frames.get_last_plate_for_overlay()
+            if overlay:
+                try:
+                    x1, y1, x2, y2 = overlay.get('bbox') or [0,0,0,0]
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    label = overlay.get('text', '')
+                    if label:
+                        cv2.putText(frame, label, (x1, max(0, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0,255,0), 2)
+                except Exception:
+                    pass
+            # Convertir a bytes para streaming
+            ret, buffer = cv2.imencode('.jpg', frame)
+            frame_bytes = buffer.tobytes()
+            
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
     
     return StreamingResponse(generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
 
+@router.get("/snapshot")
+def get_snapshot():
+    """Último frame de la cámara como JPEG (el encode corre fuera del event loop)"""
+    fb = state.frames.frame_buffer if state.frames is not None else None
+    if fb is None:
+        raise HTTPException(status_code=503, detail="Cámara sin frames")
+    seq, frame = fb.view()
+    if frame is None:
+        raise HTTPException(status_code=503, detail="Cámara sin frames")
+    ret, buffer = cv2.imencode('.jpg', frame)
+    # Si el frame se pisó durante el encode, usar una copia consistente
+    if not ret or not fb.is_valid(seq):
+        _, frame = fb.read()
+        ret, buffer = cv2.imencode('.jpg', frame)
+    return Response(content=buffer.tobytes(), media_type="image/jpeg")
+
+def _parse_range(header: str, size: int):
+    """Rango único `bytes=a-b`, `bytes=a-` o `bytes=-n`. None si no es satisfacible."""
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[6:].strip().partition("-")
+    try:
+        if start_s == "":
+            n = int(end_s)
+            if n <= 0:
+                return None
+            start, end = max(0, size - n), size - 1
+        else:
+            start = int(start_s)
+            end = min(int(end_s), size - 1) if end_s else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def _iter_file_range(path: str, start: int, length: int, chunk: int = 64 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+@router.get("/snapshots/{evidence_id}")
+async def get_evidence_snapshot(evidence_id: str, request: Request,
+                                tipo: str = Query("frame", pattern="^(frame|placa)$")):
+    """
+    Imagen de evidencia de una detección (`tipo=frame` o `tipo=placa`).
+    Los archivos son inmutables (direccionados por sha256): se sirven con
+    ETag fijo, caché larga y soporte de `Range` (206).
+    """
+    store = get_evidence_store()
+    found = store.file_for(evidence_id, tipo) if store else None
+    if not found:
+        raise HTTPException(status_code=404, detail="Evidencia no encontrada")
+    path, sha = found
+    etag = f'"{sha}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable", "Accept-Ranges": "bytes"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if range_header:
+        size = os.path.getsize(path)
+        rng = _parse_range(range_header, size)
+        if rng is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = rng
+        headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+        return StreamingResponse(_iter_file_range(path, start, end - start + 1),
+                                 status_code=206, media_type="image/jpeg", headers=headers)
+    # FileResponse usa sendfile/pathsend cuando el servidor lo soporta
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
 @router.get("/status")
 async def get_camera_status():
-    """Obtiene el estado de la cámara"""
-    if camera_service:
-        return {
-            "status": "running" if camera_service.is_running else "stopped",
-            "camera_id": camera_service.camera_id,
-            "last_detection": camera_service.last_detection_time
-        }
-    return {"status": "not_initialized"}
+    """Obtiene el estado de la cámara (local o publicado por el proceso de cámara)"""
+    status = state.camera_status()
+    if status.get("status") == "not_initialized":
+        return status
+    return {**status, "role": state.role, "feed": event_feed.status()}
+
+@router.get("/metrics")
+async def get_event_metrics():
+    """Colas de eventos: bus de la cámara y feed de este worker (profundidad, descartes, latencias)"""
+    return {"role": state.role, "bus": state.bus_status(), "feed": event_feed.metrics()}
 
 @router.get("/ui", response_class=HTMLResponse)
 async def auto_access_ui():
@@ -132,21 +272,19 @@ async def auto_access_ui():
     .meta { opacity: 0.7; font-size: 12px; }
   </style>
   <script>
-    let ws;
-    function startWS() {
-      const url = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/auto-access/ws';
-      ws = new WebSocket(url);
-      ws.onopen = () => console.log('WS conectado');
-      ws.onmessage = (ev) => {
+    // SSE: el navegador reconecta solo y manda Last-Event-ID, así no se pierden eventos
+    function startFeed() {
+      const es = new EventSource('/auto-access/events?since=0');
+      es.addEventListener('detections', (ev) => {
         try {
-          const msg = JSON.parse(ev.data);
-          if (msg.type === 'detection') {
-            appendDetection(msg.data);
+          for (const e of JSON.parse(ev.data)) {
+            appendDetection({
+              matricula: e.m, acceso: e.a === 1, motivo: e.r, dias_restantes: e.n,
+              departamento: e.d, propietario: e.p, timestamp: e.t
+            });
           }
         } catch (_) {}
-      };
-      ws.onclose = () => setTimeout(startWS, 1500);
-      ws.onerror = () => ws.close();
+      });
     }
     function appendDetection(d) {
       const el = document.createElement('div');
@@ -161,7 +299,7 @@ async def auto_access_ui():
       const nodes = list.querySelectorAll('.log');
       if (nodes.length > 100) nodes[nodes.length - 1].remove();
     }
-    window.addEventListener('load', () => startWS());
+    window.addEventListener('load', () => startFeed());
   </script>
   </head>
   <body>
@@ -183,53 +321,23 @@ async def auto_access_ui():
     """
 
 @router.post("/start")
-async def start_camera():
-    """Inicia la cámara (la inicializa si aún no existe)"""
-    global camera_service
-    if camera_service is None:
-        init_camera()
-    if camera_service:
-        camera_service.start_background_capture()
+def start_camera():
+    """Inicia la cámara (la inicializa si aún no existe; la carga de modelos
+    bloquea, por eso corre en el threadpool y no en el event loop)"""
+    if not state.owns_camera:
+        raise HTTPException(status_code=409, detail="La cámara corre en el proceso con SMARTGATE_ROLE=camera")
+    if state.start_camera():
         return {"message": "Cámara iniciada"}
     return {"error": "No se pudo inicializar el servicio de cámara"}
 
 
 @router.post("/stop")
-async def stop_camera():
-    """Detiene la cámara"""
-    if camera_service:
-        camera_service.stop_capture()
+def stop_camera():
+    """Detiene la cámara (espera al hilo de captura y al pool: corre en el
+    threadpool, no en el event loop)"""
+    if not state.owns_camera:
+        raise HTTPException(status_code=409, detail="La cámara corre en el proceso con SMARTGATE_ROLE=camera")
+    if state.camera_service:
+        state.camera_service.stop_capture()
         return {"message": "Cámara detenida"}
     return {"error": "Servicio de cámara no inicializado"}
-
-# Función para enviar alertas a todos los clientes WebSocket
-async def broadcast_detection(vehicle_data: dict):
-    """Envía la detección a todos los clientes conectados"""
-    message = {
-        "type": "detection",
-        "data": vehicle_data
-    }
-    
-    # Enviar a todas las conexiones activas
-    for connection in active_connections:
-        try:
-            await connection.send_text(json.dumps(message))
-        except:
-            # Remover conexiones cerradas
-            active_connections.remove(connection)
-
-# Thread para procesar la cola de detecciones
-def process_detection_queue():
-    """Procesa la cola de detecciones y envía alertas"""
-    while True:
-        try:
-            vehicle_data = detection_queue.get(timeout=1)
-            asyncio.run(broadcast_detection(vehicle_data))
-        except queue.Empty:
-            continue
-        except Exception as e:
-            print(f"Error procesando detección: {e}")
-
-# Iniciar thread de procesamiento
-detection_thread = threading.Thread(target=process_detection_queue, daemon=True)
-detection_thread.start()
@@ -1,9 +1,17 @@
 
-from fastapi import APIRouter
+import os
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from db import db_config, DB_SCHEMA, get_connection, table_name
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from db import decision_acceso, pooled_connection, table_name, stream_query, verificar_matriculas
+from db_helpers import encode_cursor, decode_cursor, json_array_stream
+from plates import normalize_plate
+from response_cache import cached_json_response
+import queries
+from fastjson import FastJSONResponse
+from rows import Pago, Tarifa, columnas, filas
 
 router = APIRouter(prefix="/cocheras", tags=["Cocheras"])
 
@@ -12,97 +20,44 @@ class MatriculaRequest(BaseModel):
 
 @router.post("/verificar-acceso")
 def verificar_acceso_cochera(data: MatriculaRequest):
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    from db import db_config
-    from datetime import datetime, timedelta, date
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        # Buscar id_departamento del vehículo
-        cursor.execute(f"SELECT id_departamento FROM {table_name('vehiculos')} WHERE matricula = %s", (data.matricula,))
-        vehiculo = cursor.fetchone()
-        if not vehiculo or not dict(vehiculo).get("id_departamento"):
-            cursor.close()
-            conn.close()
-            return {"acceso": False, "mensaje": "Acceso denegado", "motivo": "Vehículo sin cochera/departamento asociado"}
-        vehiculo_dict = dict(vehiculo)
-        id_departamento = vehiculo_dict["id_departamento"]
-        # Buscar el último pago realizado
-        cursor.execute(f"SELECT * FROM {table_name('pagos')} WHERE id_departamento = %s ORDER BY fecha_pago DESC LIMIT 1", (id_departamento,))
-        pago = cursor.fetchone()
-        if not pago:
-            cursor.close()
-            conn.close()
-            return {"acceso": False, "mensaje": "Acceso denegado", "motivo": "No se encontraron pagos para este departamento"}
-        pago_dict = dict(pago)
-        # Buscar id_tarifa en la tabla inquilinos
-        cursor.execute(f"SELECT id_tarifa FROM {table_name('inquilinos')} WHERE id_departamento = %s", (id_departamento,))
-        inquilino = cursor.fetchone()
-        if not inquilino or not dict(inquilino).get("id_tarifa"):
-            cursor.close()
-            conn.close()
-            return {"acceso": False, "mensaje": "Acceso denegado", "motivo": "No se encontró tarifa para el departamento"}
-        inquilino_dict = dict(inquilino)
-        id_tarifa = inquilino_dict["id_tarifa"]
-        cursor.execute(f"SELECT * FROM {table_name('tarifas')} WHERE id_tarifa = %s", (id_tarifa,))
-        tarifa = cursor.fetchone()
-        tarifa_dict = dict(tarifa)
-        cursor.close()
-        conn.close()
-        # Calcular fecha de vencimiento usando solo date
-        fecha_pago = pago_dict["fecha_pago"]
-        if isinstance(fecha_pago, str):
-            fecha_pago = datetime.strptime(fecha_pago, "%Y-%m-%d").date()
-        elif isinstance(fecha_pago, datetime):
-            fecha_pago = fecha_pago.date()
-        # Sumar días según la tarifa
-        if tarifa_dict["descripcion"].lower() == "mensual":
-            vencimiento = fecha_pago + timedelta(days=30)
-        elif tarifa_dict["descripcion"].lower() == "anual":
-            vencimiento = fecha_pago + timedelta(days=365)
-        else:
-            vencimiento = fecha_pago
-        hoy = date.today()
-        dias_restantes = (vencimiento - hoy).days
-        acceso = dias_restantes > 0
+        # Vehículo + último pago + tarifa en una consulta; regla de `decision_acceso`
+        vehiculo = verificar_matriculas([data.matricula]).get(normalize_plate(data.matricula))
+        decision = decision_acceso(data.matricula, vehiculo, requiere_cochera=True)
+        vencida = decision["dias_restantes"] is not None and decision["dias_restantes"] <= 0
         # Si la mensualidad está vencida, actualizar estado del vehículo a 1 (denegado)
-        if not acceso:
+        if vencida:
             try:
-                conn2 = get_connection()
-                cursor2 = conn2.cursor()
-                cursor2.execute(f"UPDATE {table_name('vehiculos')} SET estado = 1 WHERE matricula = %s", (data.matricula,))
-                conn2.commit()
-                cursor2.close()
-                conn2.close()
+                with pooled_connection() as conn, conn.cursor() as cursor:
+                    queries.execute(cursor, "vehiculo_denegar", (normalize_plate(data.matricula),))
             except Exception as e:
                 return {"error": f"No se pudo actualizar el estado del vehículo: {str(e)}"}
-            return {
-                "acceso": False,
-                "mensaje": "Acceso denegado",
-                "motivo": "Mensualidad vencida",
-                "dias_restantes": dias_restantes,
-                "vencimiento": vencimiento.strftime("%Y-%m-%d")
-            }
+        if not decision["acceso"]:
+            respuesta = {"acceso": False, "mensaje": "Acceso denegado", "motivo": decision["motivo"]}
+            if decision["dias_restantes"] is not None:
+                respuesta["dias_restantes"] = decision["dias_restantes"]
+                respuesta["vencimiento"] = decision["vencimiento"]
+            return respuesta
         return {
             "acceso": True,
             "mensaje": "Acceso autorizado",
-            "dias_restantes": dias_restantes,
-            "vencimiento": vencimiento.strftime("%Y-%m-%d")
+            "dias_restantes": decision["dias_restantes"],
+            "vencimiento": decision["vencimiento"]
         }
     except Exception as e:
         return {"error": str(e)}
 
+# Las tarifas cambian un par de veces al año: se sirven desde la caché
+TARIFAS_CACHE_TTL = float(os.getenv("TARIFAS_CACHE_TTL", "3600"))
+
+def _cargar_tarifas():
+    with pooled_connection() as conn, conn.cursor() as cursor:
+        return {"tarifas": filas(Tarifa, queries.fetchall(cursor, "tarifas"))}
+
 @router.get("/tarifas")
-def get_tarifas():
+def get_tarifas(request: Request):
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(f"SELECT * FROM {table_name('tarifas')}")
-        tarifas = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return {"tarifas": [dict(t) for t in tarifas]}
+        return cached_json_response(request, "tarifas", _cargar_tarifas, TARIFAS_CACHE_TTL)
     except Exception as e:
         return {"error": str(e)}
 
@@ -111,29 +66,60 @@ def registrar_pago():
     # Aquí irá la lógica para registrar pagos
     return {"mensaje": "Pago registrado (demo)"}
 
+# Columnas expuestas del historial de pagos (las de rows.Pago)
+PAGOS_COLUMNAS = columnas(Pago)
+_SQL_PAGOS = f"SELECT {PAGOS_COLUMNAS} FROM {table_name('pagos')} WHERE id_departamento = %s"
+_SQL_PAGOS_ORDEN = " ORDER BY fecha_pago DESC, id_pago DESC"
+# Historial completo (stream), primera página y páginas siguientes (keyset)
+_SQL_PAGOS_TODOS = _SQL_PAGOS + _SQL_PAGOS_ORDEN
+_SQL_PAGOS_PAGINA = _SQL_PAGOS + _SQL_PAGOS_ORDEN + " LIMIT %s"
+_SQL_PAGOS_PAGINA_DESDE = _SQL_PAGOS + " AND (fecha_pago, id_pago) < (%s, %s)" + _SQL_PAGOS_ORDEN + " LIMIT %s"
+
 @router.get("/pagos/{matricula}")
-def historial_pagos(matricula: str):
-    # Aquí irá la lógica para consultar historial de pagos
-        import psycopg2
-        from psycopg2.extras import RealDictCursor
-        from db import db_config
-        try:
-            conn = get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+def historial_pagos(
+    matricula: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+):
+    """
+    Historial de pagos del departamento del vehículo, del más reciente al más
+    antiguo. Paginado por keyset (fecha_pago, id_pago): la respuesta incluye
+    `next_cursor` para pedir la página siguiente. Con `stream=true` se
+    transmite el historial completo desde un cursor del servidor.
+    """
+    try:
+        desde = None
+        if cursor:
+            try:
+                fecha, id_pago = decode_cursor(cursor)
+                datetime.fromisoformat(fecha)  # valida; Postgres castea al tipo de fecha_pago
+                desde = (fecha, int(id_pago))
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Cursor inválido")
+
+        with pooled_connection() as conn, conn.cursor() as cur:
             # Buscar id_departamento del vehículo
-            cursor.execute(f"SELECT id_departamento FROM {table_name('vehiculos')} WHERE matricula = %s", (matricula,))
-            vehiculo = cursor.fetchone()
-            if not vehiculo or not dict(vehiculo).get("id_departamento"):
-                cursor.close()
-                conn.close()
+            vehiculo = queries.fetchone(cur, "vehiculo_departamento", (normalize_plate(matricula),))
+            if not vehiculo or not vehiculo[0]:
                 return {"pagos": [], "mensaje": "Vehículo sin cochera/departamento asociado"}
-            vehiculo_dict = dict(vehiculo)
-            id_departamento = vehiculo_dict["id_departamento"]
-            
-            cursor.execute(f"SELECT * FROM {table_name('pagos')} WHERE id_departamento = %s", (id_departamento,))
-            pagos = cursor.fetchall()
-            cursor.close()
-            conn.close()
-            return {"pagos": [dict(p) for p in pagos]}
-        except Exception as e:
-            return {"error": str(e)}
+            id_departamento = vehiculo[0]
+
+            if stream:
+                historial = stream_query(_SQL_PAGOS_TODOS, (id_departamento,))
+                return StreamingResponse(json_array_stream("pagos", historial), media_type="application/json")
+
+            if desde:
+                cur.execute(_SQL_PAGOS_PAGINA_DESDE, (id_departamento, *desde, limit + 1))
+            else:
+                cur.execute(_SQL_PAGOS_PAGINA, (id_departamento, limit + 1))
+            pagos = filas(Pago, cur.fetchall())
+        next_cursor = None
+        if len(pagos) > limit:
+            pagos = pagos[:limit]
+            next_cursor = encode_cursor(pagos[-1].fecha_pago, pagos[-1].id_pago)
+        return FastJSONResponse({"pagos": pagos, "next_cursor": next_cursor})
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"error": str(e)}
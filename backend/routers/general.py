@@ -1,15 +1,27 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from db import tiene_permiso
+import json
+from typing import List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from db import DB_SCHEMA, decision_acceso, pooled_connection, table_name, test_db_connection, tiene_permiso, verificar_matriculas
+from plate_index import get_plate_index
+from plates import normalize_plate
+import queries
+from rows import Vehiculo, fila
 
 router = APIRouter(prefix="/general", tags=["General"])
 
+# Matrículas por consulta `= ANY(%s)` al verificar en lote
+LOTE_CHUNK = 500
+
 class MatriculaRequest(BaseModel):
     matricula: str
 
+class MatriculasRequest(BaseModel):
+    matriculas: List[str] = Field(min_length=1, max_length=10000)
+
 @router.get("/test-db")
 def test_db():
-    from db import db_config, test_db_connection
     return test_db_connection()
 
 @router.post("/verificar-acceso")
@@ -26,44 +38,71 @@ def verificar_acceso(data: MatriculaRequest):
         # Solo capturar otras excepciones, no HTTPException
         raise HTTPException(status_code=500, detail=f"Error al verificar acceso: {str(e)}")
 
+def _decisiones_lote(matriculas: List[str]):
+    """Genera la decisión de cada matrícula, consultando de a LOTE_CHUNK."""
+    for i in range(0, len(matriculas), LOTE_CHUNK):
+        chunk = matriculas[i:i + LOTE_CHUNK]
+        filas = verificar_matriculas(chunk)
+        for m in chunk:
+            yield decision_acceso(m, filas.get(normalize_plate(m)))
+
+@router.post("/verificar-acceso/lote")
+def verificar_acceso_lote(data: MatriculasRequest, request: Request, formato: str = "json"):
+    """
+    Verifica muchas matrículas a la vez (conciliaciones, envío desde el borde).
+    Con `formato=ndjson` (o `Accept: application/x-ndjson`) la respuesta se
+    transmite una línea JSON por matrícula a medida que se resuelve cada bloque;
+    si la base falla a mitad del envío, la última línea es `{"error": ...}`.
+    """
+    ndjson = formato == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+    try:
+        if ndjson:
+            def generar():
+                # El estado HTTP ya salió con la primera línea: el error va como
+                # última línea en lugar de cortar la respuesta a medias
+                try:
+                    for d in _decisiones_lote(data.matriculas):
+                        yield json.dumps(d, ensure_ascii=False) + "\n"
+                except Exception as e:
+                    print("Error DB:", e)
+                    yield json.dumps({"error": f"Error al verificar acceso: {str(e)}"}, ensure_ascii=False) + "\n"
+            return StreamingResponse(generar(), media_type="application/x-ndjson")
+        resultados = list(_decisiones_lote(data.matriculas))
+        return {
+            "total": len(resultados),
+            "permitidos": sum(1 for r in resultados if r["acceso"]),
+            "resultados": resultados,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al verificar acceso: {str(e)}")
+
+_SQL_EJEMPLOS_VEHICULOS = f"SELECT matricula, estado FROM {table_name('vehiculos')} LIMIT 5"
+
 @router.get("/test-vehiculo/{matricula}")
 def test_vehiculo(matricula: str):
     """Endpoint de prueba para verificar si un vehículo existe en la BD"""
-    from db import db_config, DB_SCHEMA
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    
     try:
-        # Usar la función de conexión de db.py que configura el search_path
-        from db import get_connection
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Buscar el vehículo
-        from db import table_name
-        cursor.execute(f"SELECT * FROM {table_name('vehiculos')} WHERE matricula = %s", (matricula,))
-        vehiculo = cursor.fetchone()
-        
+        with pooled_connection() as conn, conn.cursor() as cursor:
+            # Buscar el vehículo
+            vehiculo = fila(Vehiculo, queries.fetchone(cursor, "vehiculo_por_matricula", (normalize_plate(matricula),)))
+            if not vehiculo:
+                # Listar algunas matrículas disponibles para prueba
+                cursor.execute(_SQL_EJEMPLOS_VEHICULOS)
+                ejemplos = [{"matricula": m, "estado": e} for m, e in cursor.fetchall()]
+
         if vehiculo:
-            vehiculo_dict = dict(vehiculo)
-            cursor.close()
-            conn.close()
             return {
                 "encontrado": True,
-                "vehiculo": vehiculo_dict,
+                "vehiculo": vehiculo,
                 "schema_usado": DB_SCHEMA
             }
         else:
-            # Listar algunas matrículas disponibles para prueba
-            from db import table_name
-            cursor.execute(f"SELECT matricula, estado FROM {table_name('vehiculos')} LIMIT 5")
-            ejemplos = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            candidatos = get_plate_index().candidates(matricula)
             return {
                 "encontrado": False,
                 "mensaje": f"Vehículo '{matricula}' no encontrado en schema '{DB_SCHEMA}'",
-                "ejemplos": [dict(e) for e in ejemplos] if ejemplos else []
+                "ejemplos": ejemplos,
+                "candidatos": [{"matricula": m, "puntaje": p} for m, p in candidatos]
             }
     except Exception as e:
         return {
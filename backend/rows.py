@@ -0,0 +1,83 @@
+"""
+Filas tipadas de las tablas que se leen en los caminos calientes.
+
+Dataclasses con `__slots__` en lugar de un dict por fila (`RealDictCursor`):
+cada consulta proyecta exactamente las columnas del modelo, en el mismo
+orden (las sentencias están en queries.py), y la fila se arma con
+`Modelo(*tupla)` desde un cursor común. Se serializan a JSON sin pasar por
+dicts (ver fastjson.py).
+"""
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional, Type, TypeVar
+
+T = TypeVar("T")
+
+
+def columnas(modelo, alias: str = "") -> str:
+    """Lista de columnas del modelo para el SELECT (`v.matricula, v.estado...`)."""
+    prefijo = f"{alias}." if alias else ""
+    return ", ".join(prefijo + f.name for f in fields(modelo))
+
+
+def filas(modelo: Type[T], rows) -> List[T]:
+    return [modelo(*r) for r in rows]
+
+
+def fila(modelo: Type[T], row) -> Optional[T]:
+    return modelo(*row) if row is not None else None
+
+
+@dataclass(slots=True)
+class Vehiculo:
+    """Vehículo con los datos de contacto del propietario (camino de la cámara)."""
+    matricula: str
+    matricula_norm: str
+    estado: Optional[int]
+    activo: Optional[bool]
+    id_departamento: Optional[int]
+    propietario: Optional[str]
+    telefono: Optional[str]
+    email: Optional[str]
+
+
+@dataclass(slots=True)
+class Pago:
+    id_pago: int
+    id_departamento: int
+    fecha_pago: date
+    monto: Optional[Decimal]
+
+
+@dataclass(slots=True)
+class Tarifa:
+    id_tarifa: int
+    descripcion: Optional[str]
+    monto: Optional[Decimal]
+
+
+@dataclass(slots=True)
+class Usuario:
+    """Usuario sin contraseña (lo que viaja en cada request autenticado)."""
+    id_usuario: int
+    username: str
+    nombre: str
+    rol: str
+    activo: Optional[bool]
+    primer_login: Optional[bool]
+    fecha_creacion: Optional[datetime]
+    ultimo_login: Optional[datetime]
+
+
+@dataclass(slots=True)
+class UsuarioLogin:
+    """Usuario + hash, solo para verificar la contraseña en el login."""
+    id_usuario: int
+    username: str
+    nombre: str
+    rol: str
+    activo: Optional[bool]
+    primer_login: Optional[bool]
+    password_hash: Optional[str]
+
@@ -63,9 +63,54 @@ CREATE TABLE IF NOT EXISTS vehiculos (
     fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_ultimo_acceso TIMESTAMP NULL,
     activo BOOLEAN DEFAULT TRUE,
-    FOREIGN KEY (id_propietario) REFERENCES propietarios(id_propietario)
+    id_departamento INTEGER NULL, -- cochera del vehículo (NULL = sin cochera)
+    FOREIGN KEY (id_propietario) REFERENCES propietarios(id_propietario),
+    FOREIGN KEY (id_departamento) REFERENCES departamentos(id_departamento)
+);
+
+-- ==========================================
+-- TABLA: tarifas
+-- ==========================================
+CREATE TABLE IF NOT EXISTS tarifas (
+    id_tarifa SERIAL PRIMARY KEY,
+    descripcion VARCHAR(50) NOT NULL, -- 'Mensual' o 'Anual': define el vencimiento del pago
+    monto DECIMAL(12,2)
+);
+
+-- ==========================================
+-- TABLA: inquilinos
+-- ==========================================
+CREATE TABLE IF NOT EXISTS inquilinos (
+    id_inquilino SERIAL PRIMARY KEY,
+    id_departamento INTEGER NOT NULL,
+    id_tarifa INTEGER,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (id_departamento) REFERENCES departamentos(id_departamento),
+    FOREIGN KEY (id_tarifa) REFERENCES tarifas(id_tarifa)
 );
 
+-- ==========================================
+-- TABLA: pagos
+-- ==========================================
+CREATE TABLE IF NOT EXISTS pagos (
+    id_pago SERIAL PRIMARY KEY,
+    id_departamento INTEGER NOT NULL,
+    fecha_pago DATE NOT NULL,
+    monto DECIMAL(12,2),
+    FOREIGN KEY (id_departamento) REFERENCES departamentos(id_departamento)
+);
+
+-- ==========================================
+-- COLUMNAS AGREGADAS A BASES EXISTENTES
+-- ==========================================
+-- Si las tablas ya existían, CREATE TABLE IF NOT EXISTS no las modifica:
+-- se agregan las columnas que usa la API (rows.Pago, rows.Tarifa, la
+-- decisión de acceso y la paginación de /cocheras/pagos)
+ALTER TABLE vehiculos ADD COLUMN IF NOT EXISTS id_departamento INTEGER REFERENCES departamentos(id_departamento);
+ALTER TABLE tarifas ADD COLUMN IF NOT EXISTS monto DECIMAL(12,2);
+ALTER TABLE pagos ADD COLUMN IF NOT EXISTS id_pago SERIAL;
+ALTER TABLE pagos ADD COLUMN IF NOT EXISTS monto DECIMAL(12,2);
+
 -- ==========================================
 -- TABLA: registros_acceso
 -- ==========================================
@@ -96,6 +141,9 @@ COMMENT ON TABLE departamentos IS 'Departamentos del edificio';
 COMMENT ON TABLE propietarios IS 'Propietarios de departamentos';
 COMMENT ON TABLE vehiculos IS 'Vehículos registrados con estado de acceso';
 COMMENT ON TABLE registros_acceso IS 'Registro de todos los accesos detectados';
+COMMENT ON TABLE tarifas IS 'Tarifas de cochera (mensual/anual)';
+COMMENT ON TABLE inquilinos IS 'Tarifa de cochera de cada departamento';
+COMMENT ON TABLE pagos IS 'Pagos de cochera por departamento';
 
 -- ==========================================
 -- VERIFICACIÓN DE ESTRUCTURA
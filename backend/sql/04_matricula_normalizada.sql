@@ -0,0 +1,30 @@
+-- ==========================================
+-- SMARTGATE - MATRÍCULA NORMALIZADA
+-- ==========================================
+-- Script para agregar la clave normalizada de matrícula
+-- Ejecutar después de 01_create_tables.sql (es idempotente)
+--
+-- El detector entrega patentes como 'AB123CD' y los datos cargados
+-- pueden estar como 'AB 123 CD'. La columna generada guarda la forma
+-- canónica (la misma que backend/plates.py::normalize_plate) y el índice
+-- único permite que todas las búsquedas sean index hits.
+
+-- ==========================================
+-- COLUMNA GENERADA: vehiculos.matricula_norm
+-- ==========================================
+ALTER TABLE vehiculos
+    ADD COLUMN IF NOT EXISTS matricula_norm VARCHAR(20)
+    GENERATED ALWAYS AS (upper(regexp_replace(matricula, '[^A-Za-z0-9]', '', 'g'))) STORED;
+
+-- ==========================================
+-- ÍNDICE
+-- ==========================================
+-- Si falla por duplicados, hay dos filas que son la misma patente escrita
+-- distinto: unificarlas antes de crear el índice.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vehiculos_matricula_norm ON vehiculos(matricula_norm);
+
+-- ==========================================
+-- VERIFICACIÓN
+-- ==========================================
+-- EXPLAIN SELECT estado, activo FROM vehiculos WHERE matricula_norm = 'AB123CD';
+-- Debe mostrar "Index Scan using idx_vehiculos_matricula_norm"
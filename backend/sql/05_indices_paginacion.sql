@@ -0,0 +1,14 @@
+-- ==========================================
+-- SMARTGATE - ÍNDICES PARA PAGINACIÓN
+-- ==========================================
+-- Script para soportar la paginación por keyset de /cocheras/pagos
+-- Ejecutar después de crear la tabla pagos (es idempotente)
+
+-- Historial de pagos por departamento, del más reciente al más antiguo:
+--   WHERE id_departamento = ? AND (fecha_pago, id_pago) < (?, ?)
+--   ORDER BY fecha_pago DESC, id_pago DESC LIMIT ?
+-- También resuelve "último pago" del control de acceso de cocheras.
+CREATE INDEX IF NOT EXISTS idx_pagos_departamento_fecha
+    ON pagos(id_departamento, fecha_pago DESC, id_pago DESC);
+
+-- /auth/users pagina por id_usuario (ya indexado por la PRIMARY KEY)
@@ -0,0 +1,135 @@
+-- ==========================================
+-- SMARTGATE - SINCRONIZACIÓN DE LA RÉPLICA DE BORDE
+-- ==========================================
+-- Script para el modo borde (EDGE_MODE=1): la caja del portón guarda una
+-- copia local de los vehículos y se sincroniza incrementalmente leyendo el
+-- registro de cambios `vehiculos_cambios`.
+-- Ejecutar después de 04_matricula_normalizada.sql (es idempotente)
+
+-- ==========================================
+-- COLUMNA: vehiculos.updated_at
+-- ==========================================
+ALTER TABLE vehiculos
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_vehiculos_updated_at ON vehiculos(updated_at);
+
+-- Toda modificación de un vehículo avanza su updated_at
+CREATE OR REPLACE FUNCTION smartgate_touch_vehiculo() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_vehiculos_updated_at ON vehiculos;
+CREATE TRIGGER trg_vehiculos_updated_at
+    BEFORE UPDATE ON vehiculos
+    FOR EACH ROW EXECUTE FUNCTION smartgate_touch_vehiculo();
+
+-- ==========================================
+-- TABLA: vehiculos_cambios (registro de cambios)
+-- ==========================================
+-- Una fila por patente cuya decisión pudo cambiar: alta, modificación o
+-- baja del vehículo, o un pago, inquilino o tarifa de su departamento.
+-- La réplica vuelve a leer la fila de decisión actual de cada patente; si
+-- ya no existe, la borra (las bajas quedan registradas aquí).
+--
+-- Orden seguro ante transacciones largas: la réplica lee en orden
+-- (txid, id) y solo las transacciones ya terminadas (txid menor que el
+-- xmin del snapshot). Una transacción que confirma después de una
+-- sincronización tiene un txid >= ese xmin y entra en la siguiente; con
+-- una marca de tiempo (que es la del inicio de la transacción) se perdía.
+-- Contrapartida: una transacción abierta mucho tiempo, en cualquier tabla,
+-- demora los cambios posteriores hasta que termina.
+CREATE TABLE IF NOT EXISTS vehiculos_cambios (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    matricula_norm VARCHAR(20) NOT NULL,
+    creado TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS idx_vehiculos_cambios_txid ON vehiculos_cambios(txid, id);
+CREATE INDEX IF NOT EXISTS idx_vehiculos_cambios_creado ON vehiculos_cambios(creado);
+
+-- ==========================================
+-- TRIGGERS
+-- ==========================================
+-- Alta, baja o cambio de un vehículo (con la patente vieja si cambió)
+CREATE OR REPLACE FUNCTION smartgate_cambio_vehiculo() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO vehiculos_cambios (matricula_norm) VALUES (OLD.matricula_norm);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.matricula_norm IS DISTINCT FROM OLD.matricula_norm) THEN
+        INSERT INTO vehiculos_cambios (matricula_norm) VALUES (NEW.matricula_norm);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_vehiculos_cambios ON vehiculos;
+CREATE TRIGGER trg_vehiculos_cambios
+    AFTER INSERT OR DELETE OR UPDATE OF matricula, estado, activo, id_departamento ON vehiculos
+    FOR EACH ROW EXECUTE FUNCTION smartgate_cambio_vehiculo();
+
+-- Pagos e inquilinos cambian el vencimiento de los vehículos del departamento
+CREATE OR REPLACE FUNCTION smartgate_cambio_departamento() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO vehiculos_cambios (matricula_norm)
+        SELECT matricula_norm FROM vehiculos WHERE id_departamento = OLD.id_departamento;
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.id_departamento IS DISTINCT FROM OLD.id_departamento) THEN
+        INSERT INTO vehiculos_cambios (matricula_norm)
+        SELECT matricula_norm FROM vehiculos WHERE id_departamento = NEW.id_departamento;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reemplazan a los que solo tocaban vehiculos.updated_at (no veían bajas)
+DROP TRIGGER IF EXISTS trg_pagos_touch_vehiculos ON pagos;
+DROP TRIGGER IF EXISTS trg_inquilinos_touch_vehiculos ON inquilinos;
+DROP FUNCTION IF EXISTS smartgate_touch_vehiculos_departamento();
+
+DROP TRIGGER IF EXISTS trg_pagos_cambios ON pagos;
+CREATE TRIGGER trg_pagos_cambios
+    AFTER INSERT OR UPDATE OR DELETE ON pagos
+    FOR EACH ROW EXECUTE FUNCTION smartgate_cambio_departamento();
+
+DROP TRIGGER IF EXISTS trg_inquilinos_cambios ON inquilinos;
+CREATE TRIGGER trg_inquilinos_cambios
+    AFTER INSERT OR UPDATE OR DELETE ON inquilinos
+    FOR EACH ROW EXECUTE FUNCTION smartgate_cambio_departamento();
+
+-- Una tarifa modificada o borrada afecta a los departamentos que la usan
+CREATE OR REPLACE FUNCTION smartgate_cambio_tarifa() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO vehiculos_cambios (matricula_norm)
+    SELECT v.matricula_norm FROM vehiculos v
+    JOIN inquilinos i ON i.id_departamento = v.id_departamento
+    WHERE i.id_tarifa = OLD.id_tarifa;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tarifas_cambios ON tarifas;
+CREATE TRIGGER trg_tarifas_cambios
+    AFTER UPDATE OR DELETE ON tarifas
+    FOR EACH ROW EXECUTE FUNCTION smartgate_cambio_tarifa();
+
+-- ==========================================
+-- RETENCIÓN
+-- ==========================================
+-- La réplica rehace una copia completa cada EDGE_FULL_SYNC_INTERVAL
+-- (24 h por defecto) y cuando estuvo desconectada más que eso, así que el
+-- registro solo necesita cubrir ese lapso. Programar p.ej. una vez por día:
+--   SELECT smartgate_purgar_cambios();
+CREATE OR REPLACE FUNCTION smartgate_purgar_cambios(retencion INTERVAL DEFAULT INTERVAL '7 days')
+RETURNS BIGINT AS $$
+    WITH borradas AS (
+        DELETE FROM vehiculos_cambios WHERE creado < clock_timestamp() - retencion RETURNING 1
+    )
+    SELECT count(*) FROM borradas;
+$$ LANGUAGE sql;
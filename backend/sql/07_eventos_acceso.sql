@@ -0,0 +1,126 @@
+-- ==========================================
+-- SMARTGATE - EVENTOS DE ACCESO PARTICIONADOS + ROLLUPS
+-- ==========================================
+-- Log de eventos de acceso particionado por mes y tablas de agregados
+-- (rollups) que el writer de backend/access_log.py actualiza en la misma
+-- transacción. Los endpoints de /analytics leen solo los rollups, así el
+-- costo no crece con la cantidad de eventos.
+-- Ejecutar después de 04_matricula_normalizada.sql (es idempotente)
+
+-- ==========================================
+-- TABLA: eventos_acceso (particionada por mes)
+-- ==========================================
+CREATE TABLE IF NOT EXISTS eventos_acceso (
+    id_evento BIGINT GENERATED ALWAYS AS IDENTITY,
+    ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    matricula VARCHAR(20) NOT NULL,
+    matricula_norm VARCHAR(20) NOT NULL,
+    acceso_concedido BOOLEAN NOT NULL,
+    motivo TEXT,
+    confianza DECIMAL(5,4),
+    camara VARCHAR(50),
+    origen VARCHAR(20),          -- 'camara', 'borde', 'manual'...
+    evidencia_id CHAR(32),       -- ver camera/evidence_store.py
+    id_usuario INTEGER NULL,
+    PRIMARY KEY (ts, id_evento)
+) PARTITION BY RANGE (ts);
+
+CREATE INDEX IF NOT EXISTS idx_eventos_acceso_matricula ON eventos_acceso (matricula_norm, ts);
+
+-- Crea (si falta) la partición mensual que contiene `fecha`
+CREATE OR REPLACE FUNCTION smartgate_particion_eventos(fecha DATE) RETURNS TEXT AS $$
+DECLARE
+    desde DATE := date_trunc('month', fecha)::date;
+    hasta DATE := (date_trunc('month', fecha) + INTERVAL '1 month')::date;
+    nombre TEXT := 'eventos_acceso_' || to_char(fecha, 'YYYYMM');
+BEGIN
+    IF to_regclass(nombre) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF eventos_acceso FOR VALUES FROM (%L) TO (%L)',
+            nombre, desde, hasta
+        );
+    END IF;
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT smartgate_particion_eventos(CURRENT_DATE);
+SELECT smartgate_particion_eventos((CURRENT_DATE + INTERVAL '1 month')::date);
+
+-- ==========================================
+-- ROLLUPS
+-- ==========================================
+-- Accesos por hora (para "accesos por hora" y los totales del día)
+CREATE TABLE IF NOT EXISTS accesos_por_hora (
+    hora TIMESTAMP PRIMARY KEY,  -- date_trunc('hour', ts)
+    total INTEGER NOT NULL DEFAULT 0,
+    permitidos INTEGER NOT NULL DEFAULT 0,
+    denegados INTEGER NOT NULL DEFAULT 0
+);
+
+-- Denegaciones por día y motivo
+CREATE TABLE IF NOT EXISTS denegaciones_por_dia (
+    dia DATE NOT NULL,
+    motivo TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, motivo)
+);
+
+-- Accesos por matrícula y día (para el ranking de matrículas)
+CREATE TABLE IF NOT EXISTS accesos_por_matricula_dia (
+    dia DATE NOT NULL,
+    matricula_norm VARCHAR(20) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    denegados INTEGER NOT NULL DEFAULT 0,
+    ultimo_acceso TIMESTAMP,
+    PRIMARY KEY (dia, matricula_norm)
+);
+
+-- ==========================================
+-- MIGRACIÓN DE registros_acceso
+-- ==========================================
+-- Copia los registros existentes una sola vez (si eventos_acceso está vacía)
+-- y reconstruye los rollups a partir de ellos.
+DO $$
+DECLARE
+    mes DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM eventos_acceso LIMIT 1) THEN
+        RETURN;
+    END IF;
+    FOR mes IN
+        SELECT DISTINCT date_trunc('month', timestamp_deteccion)::date
+        FROM registros_acceso WHERE timestamp_deteccion IS NOT NULL
+    LOOP
+        PERFORM smartgate_particion_eventos(mes);
+    END LOOP;
+
+    INSERT INTO eventos_acceso (ts, matricula, matricula_norm, acceso_concedido, motivo, confianza, origen, id_usuario)
+    SELECT timestamp_deteccion, matricula,
+           upper(regexp_replace(matricula, '[^A-Za-z0-9]', '', 'g')),
+           acceso_concedido, observaciones, confianza, 'migracion', id_usuario
+    FROM registros_acceso
+    WHERE timestamp_deteccion IS NOT NULL;
+
+    INSERT INTO accesos_por_hora (hora, total, permitidos, denegados)
+    SELECT date_trunc('hour', ts), count(*),
+           count(*) FILTER (WHERE acceso_concedido), count(*) FILTER (WHERE NOT acceso_concedido)
+    FROM eventos_acceso GROUP BY 1
+    ON CONFLICT (hora) DO NOTHING;
+
+    INSERT INTO denegaciones_por_dia (dia, motivo, total)
+    SELECT ts::date, COALESCE(motivo, 'Sin motivo'), count(*)
+    FROM eventos_acceso WHERE NOT acceso_concedido GROUP BY 1, 2
+    ON CONFLICT (dia, motivo) DO NOTHING;
+
+    INSERT INTO accesos_por_matricula_dia (dia, matricula_norm, total, denegados, ultimo_acceso)
+    SELECT ts::date, matricula_norm, count(*), count(*) FILTER (WHERE NOT acceso_concedido), max(ts)
+    FROM eventos_acceso GROUP BY 1, 2
+    ON CONFLICT (dia, matricula_norm) DO NOTHING;
+END;
+$$;
+
+COMMENT ON TABLE eventos_acceso IS 'Eventos de acceso, particionados por mes';
+COMMENT ON TABLE accesos_por_hora IS 'Rollup: accesos por hora';
+COMMENT ON TABLE denegaciones_por_dia IS 'Rollup: denegaciones por día y motivo';
+COMMENT ON TABLE accesos_por_matricula_dia IS 'Rollup: accesos por matrícula y día';
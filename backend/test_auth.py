@@ -54,7 +54,7 @@ def test_auth(username: str, password: str):
     
     if result:
         print(f"\n✅ ¡AUTENTICACIÓN EXITOSA!")
-        print(f"   Usuario retornado: {result.get('username')}")
+        print(f"   Usuario retornado: {result.username}")
         return True
     else:
         print(f"\n❌ AUTENTICACIÓN FALLIDA")
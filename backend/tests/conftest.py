@@ -0,0 +1,29 @@
+"""
+Pruebas unitarias de los módulos que no necesitan base ni cámara.
+Correr desde backend/: `python -m pytest tests`
+"""
+import os
+import sys
+
+# Los módulos del backend se importan como en producción (`from db import ...`)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+
+class Reloj:
+    """Reloj manual para las clases que reciben `clock`."""
+
+    def __init__(self, ahora: float = 1000.0):
+        self.ahora = ahora
+
+    def __call__(self) -> float:
+        return self.ahora
+
+    def avanzar(self, segundos: float):
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
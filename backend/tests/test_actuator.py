@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from camera.actuator import Actuator, ActuatorDriver, SimulatedDriver, create_actuator
+
+
+class DriverRoto(ActuatorDriver):
+    name = "roto"
+
+    def open(self, lane, timeout: float):
+        raise RuntimeError("relé inalcanzable")
+
+
+def test_simulated_registra_los_comandos():
+    driver = SimulatedDriver(history=2)
+    for lane in (1, 2, 3):
+        driver.open(lane, timeout=1)
+    assert [lane for _, lane in driver.commands] == [2, 3]
+
+
+def test_acceso_abre_y_denegado_no():
+    actuator = Actuator(SimulatedDriver())
+    ahora = time.time()
+    assert actuator.actuate(0, True, ahora, ahora, "db")["resultado"] == "abierta"
+    assert actuator.actuate(0, False, ahora, ahora, "db")["comando"] is None
+    assert len(actuator.driver.commands) == 1
+    assert (actuator.counters["abiertas"], actuator.counters["denegadas"]) == (1, 1)
+
+
+@pytest.mark.parametrize("politica, abre", [("closed", False), ("open", True)])
+def test_sin_decision_aplica_la_politica(politica, abre):
+    actuator = Actuator(SimulatedDriver(), fail_mode=politica)
+    ahora = time.time()
+    registro = actuator.actuate(0, None, ahora, ahora, "timeout")
+    assert registro["politica"] == f"fail-{politica}"
+    assert (registro["comando"] == "abrir") is abre
+    assert actuator.counters["sin_decision"] == 1
+
+
+def test_fuera_de_plazo():
+    actuator = Actuator(SimulatedDriver(), deadline_ms=100)
+    capturado = time.time() - 0.5
+    assert actuator.remaining(capturado) < 0
+    assert not actuator.actuate(0, True, capturado, time.time(), "db")["en_plazo"]
+    assert actuator.counters["fuera_de_plazo"] == 1
+
+
+def test_error_del_driver_se_registra():
+    actuator = Actuator(DriverRoto())
+    ahora = time.time()
+    assert actuator.actuate(0, True, ahora, ahora, "db")["resultado"] == "error"
+    assert actuator.counters["errores_driver"] == 1
+
+
+def test_politica_invalida():
+    with pytest.raises(ValueError):
+        Actuator(SimulatedDriver(), fail_mode="quizas")
+
+
+def test_create_actuator_por_defecto_sin_barrera(monkeypatch):
+    monkeypatch.delenv("ACTUATOR", raising=False)
+    assert create_actuator() is None
+    monkeypatch.setenv("ACTUATOR", "simulated")
+    assert create_actuator().driver.name == "simulated"
+    monkeypatch.setenv("ACTUATOR", "http")
+    monkeypatch.delenv("ACTUATOR_HTTP_URL", raising=False)
+    with pytest.raises(RuntimeError):
+        create_actuator()
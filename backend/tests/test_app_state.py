@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+import app_state
+from app_state import AppState
+from camera.dedup import DecisionCache
+from pubsub import CANAL_INVALIDAR, InProcessPubSub
+
+
+def _procesos(monkeypatch):
+    """Un worker de la API y el proceso de cámara unidos por el mismo pub/sub."""
+    indices = []
+    monkeypatch.setattr(app_state, "invalidate_plate_index", lambda: indices.append(1))
+    bus = InProcessPubSub()
+    api, camara = AppState("api"), AppState("camera")
+    api.pubsub = camara.pubsub = bus
+    bus.subscribe(CANAL_INVALIDAR, camara._on_invalidate_message)
+    camara.camera_service = SimpleNamespace(decisions=DecisionCache(ttl=30))
+    camara.camera_service.decisions.put("AB123CD", {"acceso": True})
+    return api, camara, indices
+
+
+def test_importacion_en_la_api_limpia_la_camara(monkeypatch):
+    api, camara, indices = _procesos(monkeypatch)
+    api.invalidate_caches("vehiculos")
+    assert camara.camera_service.decisions.get("AB123CD") is DecisionCache.MISSING
+    assert len(indices) == 2  # el índice de la API y el de la cámara
+
+
+def test_tablas_sin_decisiones_no_limpian(monkeypatch):
+    api, camara, indices = _procesos(monkeypatch)
+    api.invalidate_caches("usuarios")
+    assert camara.camera_service.decisions.get("AB123CD") == {"acceso": True}
+    assert indices == []
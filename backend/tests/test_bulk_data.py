@@ -0,0 +1,65 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import bulk_data
+from bulk_data import PAGOS, VEHICULOS, Resultado, leer_csv, validar, verificar_columnas
+
+
+def _validar(tabla, registros):
+    resultado = Resultado(tabla.nombre)
+    return list(validar(tabla, registros, resultado)), resultado
+
+
+def test_csv_con_punto_y_coma_y_bom():
+    archivo = io.BytesIO("\ufeffmatricula;estado\nAB 123 CD;permitido\n".encode("utf-8"))
+    assert list(leer_csv(archivo)) == [{"matricula": "AB 123 CD", "estado": "permitido"}]
+
+
+def test_vehiculo_valido_normaliza_la_clave():
+    filas, resultado = _validar(VEHICULOS, [{" Matricula ": "ab 123 cd", "estado": "denegado", "activo": "sí"}])
+    assert resultado.validas == 1
+    fila = filas[0]
+    assert fila[:3] == (1, "AB123CD", "ab 123 cd")
+    assert fila[6:8] == (0, True)
+
+
+def test_errores_por_fila_con_numero():
+    registros = [
+        {"matricula": "AB123CD", "estado": "3"},
+        {"matricula": "---"},
+        {"matricula": "", "activo": "tal vez"},
+        {"matricula": "XY999ZZ", "propietario_email": "sin-arroba"},
+    ]
+    filas, resultado = _validar(VEHICULOS, registros)
+    assert filas == []
+    errores = {e["fila"]: e["error"] for e in resultado.errores}
+    assert errores[1] == "estado: debe ser 1 (permitido) o 0 (denegado)"
+    assert errores[2] == "matricula: sin letras ni números"
+    assert "matricula: obligatorio" in errores[3] and "activo:" in errores[3]
+    assert errores[4].startswith("propietario_email:")
+
+
+def test_pagos_fecha_y_monto():
+    filas, resultado = _validar(PAGOS, [
+        {"id_departamento": "3", "fecha_pago": "05/02/2024", "monto": "1500,50"},
+        {"id_departamento": "3", "fecha_pago": "2024-13-01", "monto": "-1"},
+    ])
+    assert resultado.validas == 1 and resultado.total_errores == 1
+    assert date(2024, 2, 5) in filas[0] and Decimal("1500.50") in filas[0]
+    assert "fecha_pago" in resultado.errores[0]["error"] and "monto" in resultado.errores[0]["error"]
+
+
+def test_columnas_obligatorias():
+    with pytest.raises(ValueError):
+        verificar_columnas(PAGOS, {"id_departamento": "1"})
+    verificar_columnas(PAGOS, {"ID_Departamento": "1", "fecha_pago": "2024-01-01"})
+
+
+def test_errores_acotados(monkeypatch):
+    monkeypatch.setattr(bulk_data, "MAX_ERRORES", 2)
+    _, resultado = _validar(VEHICULOS, [{"matricula": ""}] * 5)
+    assert resultado.total_errores == 5
+    assert len(resultado.errores) == 2
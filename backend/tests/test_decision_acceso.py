@@ -0,0 +1,48 @@
+from datetime import date
+
+import pytest
+
+from db import calcular_vencimiento, decision_acceso
+
+HOY = date(2024, 6, 15)
+
+
+def _fila(**cambios):
+    fila = {"matricula_norm": "AB123CD", "matricula": "AB123CD", "estado": 1, "activo": True,
+            "id_departamento": 3, "fecha_pago": date(2024, 6, 1), "tarifa": "mensual"}
+    fila.update(cambios)
+    return fila
+
+
+def test_cochera_al_dia():
+    decision = decision_acceso("AB123CD", _fila(), hoy=HOY)
+    assert decision["acceso"]
+    assert (decision["dias_restantes"], decision["vencimiento"]) == (16, "2024-07-01")
+
+
+@pytest.mark.parametrize("fila, motivo", [
+    (None, "Vehículo no registrado"),
+    (_fila(activo=None), "Vehículo inactivo"),
+    (_fila(activo=False), "Vehículo inactivo"),
+    (_fila(estado=0), "Estado del vehículo denegado"),
+    (_fila(fecha_pago=None, tarifa=None), "No se encontraron pagos para este departamento"),
+    (_fila(tarifa=None), "No se encontró tarifa para el departamento"),
+    (_fila(fecha_pago=date(2024, 5, 1)), "Mensualidad vencida"),
+])
+def test_deniega(fila, motivo):
+    decision = decision_acceso("AB123CD", fila, hoy=HOY)
+    assert not decision["acceso"]
+    assert decision["motivo"] == motivo
+
+
+def test_sin_departamento():
+    fila = _fila(id_departamento=None, fecha_pago=None, tarifa=None)
+    assert decision_acceso("AB123CD", fila, hoy=HOY)["acceso"]
+    decision = decision_acceso("AB123CD", fila, hoy=HOY, requiere_cochera=True)
+    assert decision["motivo"] == "Vehículo sin cochera/departamento asociado"
+
+
+def test_calcular_vencimiento():
+    assert calcular_vencimiento("2024-01-31", "Mensual") == date(2024, 3, 1)
+    assert calcular_vencimiento(date(2024, 1, 1), "anual") == date(2024, 12, 31)
+    assert calcular_vencimiento(date(2024, 1, 1), "otra") == date(2024, 1, 1)
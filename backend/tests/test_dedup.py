@@ -0,0 +1,105 @@
+from camera.dedup import DecisionCache, PlateDedup
+
+
+def test_repeticion_dentro_de_la_ventana_se_suprime(reloj):
+    dedup = PlateDedup(window=5, max_hold=60, clock=reloj)
+    assert dedup.admit(0, "AB123CD")
+    reloj.avanzar(4)
+    assert not dedup.admit(0, "AB123CD")
+    assert dedup.status()["suprimidas"] == 1
+
+
+def test_la_ventana_es_deslizante(reloj):
+    dedup = PlateDedup(window=5, max_hold=60, clock=reloj)
+    dedup.admit(0, "AB123CD")
+    # Visto cada 4 s: nunca pasan 5 s sin verlo
+    for _ in range(5):
+        reloj.avanzar(4)
+        assert not dedup.admit(0, "AB123CD")
+
+
+def test_ventana_vencida_vuelve_a_procesar(reloj):
+    dedup = PlateDedup(window=5, max_hold=60, clock=reloj)
+    dedup.admit(0, "AB123CD")
+    reloj.avanzar(5.1)
+    assert dedup.admit(0, "AB123CD")
+
+
+def test_max_hold_vuelve_a_decidir_aunque_se_siga_viendo(reloj):
+    dedup = PlateDedup(window=5, max_hold=10, clock=reloj)
+    dedup.admit(0, "AB123CD")
+    for _ in range(2):
+        reloj.avanzar(4)
+        assert not dedup.admit(0, "AB123CD")
+    reloj.avanzar(4)  # 12 s desde la primera lectura
+    assert dedup.admit(0, "AB123CD")
+
+
+def test_carriles_y_patentes_distintas_pasan(reloj):
+    dedup = PlateDedup(clock=reloj)
+    assert dedup.admit(0, "AB123CD")
+    assert dedup.admit(1, "AB123CD")
+    assert dedup.admit(0, "XY999ZZ")
+
+
+def test_max_entries_descarta_la_mas_vieja(reloj):
+    dedup = PlateDedup(window=60, max_entries=2, clock=reloj)
+    dedup.admit(0, "A")
+    reloj.avanzar(1)
+    dedup.admit(0, "B")
+    reloj.avanzar(1)
+    dedup.admit(0, "C")
+    assert dedup.status()["entradas"] == 2
+    assert dedup.admit(0, "A")  # se había descartado
+    assert not dedup.admit(0, "C")
+
+
+def test_defer_reintenta_con_espera_creciente(reloj):
+    dedup = PlateDedup(window=5, max_hold=60, retry=0.5, clock=reloj)
+    assert dedup.admit(0, "AB123CD")
+    assert dedup.defer(0, "AB123CD")  # primera vez sin decisión: se avisa
+    reloj.avanzar(0.4)
+    assert not dedup.admit(0, "AB123CD")
+    reloj.avanzar(0.2)
+    assert dedup.admit(0, "AB123CD")
+    assert not dedup.defer(0, "AB123CD")  # ya se avisó en este avistamiento
+    reloj.avanzar(0.6)
+    assert not dedup.admit(0, "AB123CD")  # ahora espera 1 s
+    reloj.avanzar(0.5)
+    assert dedup.admit(0, "AB123CD")
+    assert dedup.status()["reintentos"] == 2
+
+
+def test_defer_no_supera_la_ventana(reloj):
+    dedup = PlateDedup(window=2, max_hold=60, retry=1, clock=reloj)
+    dedup.admit(0, "AB123CD")
+    for _ in range(4):  # 1 s, 2 s, 2 s, 2 s
+        dedup.defer(0, "AB123CD")
+        reloj.avanzar(2)
+        assert dedup.admit(0, "AB123CD")
+    assert dedup.status()["reintentos"] == 4
+
+
+def test_decision_cache_ttl_y_missing(reloj):
+    cache = DecisionCache(ttl=30, clock=reloj)
+    assert cache.get("AB123CD") is DecisionCache.MISSING
+    cache.put("AB123CD", None)  # "no existe" también se recuerda
+    assert cache.get("AB123CD") is None
+    reloj.avanzar(31)
+    assert cache.get("AB123CD") is DecisionCache.MISSING
+
+
+def test_decision_cache_acotada_y_clear(reloj):
+    cache = DecisionCache(ttl=30, max_entries=2, clock=reloj)
+    for placa in ("A", "B", "C"):
+        cache.put(placa, {"acceso": True})
+    assert cache.get("A") is DecisionCache.MISSING
+    assert cache.get("C") == {"acceso": True}
+    cache.clear()
+    assert cache.get("C") is DecisionCache.MISSING
+
+
+def test_decision_cache_ttl_cero_no_guarda(reloj):
+    cache = DecisionCache(ttl=0, clock=reloj)
+    cache.put("A", {"acceso": True})
+    assert cache.get("A") is DecisionCache.MISSING
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from event_bus import Consumer, EventBus, LatencyStats
+
+
+def _entregar(consumer):
+    """Vacía la cola en este hilo (el consumidor detenido entrega lo pendiente)."""
+    consumer._running = False
+    consumer._run()
+
+
+def test_drop_oldest_descarta_el_mas_viejo():
+    recibidos = []
+    consumer = Consumer("prueba", recibidos.append, maxsize=2)
+    for i in range(4):
+        consumer.offer(i, published=0.0)
+    _entregar(consumer)
+    assert recibidos == [2, 3]
+    assert consumer.status()["descartados"] == 2
+
+
+def test_coalesce_reemplaza_el_pendiente_de_la_misma_clave():
+    recibidos = []
+    consumer = Consumer("prueba", recibidos.append, maxsize=4, policy="coalesce",
+                        key=lambda e: e["matricula"])
+    consumer.offer({"matricula": "A", "n": 1}, published=1.0)
+    consumer.offer({"matricula": "B", "n": 2}, published=2.0)
+    consumer.offer({"matricula": "A", "n": 3}, published=3.0)
+    # Conserva el lugar y el instante del primero
+    assert list(consumer._pending.values())[-1][0] == 1.0
+    _entregar(consumer)
+    assert [e["n"] for e in recibidos] == [2, 3]
+    assert consumer.status()["combinados"] == 1
+
+
+def test_coalesce_lleno_descarta_el_mas_viejo():
+    recibidos = []
+    consumer = Consumer("prueba", recibidos.append, maxsize=2, policy="coalesce", key=lambda e: e)
+    for e in ("A", "B", "C"):
+        consumer.offer(e, published=0.0)
+    _entregar(consumer)
+    assert recibidos == ["B", "C"]
+
+
+def test_coalesce_requiere_key_y_politica_valida():
+    with pytest.raises(ValueError):
+        Consumer("prueba", print, policy="coalesce")
+    with pytest.raises(ValueError):
+        Consumer("prueba", print, policy="otra")
+
+
+def test_error_del_handler_no_corta_la_entrega():
+    recibidos = []
+
+    def handler(e):
+        if e == 1:
+            raise RuntimeError("falla")
+        recibidos.append(e)
+
+    consumer = Consumer("prueba", handler)
+    for i in range(3):
+        consumer.offer(i, published=0.0)
+    _entregar(consumer)
+    assert recibidos == [0, 2]
+    assert consumer.status()["errores"] == 1
+
+
+def test_bus_entrega_a_todos_los_consumidores():
+    bus = EventBus()
+    a, b = [], []
+    bus.subscribe("a", a.append)
+    bus.subscribe("b", b.append)
+    bus.publish("evento")
+    limite = time.time() + 2
+    while (len(a), len(b)) != (1, 1) and time.time() < limite:
+        time.sleep(0.01)
+    bus.close()
+    assert a == b == ["evento"]
+    assert bus.status()["publicados"] == 1
+
+
+def test_latency_stats():
+    stats = LatencyStats(size=100)
+    assert stats.summary()["n"] == 0
+    for ms in range(1, 101):
+        stats.add(ms)
+    assert stats.summary() == {"n": 100, "p50_ms": 51, "p99_ms": 100, "max_ms": 100}
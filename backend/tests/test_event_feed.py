@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from event_feed import EventFeed
+
+
+def _feed(**kwargs):
+    feed = EventFeed(capacity=5, coalesce_ms=0, **kwargs)
+    return feed, [feed.publish({"matricula": f"P{i}", "acceso": True}) for i in range(3)]
+
+
+def test_reanuda_desde_el_ultimo_id():
+    feed, ids = _feed()
+    lote = feed.since(ids[0])
+    assert [e.id for e in lote.events] == ids[1:]
+    assert not lote.missed
+    assert feed.since(ids[-1]).events == []
+
+
+def test_id_viejo_fuera_del_buffer_marca_missed():
+    feed, ids = _feed()
+    for i in range(5):
+        feed.publish({"matricula": f"Q{i}"})
+    lote = feed.since(ids[0])
+    assert lote.missed and lote.gap
+    assert len(lote.events) == 5
+
+
+def test_cero_pide_todo_sin_missed():
+    feed, ids = _feed()
+    lote = feed.since(0)
+    assert [e.id for e in lote.events] == ids
+    assert not lote.missed
+
+
+def test_max_lag_saltea_los_mas_viejos():
+    feed, ids = _feed()
+    lote = feed.since(ids[0] - 1, max_lag=2)
+    assert [e.id for e in lote.events] == ids[1:]
+    assert lote.dropped == 1
+    assert lote.gap and not lote.missed
+
+
+def test_coalesce_conserva_los_salteados():
+    feed = EventFeed(coalesce_ms=0)
+    ids = [feed.publish({"matricula": m}) for m in ("A", "B", "A", "B")]
+
+    async def primer_lote():
+        suscripcion = feed.subscribe(last_id=ids[0] - 1, policy="coalesce", max_lag=3)
+        try:
+            return await suscripcion.__anext__()
+        finally:
+            await suscripcion.aclose()
+
+    lote = asyncio.run(primer_lote())
+    assert [e.key for e in lote.events] == ["A", "B"]
+    assert lote.dropped == 1 and lote.gap
+
+
+def test_id_repetido_o_viejo_se_ignora():
+    feed = EventFeed(coalesce_ms=0)
+    assert feed.publish({"matricula": "A"}, event_id=10) == 10
+    assert feed.publish({"matricula": "B"}, event_id=10) is None
+    assert feed.publish({"matricula": "C"}, event_id=5) is None
+    assert feed.publish({"matricula": "D"}, event_id=12) == 12
+    assert [e.id for e in feed.since(10).events] == [12]
+
+
+def test_formato_compacto():
+    feed = EventFeed(coalesce_ms=0)
+    feed.publish({"matricula": "AB123CD", "acceso": True, "confianza": 0.95123, "motivo": None}, event_id=7)
+    assert feed.since(0).compact_json().startswith('[{"i":7,')
+    assert '"m":"AB123CD","a":1,"c":0.951' in feed.since(0).compact_json()
+
+
+def test_subscribe_reanuda_y_coalesce():
+    feed = EventFeed(coalesce_ms=0)
+    primero = feed.publish({"matricula": "A"})
+    for matricula in ("B", "C", "B"):
+        feed.publish({"matricula": matricula})
+
+    async def primer_lote():
+        suscripcion = feed.subscribe(last_id=primero, policy="coalesce")
+        try:
+            return await suscripcion.__anext__()
+        finally:
+            await suscripcion.aclose()
+
+    lote = asyncio.run(primer_lote())
+    assert [e.key for e in lote.events] == ["C", "B"]
+    assert lote.last_id == feed.last_id
+    assert feed.status()["suscriptores"] == 0
+
+
+def test_subscribe_valida_parametros():
+    feed = EventFeed()
+
+    async def suscribir(**kwargs):
+        await feed.subscribe(**kwargs).__anext__()
+
+    with pytest.raises(ValueError):
+        asyncio.run(suscribir(policy="otra"))
+    with pytest.raises(ValueError):
+        asyncio.run(suscribir(max_lag=-1))
@@ -0,0 +1,50 @@
+import dataclasses
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+
+import fastjson
+
+
+@dataclasses.dataclass
+class Fila:
+    matricula: str
+    monto: Decimal
+
+
+def test_tipos_de_las_filas():
+    datos = {
+        "fecha": date(2024, 5, 1),
+        "ts": datetime(2024, 5, 1, 12, 30),
+        "monto": Decimal("10.50"),
+        "id": UUID("12345678-1234-5678-1234-567812345678"),
+        "fila": Fila("AB123CD", Decimal("1")),
+        "tupla": (1, 2),
+    }
+    assert json.loads(fastjson.dumps(datos)) == {
+        "fecha": "2024-05-01",
+        "ts": "2024-05-01T12:30:00",
+        "monto": 10.5,
+        "id": "12345678-1234-5678-1234-567812345678",
+        "fila": {"matricula": "AB123CD", "monto": 1.0},
+        "tupla": [1, 2],
+    }
+
+
+def test_sin_ascii_escapado_y_roundtrip():
+    texto = fastjson.dumps_str({"motivo": "Vehículo inactivo"})
+    assert "Vehículo" in texto
+    assert fastjson.loads(texto) == {"motivo": "Vehículo inactivo"}
+
+
+def test_tipo_no_serializable():
+    with pytest.raises(TypeError):
+        fastjson.dumps({"x": object()})
+
+
+def test_response_usa_dumps():
+    respuesta = fastjson.FastJSONResponse({"monto": Decimal("2")})
+    assert json.loads(respuesta.body) == {"monto": 2.0}
@@ -0,0 +1,76 @@
+import numpy as np
+
+from camera.frame_buffer import FrameRingBuffer
+
+
+def _frame(valor, shape=(4, 6, 3)):
+    return np.full(shape, valor, dtype=np.uint8)
+
+
+def test_escribe_y_lee_el_ultimo():
+    fb = FrameRingBuffer((4, 6, 3), slots=3)
+    assert fb.latest_seq == 0
+    assert fb.read() == (0, None)
+    fb.write(_frame(1))
+    seq = fb.write(_frame(2))
+    leido_seq, frame = fb.read()
+    assert (seq, leido_seq) == (2, 2)
+    assert (frame == 2).all()
+
+
+def test_escritura_en_curso_no_se_lee():
+    fb = FrameRingBuffer((4, 6, 3), slots=3)
+    fb.write(_frame(1))
+    destino = fb.begin_write()
+    destino[:] = 9
+    # El slot reservado está marcado impar hasta el commit
+    assert not fb.is_valid(2)
+    assert fb.latest_seq == 1
+    assert (fb.read()[1] == 1).all()
+    fb.commit()
+    assert (fb.read()[1] == 9).all()
+
+
+def test_slot_pisado_invalida_el_frame_viejo():
+    fb = FrameRingBuffer((4, 6, 3), slots=2)
+    fb.write(_frame(1))
+    seq, vista = fb.view()
+    assert seq == 1 and not vista.flags.writeable
+    fb.write(_frame(2))
+    assert fb.is_valid(1)
+    fb.begin_write()  # reserva el slot del frame 1
+    assert not fb.is_valid(1)
+    assert fb.read(seq=1) == (1, None)
+
+
+def test_abort_descarta_la_escritura():
+    fb = FrameRingBuffer((4, 6, 3), slots=2)
+    fb.write(_frame(1))
+    fb.begin_write()
+    fb.abort()
+    assert fb.latest_seq == 1
+    assert (fb.read()[1] == 1).all()
+
+
+def test_numeracion_sigue_al_recrear():
+    viejo = FrameRingBuffer((4, 6, 3), slots=2)
+    for i in range(5):
+        viejo.write(_frame(i))
+    nuevo = FrameRingBuffer((8, 6, 3), slots=2, start_seq=viejo.latest_seq)
+    assert nuevo.latest_seq == 5
+    assert nuevo.write(_frame(7, (8, 6, 3))) == 6
+
+
+def test_memoria_compartida_attach():
+    fb = FrameRingBuffer((4, 6, 3), slots=2, shm_name=f"smartgate_test_{np.random.randint(1 << 30)}")
+    try:
+        fb.write(_frame(3))
+        otro = FrameRingBuffer.attach(fb.name)
+        try:
+            seq, frame = otro.read()
+            assert seq == 1 and (frame == 3).all()
+        finally:
+            otro.close()
+    finally:
+        fb.close()
+        fb.unlink()
@@ -0,0 +1,66 @@
+from plate_index import PlateIndex, only_ocr_confusions, weighted_distance
+
+
+def _indice(*placas):
+    indice = PlateIndex(max_edits=2)
+    indice.load(placas)
+    return indice
+
+
+def test_exacta_normaliza_la_lectura():
+    indice = _indice("AB 123 CD")
+    assert indice.candidates("ab-123-cd") == [("AB123CD", 1.0)]
+    assert "ab 123 cd" in indice
+
+
+def test_confusion_de_ocr_se_acepta():
+    indice = _indice("AB123CD", "XY999ZZ")
+    assert indice.best_match("A8123CD") == ("AB123CD", 0.9286)
+    assert indice.best_match("AB1Z3C0") == ("AB123CD", 0.8571)
+
+
+def test_sustitucion_cualquiera_no_se_acepta():
+    # 1 - 1/7 supera el umbral, pero puede ser otro auto
+    indice = _indice("AB123CD")
+    assert indice.candidates("AB123CE") == [("AB123CD", 0.8571)]
+    assert indice.best_match("AB123CE") is None
+
+
+def test_insercion_o_borrado_no_se_acepta():
+    indice = _indice("AB123CD")
+    assert indice.best_match("AB123C") is None
+    assert indice.candidates("AB123C")[0][0] == "AB123CD"
+
+
+def test_empate_no_se_acepta():
+    indice = _indice("AB123CD", "AB123CO")
+    # '0' se confunde con 'D' y con 'O': dos candidatos al mismo puntaje
+    assert indice.best_match("AB123C0") is None
+
+
+def test_umbral_minimo():
+    indice = _indice("AB123CD")
+    assert indice.best_match("AB1Z3C0", min_score=0.9) is None
+
+
+def test_dos_sustituciones_por_segmentos():
+    indice = _indice("AB123CD")
+    assert indice.candidates("AB1Z3C0")[0][0] == "AB123CD"
+    assert indice.candidates("XX123XX") == []
+
+
+def test_remove_y_add():
+    indice = _indice("AB123CD")
+    indice.remove("AB123CD")
+    assert indice.candidates("A8123CD") == []
+    indice.add("AB123CD")
+    assert indice.best_match("A8123CD")[0] == "AB123CD"
+
+
+def test_solo_confusiones_y_distancia():
+    assert only_ocr_confusions("AB123CD", "A8123CD")
+    assert not only_ocr_confusions("AB123CD", "AB123CE")
+    assert not only_ocr_confusions("AB123CD", "AB123C")
+    assert weighted_distance("AB123CD", "A8123CD") == 1
+    assert weighted_distance("AB123CD", "AB123CE") == 2
+    assert weighted_distance("AB123CD", "XY999ZZ", max_cost=4) == 5
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from camera.detector import PlatePreprocessor
+
+
+def _original(img, min_h=80):
+    """Preprocesamiento previo al lote, recorte por recorte."""
+    h, w = img.shape[:2]
+    if h < min_h:
+        img = cv2.resize(img, (int(round(w * min_h / h)), min_h), interpolation=cv2.INTER_CUBIC)
+    eq = cv2.equalizeHist(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    thr = cv2.adaptiveThreshold(cv2.GaussianBlur(eq, (3, 3), 0), 255,
+                                cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    return [thr, cv2.bilateralFilter(eq, 7, 50, 50), 255 - thr]
+
+
+def _recortes():
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (40, 120, 3), dtype=np.uint8),
+            rng.integers(0, 256, (150, 300, 3), dtype=np.uint8)]
+
+
+def test_quality_igual_al_original():
+    recortes = _recortes()
+    for recorte, variantes in zip(recortes, PlatePreprocessor().variants(recortes)):
+        for obtenida, esperada in zip(variantes, _original(recorte)):
+            assert obtenida.shape == esperada.shape
+            assert (obtenida == esperada).all()
+
+
+def test_cada_recorte_se_procesa_aislado():
+    # Un recorte chico no se agranda a la altura del más alto ni depende de él
+    chico, grande = _recortes()
+    pre = PlatePreprocessor(mode="fast")
+    solo = [v.copy() for v in pre.variants([chico])[0]]
+    junto = pre.variants([chico, grande])[0]
+    assert junto[0].shape == (80, 240)
+    for a, b in zip(solo, junto):
+        assert (a == b).all()
@@ -11,10 +11,12 @@ const AutoAccess = () => {
   const [inlineBlocked, setInlineBlocked] = useState(false); // mixed-content bloqueado
   const alertTimeoutRef = useRef(null);
   const wsRef = useRef(null);
+  const lastIdRef = useRef(null); // último evento recibido, para reanudar al reconectar
 
   // WebSocket para eventos de detección
   const connectWebSocket = useCallback(() => {
-    const ws = new WebSocket(WS_URL);
+    const since = lastIdRef.current;
+    const ws = new WebSocket(since ? `${WS_URL}?since=${since}` : WS_URL);
 
     ws.onopen = () => {
       setIsDetecting(true);
@@ -26,6 +28,7 @@ const AutoAccess = () => {
       try {
         const msg = JSON.parse(ev.data);
         if (msg.type === 'detection') {
+          if (msg.id) lastIdRef.current = msg.id;
           handleDetection(msg.data);
         }
       } catch {}
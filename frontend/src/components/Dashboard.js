@@ -1,10 +1,27 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
+import axios from 'axios';
+import API_BASE_URL from '../config/api';
 import VehicleAccess from './VehicleAccess';
 import AutoAccess from './AutoAccess';
 
 const Dashboard = ({ user, onLogout }) => {
   const [currentView, setCurrentView] = useState('dashboard');
   const [drawerOpen, setDrawerOpen] = useState(false);
+  const [resumen, setResumen] = useState(null);
+
+  useEffect(() => {
+    if (currentView !== 'dashboard') return;
+    // Lee los rollups de /analytics: costo constante sin importar cuántos eventos haya
+    axios.get(`${API_BASE_URL}/analytics/resumen`)
+      .then((response) => setResumen(response.data))
+      .catch(() => setResumen(null));
+  }, [currentView]);
+
+  const variacion = (actual, anterior) => {
+    if (!anterior) return actual ? '+100%' : '+0%';
+    const pct = Math.round(((actual - anterior) / anterior) * 100);
+    return `${pct >= 0 ? '+' : ''}${pct}%`;
+  };
 
   const menuItems = [
     { text: 'Dashboard', icon: '📊', action: () => setCurrentView('dashboard') },
@@ -16,7 +33,9 @@ const Dashboard = ({ user, onLogout }) => {
   ];
 
   const stats = [
-    { title: 'Accesos Hoy', value: '156', change: '+12%', icon: '🚗', color: 'blue' },
+    resumen
+      ? { title: 'Accesos Hoy', value: String(resumen.hoy.total), change: variacion(resumen.hoy.total, resumen.ayer.total), period: 'ayer', icon: '🚗', color: 'blue' }
+      : { title: 'Accesos Hoy', value: '—', change: '+0%', period: 'ayer', icon: '🚗', color: 'blue' },
     { title: 'Pagos Pendientes', value: '23', change: '-5%', icon: '💳', color: 'yellow' },
     { title: 'Usuarios Activos', value: '89', change: '+3%', icon: '👥', color: 'green' },
     { title: 'Ingresos Mensual', value: '$45,230', change: '+18%', icon: '💰', color: 'purple' }
@@ -141,7 +160,7 @@ const Dashboard = ({ user, onLogout }) => {
                         <p className="text-sm font-medium text-gray-600 mb-1">{stat.title}</p>
                         <p className="text-3xl font-bold text-gray-900 mb-2">{stat.value}</p>
                         <p className={`text-sm font-medium ${stat.change.startsWith('+') ? 'text-green-600' : 'text-red-600'}`}>
-                          {stat.change} vs mes anterior
+                          {stat.change} vs {stat.period || 'mes anterior'}
                         </p>
                       </div>
                       <div className={`w-12 h-12 ${getStatColor(stat.color)} rounded-xl flex items-center justify-center shadow-lg`}>